@@ -0,0 +1,76 @@
+import json
+
+'''
+burst patterns - frames grouped into bursts sent back to back instead of a constant frame rate
+
+the speed of a tx port still defines the average rate, the burst pattern defines how the frames are grouped:
+cyclic - fixed cycle ('bursts_per_sec'), the burst size follows from the rate of the port. all tx ports are started
+         together, so the bursts of all ports using the same cycle are phase aligned and hit the mirror port
+         at the same time (like cyclic real-time traffic sharing a time slot). the burst size is rounded to whole
+         frames, so the rate sent can be far off the speed at short cycles or low rates (e.g. 1500 byte frames at
+         10 Mbit/s, 1 ms cycle: 833 frames/s are requested, 1000 are sent) - the rate sent is the one stored
+burst  - fixed burst size ('frames_per_burst'), the burst rate follows from the rate of the port
+'''
+
+BURST_PATTERN_CYCLIC = 'cyclic'
+BURST_PATTERN_BURST = 'burst'
+
+
+class BurstPattern(object):
+    def __init__(self, name, bursts_per_sec=None, frames_per_burst=None):
+        """
+        :param name: of the pattern
+        :param bursts_per_sec: cycle of all tx ports (cyclic pattern)
+        :param frames_per_burst: burst size of all tx ports (burst pattern)
+        """
+        if (bursts_per_sec is None) == (frames_per_burst is None):
+            raise ValueError('{}: either bursts_per_sec or frames_per_burst has to be given'.format(name))
+        if bursts_per_sec is not None and bursts_per_sec <= 0:
+            raise ValueError('{}: bursts_per_sec must be > 0'.format(name))
+        if frames_per_burst is not None and frames_per_burst < 1:
+            raise ValueError('{}: frames_per_burst must be >= 1'.format(name))
+
+        self.name = name
+        self.bursts_per_sec = bursts_per_sec
+        self.frames_per_burst = frames_per_burst
+
+    @classmethod
+    def from_config(cls, name, config):
+        """
+        :param name: of the pattern
+        :param config: pattern as given in traffic_config.BURST_PATTERNS
+        """
+        return cls(name, config.get('bursts_per_sec'), config.get('frames_per_burst'))
+
+    @property
+    def mode(self):
+        return BURST_PATTERN_CYCLIC if self.bursts_per_sec is not None else BURST_PATTERN_BURST
+
+    def bursts(self, frames_per_sec):
+        """
+        split the given (average) frame rate into bursts
+        the cyclic pattern rounds the burst size to whole frames (at least one per cycle) - the resulting rate
+        frames_per_burst * bursts_per_sec may differ a lot from the given one
+        :return: frames_per_burst, bursts_per_sec
+        """
+        if self.mode == BURST_PATTERN_CYCLIC:
+            return max(1, int(round(frames_per_sec / self.bursts_per_sec))), self.bursts_per_sec
+
+        return self.frames_per_burst, frames_per_sec / float(self.frames_per_burst)
+
+    def spec_json(self):
+        """
+        :return: the pattern as stored in the database
+        """
+        if self.mode == BURST_PATTERN_CYCLIC:
+            spec = {'mode': self.mode, 'bursts_per_sec': self.bursts_per_sec}
+        else:
+            spec = {'mode': self.mode, 'frames_per_burst': self.frames_per_burst}
+
+        return json.dumps(spec, sort_keys=True)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return '{} ({})'.format(self.name, self.spec_json())
@@ -0,0 +1,354 @@
+import argparse
+import array
+import bisect
+import json
+import struct
+import sys
+
+'''
+frames injected by the OstinatoInterface carry a sequence tag at the start of the UDP payload
+
+[ sequence number (32 bit) ][ stream tag (32 bit) ][ stream tag ] ...
+
+stream tag = SEQUENCE_TAG_MAGIC (16 bit) | tx port id (8 bit) | stream ordinal (8 bit)
+'''
+
+SEQUENCE_TAG_MAGIC = 0x4d50
+
+_ETH_TYPE_IP4 = 0x0800
+_ETH_TYPE_VLAN = 0x8100
+_IP_PROTO_UDP = 17
+_UDP_HEADER_LEN = 8
+
+_PCAP_MAGIC_USEC = 0xa1b2c3d4
+_PCAP_MAGIC_NSEC = 0xa1b23c4d
+
+# arrival time of a frame not captured at its destination port (see arrival_times)
+_NOT_ARRIVED = -1
+
+
+def stream_tag(port_id, ordinal=0):
+    return (SEQUENCE_TAG_MAGIC << 16) | ((port_id & 0xff) << 8) | (ordinal & 0xff)
+
+
+def stream_tag_split(tag):
+    """
+    :return: port_id, ordinal
+    """
+    return (tag >> 8) & 0xff, tag & 0xff
+
+
+def percentile(sorted_values, percent):
+    """
+    nearest rank percentile of an already sorted sequence (None if empty)
+    """
+    if not len(sorted_values):
+        return None
+
+    rank = int(round(percent / 100. * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+def pcap_frames(pcap_file):
+    """
+    iterate over the frames of a pcap file without loading the whole file
+    :param pcap_file: file like object opened in binary mode
+    :return: generator of (timestamp_ns, frame_data)
+    """
+    header = pcap_file.read(24)
+    if len(header) < 24:
+        return
+
+    for endian in ('<', '>'):
+        magic, = struct.unpack(endian + 'I', header[:4])
+        if magic in (_PCAP_MAGIC_USEC, _PCAP_MAGIC_NSEC):
+            break
+    else:
+        raise ValueError('invalid pcap magic 0x{}'.format(header[:4].encode('hex')))
+
+    ts_frac_ns = 1 if magic == _PCAP_MAGIC_NSEC else 1000
+    record_header = struct.Struct(endian + 'IIII')
+
+    while True:
+        record = pcap_file.read(record_header.size)
+        if len(record) < record_header.size:
+            return
+
+        ts_sec, ts_frac, incl_len, _ = record_header.unpack(record)
+        frame = pcap_file.read(incl_len)
+        if len(frame) < incl_len:
+            return
+
+        yield ts_sec * 1000000000 + ts_frac * ts_frac_ns, frame
+
+
+def udp_payload(frame):
+    """
+    :return: udp payload of an (optionally vlan tagged) ipv4 frame or None
+    """
+    offset = 12
+    eth_type, = struct.unpack_from('!H', frame, offset)
+    if eth_type == _ETH_TYPE_VLAN:
+        offset += 4
+        eth_type, = struct.unpack_from('!H', frame, offset)
+    offset += 2
+
+    if eth_type != _ETH_TYPE_IP4 or len(frame) < offset + 20:
+        return None
+
+    version_ihl, = struct.unpack_from('!B', frame, offset)
+    ip_proto, = struct.unpack_from('!B', frame, offset + 9)
+    if ip_proto != _IP_PROTO_UDP:
+        return None
+
+    return frame[offset + (version_ihl & 0x0f) * 4 + _UDP_HEADER_LEN:]
+
+
+def sequence_tag(frame):
+    """
+    :return: stream_tag, sequence_number of the frame or None if the frame carries no sequence tag
+    """
+    try:
+        payload = udp_payload(frame)
+    except struct.error:
+        return None
+
+    if not payload or len(payload) < 8:
+        return None
+
+    sequence_number, tag = struct.unpack_from('!II', payload)
+    if tag >> 16 != SEQUENCE_TAG_MAGIC:
+        return None
+
+    return tag, sequence_number
+
+
+def arrival_times(pcap_file, tags=None):
+    """
+    arrival time of every sequence tagged frame in the capture of a regular (not mirror) port - the reference
+    of the mirror delay (see StreamLoss)
+    :param pcap_file: file like object opened in binary mode
+    :param tags: optional stream tags to be kept - e.g. the streams sent to the port, not the ones sent by it
+    :return: dict stream tag -> array of arrival times [ns] indexed by sequence number (-1 if not captured)
+    """
+    arrivals = {}
+
+    for timestamp_ns, frame in pcap_frames(pcap_file):
+        tagged = sequence_tag(frame)
+        if not tagged:
+            continue
+
+        tag, sequence_number = tagged
+        if tags is not None and tag not in tags:
+            continue
+
+        # signed long - 64 bit on the (linux) drone hosts
+        stream_arrivals = arrivals.setdefault(tag, array.array('l'))
+        if sequence_number >= len(stream_arrivals):
+            stream_arrivals.extend([_NOT_ARRIVED] * (sequence_number + 1 - len(stream_arrivals)))
+        # duplicates keep the first arrival
+        if stream_arrivals[sequence_number] == _NOT_ARRIVED:
+            stream_arrivals[sequence_number] = timestamp_ns
+
+    return arrivals
+
+
+class StreamLoss(object):
+    """
+    loss/reordering tracker of a single sequence tagged stream
+
+    if the arrival times of the frames at their regular destination port are known (see arrival_times) the
+    mirror delay and jitter are tracked too - the delay of a frame is its arrival on the mirror port minus its
+    arrival on the destination port, so the timing of the sender cancels out. it is negative if the mirror copy
+    left the switch first. the jitter is the change of the delay between consecutive mirrored frames
+    """
+
+    def __init__(self, tag, interface_name=None, direct_arrivals=None):
+        """
+        :param direct_arrivals: optional array of arrival times [ns] at the destination port indexed by sequence
+                                number (see arrival_times)
+        """
+        self.tag = tag
+        self.interface_name = interface_name
+        self.direct_arrivals = direct_arrivals
+        self.rx_frames = 0
+        self.lost_frames = 0
+        self.reordered_frames = 0
+        self.duplicate_frames = 0
+        self.burst_histogram = {}
+
+        self._next_sequence_number = 0
+        # sequence number ranges [start, end) considered lost - sorted by start
+        self._missing_starts = []
+        self._missing_ends = []
+
+        # delay / jitter in ns - arrays to keep the memory footprint small
+        self._delays = array.array('d')
+        self._jitters = array.array('d')
+        self._last_delay = None
+
+    def _burst_add(self, burst_len):
+        self.lost_frames += burst_len
+        self.burst_histogram[burst_len] = self.burst_histogram.get(burst_len, 0) + 1
+
+        self._missing_starts.append(self._next_sequence_number)
+        self._missing_ends.append(self._next_sequence_number + burst_len)
+
+    def _late_frame_add(self, sequence_number):
+        """
+        :return: True if the frame was considered lost before (reordered), False for duplicates
+        """
+        idx = bisect.bisect_right(self._missing_starts, sequence_number) - 1
+        if idx < 0 or sequence_number >= self._missing_ends[idx]:
+            return False
+
+        start, end = self._missing_starts[idx], self._missing_ends[idx]
+        del self._missing_starts[idx]
+        del self._missing_ends[idx]
+
+        # split the missing range around the late frame
+        if sequence_number + 1 < end:
+            self._missing_starts.insert(idx, sequence_number + 1)
+            self._missing_ends.insert(idx, end)
+        if start < sequence_number:
+            self._missing_starts.insert(idx, start)
+            self._missing_ends.insert(idx, sequence_number)
+
+        return True
+
+    def _timing_add(self, sequence_number, timestamp_ns):
+        if sequence_number >= len(self.direct_arrivals) or \
+                self.direct_arrivals[sequence_number] == _NOT_ARRIVED:
+            # lost on the way to the destination port - no reference
+            return
+
+        delay = float(timestamp_ns - self.direct_arrivals[sequence_number])
+        self._delays.append(delay)
+
+        if self._last_delay is not None:
+            self._jitters.append(abs(delay - self._last_delay))
+        self._last_delay = delay
+
+    def frame_add(self, sequence_number, timestamp_ns=None):
+        self.rx_frames += 1
+
+        if self.direct_arrivals is not None and timestamp_ns is not None:
+            self._timing_add(sequence_number, timestamp_ns)
+
+        if sequence_number == self._next_sequence_number:
+            self._next_sequence_number += 1
+        elif sequence_number > self._next_sequence_number:
+            self._burst_add(sequence_number - self._next_sequence_number)
+            self._next_sequence_number = sequence_number + 1
+        elif self._late_frame_add(sequence_number):
+            # counted as lost before - the burst histogram keeps the original gap
+            self.reordered_frames += 1
+            self.lost_frames -= 1
+        else:
+            self.duplicate_frames += 1
+
+    def finish(self, tx_frames):
+        """
+        account the frames missing at the end of the stream
+        :param tx_frames: number of frames sent by the stream
+        """
+        if tx_frames > self._next_sequence_number:
+            self._burst_add(tx_frames - self._next_sequence_number)
+            self._next_sequence_number = tx_frames
+
+    @property
+    def loss_bursts(self):
+        return sum(self.burst_histogram.values())
+
+    @property
+    def max_burst_len(self):
+        return max(self.burst_histogram) if self.burst_histogram else 0
+
+    def delay_percentiles_us(self, percents=(50, 99, 100)):
+        """
+        :return: list of mirror delay percentiles in us (None if unknown)
+        """
+        delays = sorted(self._delays)
+        if not delays:
+            return [None for _ in percents]
+
+        return [percentile(delays, percent) / 1000. for percent in percents]
+
+    def jitter_percentiles_us(self, percents=(50, 99, 100)):
+        """
+        :return: list of mirror jitter percentiles in us (None if unknown)
+        """
+        jitters = sorted(self._jitters)
+        if not jitters:
+            return [None for _ in percents]
+
+        return [percentile(jitters, percent) / 1000. for percent in percents]
+
+    def burst_histogram_json(self):
+        return json.dumps(dict((str(burst_len), count) for burst_len, count in sorted(self.burst_histogram.items())))
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return 'tag: 0x{:08x}, rx_frames: {:<8}, lost: {:<8}, bursts: {:<6}, max_burst: {:<6}, reordered: {:<6}, ' \
+               'duplicates: {:<6}'.format(self.tag,
+                                          self.rx_frames,
+                                          self.lost_frames,
+                                          self.loss_bursts,
+                                          self.max_burst_len,
+                                          self.reordered_frames,
+                                          self.duplicate_frames)
+
+
+def capture_analyse(pcap_file, direct_arrivals_by_tag=None):
+    """
+    track all sequence tagged streams found in the given capture
+    :param pcap_file: file like object opened in binary mode
+    :param direct_arrivals_by_tag: optional stream tag -> arrival times at the destination port (see
+                                   arrival_times) - enables delay/jitter tracking of mirror port captures
+    :return: dict stream tag -> StreamLoss (call StreamLoss.finish to account trailing losses)
+    """
+    direct_arrivals_by_tag = direct_arrivals_by_tag or {}
+    streams = {}
+
+    for timestamp_ns, frame in pcap_frames(pcap_file):
+        tagged = sequence_tag(frame)
+        if not tagged:
+            continue
+
+        tag, sequence_number = tagged
+        if tag not in streams:
+            streams[tag] = StreamLoss(tag, direct_arrivals=direct_arrivals_by_tag.get(tag))
+        streams[tag].frame_add(sequence_number, timestamp_ns)
+
+    return streams
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='mirror/bandwidth test tool - sequence tag capture analysis')
+    parser.add_argument('-r', '--read-file', type=str, required=True, help='pcap file to be analysed')
+    parser.add_argument('-d', '--direct-file', action='append', default=[],
+                        help='pcap file of a destination port captured at the same time (repeatable) - enables '
+                             'the delay and jitter calculation of the mirrored frames, holding only the frames '
+                             'received by the port')
+
+    args = parser.parse_args()
+
+    direct_arrivals_by_tag = {}
+    for direct_file_name in args.direct_file:
+        with open(direct_file_name, 'rb') as pcap_file:
+            direct_arrivals_by_tag.update(arrival_times(pcap_file))
+
+    with open(args.read_file, 'rb') as pcap_file:
+        streams = capture_analyse(pcap_file, direct_arrivals_by_tag)
+
+    for tag in sorted(streams):
+        port_id, ordinal = stream_tag_split(tag)
+        print 'port_id: {:<3} ordinal: {:<3} {} histogram: {} delay_us (p50, p99, max): {} ' \
+              'jitter_us (p50, p99, max): {}'.format(port_id, ordinal, streams[tag],
+                                                      streams[tag].burst_histogram_json(),
+                                                      streams[tag].delay_percentiles_us(),
+                                                      streams[tag].jitter_percentiles_us())
+
+    sys.exit(0)
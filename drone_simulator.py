@@ -0,0 +1,720 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+try:
+    from ostinato.core import ost_pb
+    from ostinato.protocols.mac_pb2 import mac
+    from ostinato.protocols.payload_pb2 import payload
+    from ostinato.protocols.protocol_pb2 import StreamCore, StreamControl
+except ImportError:
+    from ostinato_compat import ost_pb, mac, payload, StreamCore, StreamControl
+
+'''
+offline stand-in of the ostinato drone - the drone ports are connected to a simulated switch
+
+SimulatedDroneProxy implements the rpcs used by OstinatoInterface, the frames of all started streams are run
+through a SwitchModel (store and forward switch with a single mirror session, tail drop FIFOs at the egress
+ports and an optional backplane limit). if python-ostinato is not installed the stand-ins of ostinato_compat.py
+are used
+
+LocalDroneProxy keeps the port and stream configuration of drones served in process (see packet_engine.py too)
+'''
+
+# preamble + start frame delimiter and inter frame gap (see ostinato_interface.L1_OVERHEAD_BYTES)
+_L1_OVERHEAD_BYTES = 20
+# frame len captured per frame - eth + ip + udp header and the sequence tag
+_CAPTURE_LEN = 50
+# frames evaluated at once by the vectorized FIFO
+_FIFO_CHUNK = 4096
+# passes of interleaved streams simulated on startTransmit - the drone repeats them until stopTransmit, a port
+# stopped later than that is idle after the last pass
+_INTERLEAVED_PASSES = 3
+
+_PCAP_MAGIC_NSEC = 0xa1b23c4d
+_PCAP_LINKTYPE_ETHERNET = 1
+
+# eth + ip + udp header and the sequence tag (capture_analysis) - _CAPTURE_LEN bytes
+FRAME_HEADER = np.dtype([
+    ('dst_mac_hi', '>u2'), ('dst_mac_lo', '>u4'), ('src_mac_hi', '>u2'), ('src_mac_lo', '>u4'), ('eth_type', '>u2'),
+    ('ip_version_ihl', 'u1'), ('ip_tos', 'u1'), ('ip_len', '>u2'), ('ip_id', '>u2'), ('ip_frag', '>u2'),
+    ('ip_ttl', 'u1'), ('ip_proto', 'u1'), ('ip_checksum', '>u2'), ('ip_src', '>u4'), ('ip_dst', '>u4'),
+    ('udp_src_port', '>u2'), ('udp_dst_port', '>u2'), ('udp_len', '>u2'), ('udp_checksum', '>u2'),
+    ('sequence_number', '>u4'), ('stream_tag', '>u4')])
+
+_PCAP_HEADER = np.dtype([('magic', '<u4'), ('version_major', '<u2'), ('version_minor', '<u2'), ('thiszone', '<i4'),
+                         ('sigfigs', '<u4'), ('snaplen', '<u4'), ('network', '<u4')])
+_PCAP_RECORD = np.dtype([('ts_sec', '<u4'), ('ts_nsec', '<u4'), ('incl_len', '<u4'), ('orig_len', '<u4'),
+                         ('frame', FRAME_HEADER)])
+
+# one entry per frame sent by the drone
+FRAME_DTYPE = np.dtype([('nominal', 'f8'), ('tx_done', 'f8'), ('arrival', 'f8'), ('src_port', 'i4'),
+                        ('frame_len', 'i4'), ('src_mac', 'u8'), ('dst_mac', 'u8'), ('sequence_number', 'u4'),
+                        ('stream_tag', 'u4')])
+
+
+def frame_headers(frames):
+    """
+    :param frames: FRAME_DTYPE array
+    :return: FRAME_HEADER array - the first bytes of each frame on the wire
+    """
+    headers = np.zeros(len(frames), dtype=FRAME_HEADER)
+    headers['dst_mac_hi'] = frames['dst_mac'] >> 32
+    headers['dst_mac_lo'] = frames['dst_mac'] & 0xffffffff
+    headers['src_mac_hi'] = frames['src_mac'] >> 32
+    headers['src_mac_lo'] = frames['src_mac'] & 0xffffffff
+    headers['eth_type'] = 0x0800
+    headers['ip_version_ihl'] = 0x45
+    # without FCS
+    headers['ip_len'] = frames['frame_len'] - 4 - 14
+    headers['ip_ttl'] = 64
+    headers['ip_proto'] = 17
+    headers['udp_len'] = frames['frame_len'] - 4 - 14 - 20
+    headers['sequence_number'] = frames['sequence_number']
+    headers['stream_tag'] = frames['stream_tag']
+
+    return headers
+
+
+def pcap_build(captured):
+    """
+    :param captured: list of (timestamps [ns], frame lens incl. FCS, FRAME_HEADER array) - one per block of frames
+    :return: pcap (ns timestamps) - headers only
+    """
+    header = np.array([(_PCAP_MAGIC_NSEC, 2, 4, 0, 0, 65535, _PCAP_LINKTYPE_ETHERNET)], dtype=_PCAP_HEADER)
+    buffers = [header.tobytes()]
+
+    for timestamps_ns, frame_lens, headers in captured:
+        records = np.zeros(len(headers), dtype=_PCAP_RECORD)
+        records['ts_sec'] = timestamps_ns // 1000000000
+        records['ts_nsec'] = timestamps_ns % 1000000000
+        records['incl_len'] = _CAPTURE_LEN
+        # the FCS is not captured
+        records['orig_len'] = frame_lens - 4
+        records['frame'] = headers
+
+        buffers.append(records.tobytes())
+
+    return b''.join(buffers)
+
+
+def _tail_drop_fifo(arrivals, bits, rate_bps, buffer_bits=np.inf):
+    """
+    single server FIFO with a tail drop buffer
+    departure_k = max(arrival_k, departure_k-1) + service_k is evaluated vectorized chunk by chunk as long as
+    nothing gets dropped - after an overflow frame by frame until the queue is drained again
+    :param arrivals: sorted arrival times [s]
+    :param bits: size of each frame on the wire
+    :param rate_bps: service rate
+    :param buffer_bits: capacity of the queue (incl. the frame in transmission)
+    :return: departure times [s], NaN for dropped frames
+    """
+    n = len(arrivals)
+    service = bits / float(rate_bps)
+    departures = np.full(n, np.nan)
+    # time the server gets idle
+    free = -np.inf
+    idx = 0
+    arrival_list = service_list = level_max_list = None
+    nan = float('nan')
+
+    while idx < n:
+        end = min(n, idx + _FIFO_CHUNK)
+        chunk_arrivals = arrivals[idx:end]
+        chunk_service = service[idx:end]
+
+        completed = np.cumsum(chunk_service)
+        chunk_departures = completed + np.maximum(
+            free, np.maximum.accumulate(chunk_arrivals - (completed - chunk_service)))
+
+        previous_departures = np.concatenate(([free], chunk_departures[:-1]))
+        backlog_bits = np.maximum(previous_departures - chunk_arrivals, 0) * rate_bps
+        overflows = np.flatnonzero(backlog_bits + bits[idx:end] > buffer_bits)
+
+        if not len(overflows):
+            departures[idx:end] = chunk_departures
+            free = chunk_departures[-1]
+            idx = end
+            continue
+
+        first_overflow = overflows[0]
+        departures[idx:idx + first_overflow] = chunk_departures[:first_overflow]
+        if first_overflow:
+            free = chunk_departures[first_overflow - 1]
+        idx += first_overflow
+
+        # frame by frame until the queue is empty at an arrival - plain floats, numpy scalars are slow
+        if arrival_list is None:
+            arrival_list, service_list = arrivals.tolist(), service.tolist()
+            # queue level [s] above which a frame does not fit into the buffer anymore
+            level_max_list = ((buffer_bits - bits) / float(rate_bps)).tolist()
+        start = idx
+        segment = []
+        append = segment.append
+        while idx < n:
+            arrival = arrival_list[idx]
+            if free <= arrival:
+                break
+            if free - arrival > level_max_list[idx]:
+                append(nan)
+            else:
+                free += service_list[idx]
+                append(free)
+            idx += 1
+        departures[start:idx] = segment
+
+    return departures
+
+
+class SwitchModel(object):
+    def __init__(self, port_names, mirror_port, mirrored_ports, link_speed_mbit=100, mirror_egress_mbit=None,
+                 mirror_buffer_bytes=16 * 1024, port_buffer_bytes=64 * 1024, backplane_mbit=None,
+                 backplane_buffer_bytes=64 * 1024):
+        """
+        store and forward switch - every frame received on or sent by a mirrored port is copied to the mirror port
+        frames and mirror copies pass the backplane (if limited) and get queued at the egress port (tail drop)
+        the ports carry the names of the drone interfaces connected to them
+        :param port_names: all ports of the switch
+        :param mirror_port: destination of the mirror session
+        :param mirrored_ports: sources of the mirror session (rx and tx)
+        :param link_speed_mbit: of all ports
+        :param mirror_egress_mbit: egress rate of the mirror port (default: link speed)
+        :param mirror_buffer_bytes: egress buffer of the mirror port
+        :param port_buffer_bytes: egress buffer of all other ports
+        :param backplane_mbit: forwarding capacity shared by all frames incl. the mirror copies (default: unlimited)
+        :param backplane_buffer_bytes: input buffer of the backplane
+        """
+        self.port_names = list(port_names)
+        self.mirror_port = self.port_names.index(mirror_port)
+        self.mirrored_ports = [self.port_names.index(name) for name in mirrored_ports]
+
+        self.link_bps = link_speed_mbit * 1000. * 1000.
+        self.mirror_egress_bps = (mirror_egress_mbit or link_speed_mbit) * 1000. * 1000.
+        self.mirror_buffer_bits = mirror_buffer_bytes * 8.
+        self.port_buffer_bits = port_buffer_bytes * 8.
+        self.backplane_bps = backplane_mbit * 1000. * 1000. if backplane_mbit else None
+        self.backplane_buffer_bits = backplane_buffer_bytes * 8.
+
+    def forward(self, arrivals, frame_lens, src_ports, dst_ports):
+        """
+        :param arrivals: time [s] each frame is completely received by the switch - sorted
+        :param frame_lens: incl. FCS
+        :param src_ports: ingress port index per frame
+        :param dst_ports: egress port index per frame, -1 for unknown destinations (flooded)
+        :return: frame index, egress port index and departure time [s] (NaN if dropped) of every frame copy
+        """
+        frame_idx = np.arange(len(arrivals))
+        flooded = dst_ports < 0
+        flood_ports = [port for port in range(len(self.port_names)) if port != self.mirror_port]
+
+        item_frames = [frame_idx[~flooded]]
+        item_ports = [dst_ports[~flooded]]
+        for port in flood_ports:
+            flood_frames = frame_idx[flooded & (src_ports != port)]
+            item_frames.append(flood_frames)
+            item_ports.append(np.full(len(flood_frames), port, dtype=int))
+
+        # flooded frames leave the mirrored ports too
+        mirrored = np.in1d(src_ports, self.mirrored_ports) | np.in1d(dst_ports, self.mirrored_ports) | flooded
+        item_frames.append(frame_idx[mirrored])
+        item_ports.append(np.full(np.count_nonzero(mirrored), self.mirror_port, dtype=int))
+
+        item_frames = np.concatenate(item_frames)
+        item_ports = np.concatenate(item_ports)
+
+        # stable - the original frame passes the backplane before its mirror copy
+        order = np.argsort(arrivals[item_frames], kind='mergesort')
+        item_frames = item_frames[order]
+        item_ports = item_ports[order]
+
+        item_bits = (frame_lens[item_frames] + _L1_OVERHEAD_BYTES) * 8.
+        item_times = arrivals[item_frames]
+
+        if self.backplane_bps:
+            item_times = _tail_drop_fifo(item_times, item_bits, self.backplane_bps, self.backplane_buffer_bits)
+
+        departures = np.full(len(item_frames), np.nan)
+        for port in range(len(self.port_names)):
+            selected = np.flatnonzero((item_ports == port) & ~np.isnan(item_times))
+            if not len(selected):
+                continue
+
+            if port == self.mirror_port:
+                rate_bps, buffer_bits = self.mirror_egress_bps, self.mirror_buffer_bits
+            else:
+                rate_bps, buffer_bits = self.link_bps, self.port_buffer_bits
+
+            departures[selected] = _tail_drop_fifo(item_times[selected], item_bits[selected], rate_bps, buffer_bits)
+
+        return item_frames, item_ports, departures
+
+
+class _PortTimeline(object):
+    """
+    tx and rx events of a single port during a simulated transmission
+    """
+
+    def __init__(self, tx_times, tx_lens, rx_times, rx_lens, rx_frames):
+        tx_order = np.argsort(tx_times, kind='mergesort')
+        rx_order = np.argsort(rx_times, kind='mergesort')
+
+        self.tx_times = tx_times[tx_order]
+        self.tx_bytes = np.cumsum(tx_lens[tx_order])
+        self.rx_times = rx_times[rx_order]
+        self.rx_bytes = np.cumsum(rx_lens[rx_order])
+        # index into the frames of the transmission - used to build the capture
+        self.rx_frames = rx_frames[rx_order]
+
+    @property
+    def tx_end(self):
+        return self.tx_times[-1] if len(self.tx_times) else 0.
+
+    def counters(self, elapsed):
+        """
+        :return: rx_pkts, rx_bytes, tx_pkts, tx_bytes after elapsed seconds
+        """
+        rx_pkts = int(np.searchsorted(self.rx_times, elapsed, side='right'))
+        tx_pkts = int(np.searchsorted(self.tx_times, elapsed, side='right'))
+
+        return np.array([rx_pkts, int(self.rx_bytes[rx_pkts - 1]) if rx_pkts else 0,
+                         tx_pkts, int(self.tx_bytes[tx_pkts - 1]) if tx_pkts else 0])
+
+
+class _Transmission(object):
+    """
+    all frames sent by the drone after a startTransmit and their way through the switch
+    """
+
+    def __init__(self, start_time, frames, dst_ports, timelines, looping_ports=()):
+        """
+        :param looping_ports: ports sending until they are stopped (interleaved streams)
+        """
+        self.start_time = start_time
+        self.frames = frames
+        self.dst_ports = dst_ports
+        self.timelines = timelines
+        self.looping_ports = set(looping_ports)
+
+    def counters(self, port, elapsed):
+        if port not in self.timelines:
+            return np.zeros(4, dtype=int)
+        return self.timelines[port].counters(elapsed)
+
+    def is_transmitting(self, port, elapsed):
+        return port in self.looping_ports or (port in self.timelines and elapsed < self.timelines[port].tx_end)
+
+
+class LocalDroneProxy(object):
+    def __init__(self, port_names, seed=0):
+        """
+        port and stream configuration of a drone served in process - the transmission is up to the subclasses
+        :param port_names: interface name per port id
+        :param seed: of the random frame lens
+        """
+        self.port_names = list(port_names)
+        self._random = np.random.RandomState(seed)
+
+        self._port_count = len(self.port_names)
+        # port -> stream id -> stream config
+        self._streams = dict((port, {}) for port in range(self._port_count))
+        self._transmit_modes = dict((port, ost_pb.kSequentialTransmit) for port in range(self._port_count))
+        self._capture_on = set()
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def getPortIdList(self):
+        port_id_list = ost_pb.PortIdList()
+        for port in range(self._port_count):
+            port_id_list.port_id.add().id = port
+        return port_id_list
+
+    def getPortConfig(self, port_id_list):
+        port_config_list = ost_pb.PortConfigList()
+        for port_id in port_id_list.port_id:
+            port = port_config_list.port.add()
+            port.port_id.id = port_id.id
+            port.name = self.port_names[port_id.id]
+            port.is_enabled = True
+            port.transmit_mode = self._transmit_modes[port_id.id]
+        return port_config_list
+
+    def modifyPort(self, port_config_list):
+        for port in port_config_list.port:
+            self._transmit_modes[port.port_id.id] = port.transmit_mode
+
+    def getStreamIdList(self, port_id):
+        stream_id_list = ost_pb.StreamIdList()
+        stream_id_list.port_id.id = port_id.id
+        for stream_id in sorted(self._streams[port_id.id]):
+            stream_id_list.stream_id.add().id = stream_id
+        return stream_id_list
+
+    def addStream(self, stream_id_list):
+        for stream_id in stream_id_list.stream_id:
+            stream = ost_pb.StreamConfigList().stream.add()
+            stream.stream_id.id = stream_id.id
+            self._streams[stream_id_list.port_id.id][stream_id.id] = stream
+
+    def deleteStream(self, stream_id_list):
+        for stream_id in stream_id_list.stream_id:
+            self._streams[stream_id_list.port_id.id].pop(stream_id.id, None)
+
+    def modifyStream(self, stream_config_list):
+        for stream in stream_config_list.stream:
+            stream_copy = ost_pb.StreamConfigList().stream.add()
+            stream_copy.CopyFrom(stream)
+            self._streams[stream_config_list.port_id.id][stream.stream_id.id] = stream_copy
+
+    def startCapture(self, port_id_list):
+        for port_id in port_id_list.port_id:
+            self._capture_on.add(port_id.id)
+
+    def stopCapture(self, port_id_list):
+        for port_id in port_id_list.port_id:
+            self._capture_on.discard(port_id.id)
+
+    def _port_frames(self, port, passes=1):
+        """
+        all frames of the enabled streams of the given port ordered by their nominal tx time - the streams are
+        sent one after another (sequential) or merged (interleaved)
+        :param passes: interleaved only - number of times the merged streams are sent
+        :return: FRAME_DTYPE array, None if the port has no enabled stream
+        """
+        streams = sorted((stream for stream in self._streams[port].values() if stream.core.is_enabled),
+                         key=lambda stream: stream.core.ordinal)
+        interleaved = self._transmit_modes[port] == ost_pb.kInterleavedTransmit
+
+        offset = 0.
+        stream_frames = []
+        if interleaved:
+            for repeat in range(passes if streams else 0):
+                durations = []
+                for stream in streams:
+                    frames, duration = self._stream_frames(stream, port, offset, repeat)
+                    stream_frames.append(frames)
+                    durations.append(duration)
+                offset += max(durations)
+        else:
+            for stream in streams:
+                frames, duration = self._stream_frames(stream, port, offset)
+                stream_frames.append(frames)
+                offset += duration
+
+                if stream.control.next == StreamControl.e_nw_stop:
+                    break
+
+        if not stream_frames:
+            return None
+
+        frames = np.concatenate(stream_frames)
+
+        return frames[np.argsort(frames['nominal'], kind='mergesort')]
+
+    def _stream_frames(self, stream, port, offset, repeat=0):
+        """
+        :param repeat: number of times the stream was sent before - the counters go on
+        :return: frames of the given stream, duration [s] of the stream
+        """
+        control = stream.control
+        core = stream.core
+
+        if control.unit == StreamControl.e_su_bursts:
+            frame_count = control.num_bursts * control.packets_per_burst
+            nominal = np.repeat(np.arange(control.num_bursts) / float(control.bursts_per_sec),
+                                control.packets_per_burst)
+            duration = control.num_bursts / float(control.bursts_per_sec)
+        else:
+            frame_count = control.num_packets
+            nominal = np.arange(frame_count) / float(control.packets_per_sec)
+            duration = frame_count / float(control.packets_per_sec)
+
+        frames = np.zeros(frame_count, dtype=FRAME_DTYPE)
+        frames['nominal'] = offset + nominal
+        frames['src_port'] = port
+
+        counter = np.arange(frame_count) + repeat * frame_count
+        len_range = core.frame_len_max - core.frame_len_min + 1
+        if core.len_mode == StreamCore.e_fl_inc:
+            frames['frame_len'] = core.frame_len_min + counter % len_range
+        elif core.len_mode == StreamCore.e_fl_dec:
+            frames['frame_len'] = core.frame_len_max - counter % len_range
+        elif core.len_mode == StreamCore.e_fl_random:
+            frames['frame_len'] = self._random.randint(core.frame_len_min, core.frame_len_max + 1, frame_count)
+        else:
+            frames['frame_len'] = core.frame_len
+
+        for protocol in stream.protocol:
+            if protocol.protocol_id.id == ost_pb.Protocol.kMacFieldNumber:
+                frames['src_mac'] = protocol.Extensions[mac].src_mac
+                frames['dst_mac'] = protocol.Extensions[mac].dst_mac
+            elif protocol.protocol_id.id == ost_pb.Protocol.kPayloadFieldNumber:
+                # the fixed word pattern fills the whole payload - unless a counter overwrites the first word
+                frames['stream_tag'] = protocol.Extensions[payload].pattern
+                frames['sequence_number'] = protocol.Extensions[payload].pattern
+                for variable_field in protocol.variable_field:
+                    if variable_field.offset == 0:
+                        frames['sequence_number'] = (variable_field.value + counter % variable_field.count *
+                                                     variable_field.step) % (1 << 32)
+
+        return frames, duration
+
+
+class SimulatedDroneProxy(LocalDroneProxy):
+    def __init__(self, switch_model, realtime=False, seed=0):
+        """
+        stand-in of ostinato.core.DroneProxy - every drone port is connected to the switch port of the same name
+        a transmission is simulated completely on startTransmit - sequential streams are sent to completion,
+        interleaved streams are repeated until stopTransmit
+        :param switch_model: SwitchModel the drone ports are connected to
+        :param realtime: False - counters jump to their final values and the transmission is done right away
+                         (fast sweeps, use polling), True - counters follow the simulated timeline in wall clock
+                         time (counter sampling, ramp), stopTransmit drops the frames not sent yet
+        :param seed: of the random frame lens
+        """
+        LocalDroneProxy.__init__(self, switch_model.port_names, seed)
+
+        self._switch = switch_model
+        self._realtime = realtime
+        # src mac -> port
+        self._mac_table = {}
+
+        self._transmission = None
+        self._counter_offsets = dict((port, np.zeros(4, dtype=int)) for port in range(self._port_count))
+        self._captures = dict((port, []) for port in range(self._port_count))
+
+    def _elapsed(self):
+        if not self._transmission:
+            return 0.
+        if not self._realtime:
+            return np.inf
+        return time.time() - self._transmission.start_time
+
+    def _counters(self, port):
+        counters = self._counter_offsets[port].copy()
+        if self._transmission:
+            counters += self._transmission.counters(port, self._elapsed())
+        return counters
+
+    def clearStats(self, port_id_list):
+        for port_id in port_id_list.port_id:
+            self._counter_offsets[port_id.id] = self._counter_offsets[port_id.id] - self._counters(port_id.id)
+
+    def getStats(self, port_id_list):
+        port_stats_list = ost_pb.PortStatsList()
+        elapsed = self._elapsed()
+
+        for port_id in port_id_list.port_id:
+            stats = port_stats_list.port_stats.add()
+            stats.port_id.id = port_id.id
+            stats.rx_pkts, stats.rx_bytes, stats.tx_pkts, stats.tx_bytes = \
+                [int(counter) for counter in self._counters(port_id.id)]
+            stats.state.is_transmit_on = bool(self._transmission) and \
+                self._transmission.is_transmitting(port_id.id, elapsed)
+            stats.state.is_capture_on = port_id.id in self._capture_on
+
+        return port_stats_list
+
+    def startCapture(self, port_id_list):
+        LocalDroneProxy.startCapture(self, port_id_list)
+        for port_id in port_id_list.port_id:
+            self._captures[port_id.id] = []
+
+    def stopTransmit(self, port_id_list):
+        transmission = self._transmission
+        if not transmission:
+            return
+
+        # without realtime counters only the looping ports are still sending
+        stopped = set(port_id.id for port_id in port_id_list.port_id)
+        if not self._realtime:
+            stopped &= transmission.looping_ports
+
+        # the frames of the stopped ports not sent yet are dropped - the switch is causal, the frames sent before
+        # keep their fate, the frames of the other ports after the stop are run through the switch again
+        stop = time.time() - transmission.start_time
+        frames = transmission.frames
+        kept = ~(np.in1d(frames['src_port'], list(stopped)) & (frames['tx_done'] > stop))
+        transmission.looping_ports -= stopped
+        if np.all(kept):
+            return
+
+        transmission.frames = frames[kept]
+        transmission.dst_ports = transmission.dst_ports[kept]
+        transmission.timelines = self._timelines(transmission.frames, transmission.dst_ports)
+
+    def startTransmit(self, port_id_list):
+        # the previous transmission is over - keep its counters
+        if self._transmission:
+            for port in range(self._port_count):
+                self._counter_offsets[port] = self._counter_offsets[port] + self._transmission.counters(port, np.inf)
+
+        ports = [port_id.id for port_id in port_id_list.port_id]
+        frames = self._frames_build(ports)
+        dst_ports = self._dst_ports(frames)
+        self._mac_learn(frames)
+
+        looping_ports = [port for port in ports if self._transmit_modes[port] == ost_pb.kInterleavedTransmit and
+                         np.any(frames['src_port'] == port)]
+        timelines = self._timelines(frames, dst_ports)
+
+        # the transmission starts once it is simulated - the simulation of a long ramp takes seconds, the
+        # realtime counters would be ahead of the wall clock otherwise
+        self._transmission = _Transmission(time.time(), frames, dst_ports, timelines, looping_ports)
+
+        for port in self._capture_on:
+            self._captures[port].append(self._transmission)
+
+    def _timelines(self, frames, dst_ports):
+        """
+        run the frames through the switch
+        :return: port -> _PortTimeline
+        """
+        item_frames, item_ports, departures = self._switch.forward(frames['arrival'], frames['frame_len'],
+                                                                   frames['src_port'], dst_ports)
+
+        delivered = ~np.isnan(departures)
+        timelines = {}
+        for port in range(self._port_count):
+            tx = frames['src_port'] == port
+            rx = delivered & (item_ports == port)
+            if not np.any(tx) and not np.any(rx):
+                continue
+
+            rx_frames = item_frames[rx]
+            timelines[port] = _PortTimeline(frames['tx_done'][tx], frames['frame_len'][tx],
+                                            departures[rx], frames['frame_len'][rx_frames], rx_frames)
+
+        return timelines
+
+    def getCaptureBuffer(self, port_id):
+        """
+        :return: pcap (ns timestamps) of the frames received while the capture was running - headers only
+        """
+        captured = []
+
+        for transmission in self._captures[port_id.id]:
+            timeline = transmission.timelines.get(port_id.id)
+            if timeline is None or not len(timeline.rx_times):
+                continue
+
+            frames = transmission.frames[timeline.rx_frames]
+            timestamps_ns = (transmission.start_time * 1e9 + timeline.rx_times * 1e9).astype(np.uint64)
+            captured.append((timestamps_ns, frames['frame_len'], frame_headers(frames)))
+
+        return pcap_build(captured)
+
+    def _dst_ports(self, frames):
+        """
+        egress port per frame - a destination is known if it was learned before or its first frame of this
+        transmission already reached the switch
+        """
+        dst_ports = np.full(len(frames), -1, dtype=int)
+
+        for dst_mac in np.unique(frames['dst_mac']).tolist():
+            to_mac = frames['dst_mac'] == dst_mac
+
+            if dst_mac in self._mac_table:
+                dst_ports[to_mac] = self._mac_table[dst_mac]
+                continue
+
+            from_mac = np.flatnonzero(frames['src_mac'] == dst_mac)
+            if len(from_mac):
+                learned = to_mac & (frames['arrival'] > frames['arrival'][from_mac[0]])
+                dst_ports[learned] = frames['src_port'][from_mac[0]]
+
+        return dst_ports
+
+    def _mac_learn(self, frames):
+        for src_port in np.unique(frames['src_port']):
+            for src_mac in np.unique(frames['src_mac'][frames['src_port'] == src_port]):
+                self._mac_table[int(src_mac)] = int(src_port)
+
+    def _frames_build(self, ports):
+        """
+        all frames sent by the given ports ordered by the time they are completely received by the switch
+        the nic serializes the frames of a port at line rate
+        """
+        port_frames = []
+
+        for port in ports:
+            frames = self._port_frames(port, _INTERLEAVED_PASSES)
+            if frames is None:
+                continue
+
+            frames['tx_done'] = _tail_drop_fifo(frames['nominal'],
+                                                (frames['frame_len'] + _L1_OVERHEAD_BYTES) * 8.,
+                                                self._switch.link_bps)
+            port_frames.append(frames)
+
+        if not port_frames:
+            return np.zeros(0, dtype=FRAME_DTYPE)
+
+        frames = np.concatenate(port_frames)
+        # store and forward - the switch got the frame once the nic sent it completely
+        frames['arrival'] = frames['tx_done']
+
+        return frames[np.argsort(frames['arrival'], kind='mergesort')]
+
+
+def ramp_check(speed_pattern_set_name, frame_len, step_duration, tolerance=0.1):
+    """
+    smoke check of a ramp against the realtime simulation (switch_mirror_test.py -S -R) - every step has to send
+    its calculated frames between its boundaries
+    :param tolerance: accepted deviation of the frames sent per step and port (share of the calculated frames)
+    :return: True if all steps passed
+    """
+    from interface_config import LINK_SPEED_MBIT, SIMULATED_SWITCH
+    from ostinato_interface import OstinatoInterface
+    from switch_mirror_test import DEFAULT_PORT_GROUP, build_port_configs, build_setup
+    from traffic_config import SPEED_PATTERN_SETS
+
+    port_group = DEFAULT_PORT_GROUP
+    speed_patterns = SPEED_PATTERN_SETS[speed_pattern_set_name]
+    switch_model = SwitchModel(sorted(port_group.interface_names), port_group.rx_interface,
+                               port_group.mirrored_interfaces, link_speed_mbit=LINK_SPEED_MBIT, **SIMULATED_SWITCH)
+    oi = OstinatoInterface(rx_interface=port_group.rx_interface, poll_interval=0.001,
+                           drone=SimulatedDroneProxy(switch_model, realtime=True))
+    passed = True
+
+    try:
+        build_setup(oi, speed_patterns[0], frame_len, port_group=port_group)
+        oi.run(duration=step_duration, warmup=True)
+
+        steps = [build_port_configs(speed_pattern, frame_len, port_group=port_group)
+                 for speed_pattern in speed_patterns]
+
+        for speed_pattern, step, step_statistics in zip(speed_patterns, steps, oi.ramp_run(steps, step_duration)):
+            # the tx ports come first, in the order of the step
+            for tx_port_config, stat in zip(step, step_statistics):
+                calculated = tx_port_config.frames_total_calculated
+                step_passed = abs(stat.tx_frames - calculated) <= max(1, tolerance * calculated)
+                passed = passed and step_passed
+
+                print '{:<12} {:<7} calculated: {:<8} sent: {:<8} {}'.format(
+                    speed_pattern, stat.interface_name, calculated, stat.tx_frames, 'ok' if step_passed else 'FAILED')
+    finally:
+        oi.disconnect()
+
+    return passed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='mirror/bandwidth test tool - smoke check of a ramp against the '
+                                                 'realtime simulation')
+    parser.add_argument('-s', '--speed-pattern-set', default='dual-symmetric',
+                        help='speed pattern set run as ramp (default: dual-symmetric)')
+    parser.add_argument('-l', '--frame-len', type=int, default=1500, help='frame len incl. FCS (default: 1500)')
+    parser.add_argument('-t', '--step-duration', type=float, default=0.5,
+                        help='seconds per step (default: 0.5)')
+
+    args = parser.parse_args()
+
+    if not ramp_check(args.speed_pattern_set, args.frame_len, args.step_duration):
+        sys.stderr.write('ramp steps off their calculated frames. Abort.\n')
+        sys.exit(1)
@@ -0,0 +1,98 @@
+import json
+
+'''
+frame profiles - mixed frame sizes sent by a single tx port instead of one fixed frame size
+
+imix      - weighted fixed frame sizes, one stream per size (streams of a port are interleaved)
+random    - frame len uniformly distributed in [min, max]
+increment - frame len incremented by one from min to max (wraps around)
+'''
+
+FRAME_PROFILE_IMIX = 'imix'
+FRAME_PROFILE_RANDOM = 'random'
+FRAME_PROFILE_INCREMENT = 'increment'
+FRAME_PROFILE_MODES = (FRAME_PROFILE_IMIX, FRAME_PROFILE_RANDOM, FRAME_PROFILE_INCREMENT)
+
+# eth + ip + udp header, sequence tag and FCS have to fit into the frame
+FRAME_LEN_MIN = 64
+FRAME_LEN_MAX = 1518
+
+
+class FrameProfile(object):
+    def __init__(self, name, mode, frame_lens=None, min_len=None, max_len=None):
+        """
+        :param name: of the profile
+        :param mode: one of FRAME_PROFILE_MODES
+        :param frame_lens: imix only - dict frame len -> weight (relative number of frames)
+        :param min_len: random/increment only - smallest frame len
+        :param max_len: random/increment only - largest frame len
+        """
+        if mode not in FRAME_PROFILE_MODES:
+            raise ValueError('{}: invalid frame profile mode \'{}\''.format(name, mode))
+
+        if mode == FRAME_PROFILE_IMIX:
+            if not frame_lens or any(weight <= 0 for weight in frame_lens.values()):
+                raise ValueError('{}: imix needs frame lens with weights > 0'.format(name))
+            used_lens = list(frame_lens)
+        else:
+            if min_len is None or max_len is None or min_len > max_len:
+                raise ValueError('{}: {} needs min <= max'.format(name, mode))
+            used_lens = [min_len, max_len]
+
+        if min(used_lens) < FRAME_LEN_MIN or max(used_lens) > FRAME_LEN_MAX:
+            raise ValueError('{}: frame lens must be in [{}, {}]'.format(name, FRAME_LEN_MIN, FRAME_LEN_MAX))
+
+        self.name = name
+        self.mode = mode
+        self.frame_lens = frame_lens
+        self.min_len = min_len
+        self.max_len = max_len
+
+    @classmethod
+    def from_config(cls, name, config):
+        """
+        :param name: of the profile
+        :param config: profile as given in traffic_config.FRAME_PROFILES
+        """
+        return cls(name, config['mode'], config.get('frame_lens'), config.get('min'), config.get('max'))
+
+    def frame_len_shares(self):
+        """
+        imix only
+        :return: list of (frame len, share of all frames) ordered by frame len
+        """
+        weights_total = float(sum(self.frame_lens.values()))
+
+        return [(frame_len, weight / weights_total) for frame_len, weight in sorted(self.frame_lens.items())]
+
+    @property
+    def average_frame_len(self):
+        if self.mode == FRAME_PROFILE_IMIX:
+            return sum(frame_len * share for frame_len, share in self.frame_len_shares())
+
+        return (self.min_len + self.max_len) / 2.
+
+    @property
+    def stream_count(self):
+        """
+        number of streams per tx port needed for the profile
+        """
+        return len(self.frame_lens) if self.mode == FRAME_PROFILE_IMIX else 1
+
+    def spec_json(self):
+        """
+        :return: the profile as stored in the database
+        """
+        if self.mode == FRAME_PROFILE_IMIX:
+            spec = {'mode': self.mode,
+                    'frame_lens': dict((str(frame_len), weight) for frame_len, weight in self.frame_lens.items())}
+        else:
+            spec = {'mode': self.mode, 'min': self.min_len, 'max': self.max_len}
+
+        return json.dumps(spec, sort_keys=True)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return '{} ({}, avg frame len: {:.1f})'.format(self.name, self.spec_json(), self.average_frame_len)
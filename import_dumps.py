@@ -0,0 +1,108 @@
+import argparse
+import os
+import re
+import sys
+
+from measurement_model import MeasurementModel
+from traffic_config import TIME_MEASURE
+
+'''
+import the result lines printed by switch_mirror_test.py (persist_stats) - e.g. results/*.dump
+
+only the derived metrics are printed, the configs are stored without port stats (no per port speeds/counters)
+'''
+
+# 'key: value' pairs of a printed result line
+_FIELD_PATTERN = re.compile(r'(\w+):\s*([^,\s]+)')
+
+# printed key -> measurement config column, type (None - optional)
+_REQUIRED_FIELDS = {
+    'device': ('device_name', str),
+    'set_name': ('measurement_name', str),
+    'frame_len': ('frame_len', int),
+    'speed_up': ('bandwidth_upstream', int),
+    'speed_down': ('bandwidth_downstream', int),
+    'mirror_drop': ('mirror_dropped_total', int),
+    'mirror_drop_percent': ('mirror_dropped_percent', float),
+    'upstream_drop': ('upstream_dropped_total', int),
+    'upstream_drop_percent': ('upstream_dropped_percent', float),
+    'downstream_drop': ('downstream_dropped_total', int),
+    'downstream_drop_percent': ('downstream_dropped_percent', float)
+}
+_OPTIONAL_FIELDS = {
+    'frame_profile': ('frame_profile', str),
+    'burst_pattern': ('burst_pattern', str),
+    'wire_util_percent': ('wire_utilization_percent', float)
+}
+
+
+def dump_line_parse(line):
+    """
+    :return: dict of measurement config columns incl. device_name and measurement_name, None if the line
+             is not a (complete) result line
+    """
+    fields = dict(_FIELD_PATTERN.findall(line))
+
+    if not all(key in fields for key in _REQUIRED_FIELDS):
+        return None
+
+    config = {}
+    try:
+        for fields_spec in (_REQUIRED_FIELDS, _OPTIONAL_FIELDS):
+            for key, (column, column_type) in fields_spec.items():
+                value = fields.get(key, 'None')
+                config[column] = None if value == 'None' else column_type(value)
+    except ValueError as _:
+        return None
+
+    return config
+
+
+def dump_configs(dump_file_names, verbose=False):
+    """
+    stream the configs of the given dump files line by line
+    :return: iterator of dicts as returned by dump_line_parse (created set to the modification time of the file)
+    """
+    for dump_file_name in dump_file_names:
+        created = int(os.path.getmtime(dump_file_name))
+
+        with open(dump_file_name) as dump_file:
+            for line_number, line in enumerate(dump_file, 1):
+                if not line.strip():
+                    continue
+
+                config = dump_line_parse(line)
+                if config is None:
+                    sys.stderr.write('{}:{}: no result line - skipped\n'.format(dump_file_name, line_number))
+                    continue
+
+                config['created'] = created
+                yield config
+
+        if verbose:
+            print '{} parsed'.format(dump_file_name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='mirror/bandwidth test tool - import the printed results (e.g. results/*.dump) into a database')
+    parser.add_argument('-f', '--db-file', type=str, required=True, help='sqlite database to be used')
+    parser.add_argument('-t', '--duration', type=int, default=TIME_MEASURE,
+                        help='measurement duration in seconds stored for new measurements (default: {})'.format(
+                            TIME_MEASURE))
+    parser.add_argument('-v', '--verbose', default=False, action='store_true', help='show extended information')
+    parser.add_argument('dump_files', nargs='+', help='files holding the printed result lines')
+
+    args = parser.parse_args()
+
+    for dump_file_name in args.dump_files:
+        if not os.path.isfile(dump_file_name):
+            sys.stderr.write('dump file \'{}\' not found. Abort.\n'.format(dump_file_name))
+            sys.exit(1)
+
+    with MeasurementModel(args.db_file) as mm:
+        imported, duplicates = mm.measurement_configs_import(dump_configs(args.dump_files, args.verbose),
+                                                             args.duration)
+
+    print 'imported {} measurement configs, skipped {} duplicates'.format(imported, duplicates)
+    sys.exit(0)
@@ -11,4 +11,36 @@ INTERFACE_MACS = {
 
 RX_INTERFACE = 'eth7'
 TX_INTERFACES = ['eth0', 'eth1', 'eth2', 'eth3', 'eth6', 'eth8', 'eth9']
-MIRORRED_INTERFACES = ['eth0']
\ No newline at end of file
+MIRORRED_INTERFACES = ['eth0']
+
+# independent port groups, one device under test each - run in parallel by switch_mirror_test.py -G
+# (see port_group.py, interfaces must not be shared between groups)
+PORT_GROUPS = [
+    {'dut_name': 'dut-a', 'rx_interface': 'eth3', 'tx_interfaces': ['eth0', 'eth1', 'eth2'],
+     'mirrored_interfaces': ['eth0']},
+    {'dut_name': 'dut-b', 'rx_interface': 'eth7', 'tx_interfaces': ['eth6', 'eth8', 'eth9'],
+     'mirrored_interfaces': ['eth6']}
+]
+
+# drone hosts (rig pcs) sharing one work list - run by switch_mirror_test.py -D (see scheduler.py). every host lists
+# the port groups cabled to it (one device under test each, like PORT_GROUPS), hosts listing the same device under
+# test pool its results
+DRONE_HOSTS = [
+    {'host_name': '192.168.1.11', 'port_groups': [
+        {'dut_name': 'dut-a', 'rx_interface': RX_INTERFACE, 'tx_interfaces': TX_INTERFACES,
+         'mirrored_interfaces': MIRORRED_INTERFACES}
+    ]},
+    {'host_name': '192.168.1.12', 'port_groups': PORT_GROUPS}
+]
+
+# link speed of the mirror port - reference of the wire utilization
+LINK_SPEED_MBIT = 100
+
+# switch model used with --simulate (see drone_simulator.SwitchModel)
+SIMULATED_SWITCH = {
+    'mirror_egress_mbit': 100,
+    'mirror_buffer_bytes': 16 * 1024,
+    'port_buffer_bytes': 64 * 1024,
+    'backplane_mbit': None,
+    'backplane_buffer_bytes': 64 * 1024
+}
@@ -1,11 +1,35 @@
 from sqlalchemy import create_engine, ForeignKey, Boolean
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy import Column, Integer, String, Float, Index
+from sqlalchemy import func, case, inspect, event
+from sqlalchemy.orm import sessionmaker, relationship, object_session
+from collections import namedtuple
+import hashlib
+import numpy as np
+import Queue
+import sys
+import threading
 import time
 
 Base = declarative_base()
 
+MeasurementConfigStats = namedtuple('MeasurementConfigStats', [
+    'measurement_config_id', 'frame_len',
+    'bandwidth_upstream', 'bandwidth_downstream',
+    'mirror_dropped_total', 'mirror_dropped_percent',
+    'upstream_dropped_total', 'upstream_dropped_percent',
+    'downstream_dropped_total', 'downstream_dropped_percent'])
+
+# MeasurementConfigStats fields stored as columns of MeasurementConfig
+DERIVED_METRICS = MeasurementConfigStats._fields[2:]
+
+# record layout of measurement_config_arrays - one field per MeasurementConfigStats field
+MEASUREMENT_CONFIG_DTYPE = np.dtype([(field, np.float64 if field.endswith('_percent') else np.int64)
+                                     for field in MeasurementConfigStats._fields])
+
+# rate mode of all configs stored before the rate mode was recorded (see ostinato_interface.RATE_MODES)
+LEGACY_RATE_MODE = 'l2'
+
 
 def _timestamp_now():
     return int(time.time())
@@ -31,9 +55,12 @@ class Device(Base):
 
 class Measurement(Base):
     __tablename__ = 'measurements'
+    __table_args__ = (
+        Index('ix_measurements_device_id_name', 'device_id', 'name'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    device_id = Column(Integer, ForeignKey('devices.id'))
+    device_id = Column(Integer, ForeignKey('devices.id'), index=True)
     name = Column(String)
 
     duration = Column(Integer)
@@ -51,18 +78,45 @@ class Measurement(Base):
 
 class MeasurementConfig(Base):
     __tablename__ = 'measurement_configs'
+    __table_args__ = (
+        Index('ix_measurement_configs_measurement_id_frame_len', 'measurement_id', 'frame_len'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    measurement_id = Column(Integer, ForeignKey('measurements.id'))
+    measurement_id = Column(Integer, ForeignKey('measurements.id'), index=True)
 
+    # fixed frame len - the (rounded) average frame len if a frame profile was used
     frame_len = Column(Integer, nullable=False)
     created = Column(Integer, default=_timestamp_now)
 
+    # mixed frame sizes (see frame_profile.py) - NULL for a fixed frame len
+    frame_profile = Column(String)
+    frame_profile_spec = Column(String)
+    # frames sent in bursts (see burst_pattern.py) - NULL for constant rates
+    burst_pattern = Column(String)
+    burst_pattern_spec = Column(String)
+
     bandwidth_upstream = Column(Integer, default=0)
     bandwidth_downstream = Column(Integer, default=0)
 
+    # layer the bandwidths refer to - NULL means LEGACY_RATE_MODE
+    rate_mode = Column(String)
+    # sum of the on the wire (l1) rates sent by all injector ports relative to the link speed,
+    # i.e. the load offered to the mirror port - comparable across frame sizes
+    wire_utilization_percent = Column(Float)
+
+    # derived from the mirror/injector stats at write time (see MeasurementModel.derived_metrics_update)
+    mirror_dropped_total = Column(Integer)
+    mirror_dropped_percent = Column(Float)
+    upstream_dropped_total = Column(Integer)
+    upstream_dropped_percent = Column(Float)
+    downstream_dropped_total = Column(Integer)
+    downstream_dropped_percent = Column(Float)
+
     mirror_stats = relationship("MirrorStat", backref="measurements")
     injector_stats = relationship("InjectorStat", backref="measurements")
+    port_samples = relationship("PortSample", backref="measurements")
+    loss_stats = relationship("LossStat", backref="measurements")
 
     def __repr__(self):
         return '<MeasurementConfig(id={}, date_created={}, measurement_id={}, ' \
@@ -83,7 +137,7 @@ class MirrorStat(Base):
     __tablename__ = 'mirror_stats'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    measurement_config_id = Column(Integer, ForeignKey('measurement_configs.id'))
+    measurement_config_id = Column(Integer, ForeignKey('measurement_configs.id'), index=True)
     port_name = Column(String, nullable=False)
     rx_frames = Column(Integer, nullable=False)
     rx_bytes = Column(Integer, nullable=False)
@@ -102,14 +156,21 @@ class InjectorStat(Base):
     __tablename__ = 'injector_stats'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    measurement_config_id = Column(Integer, ForeignKey('measurement_configs.id'))
+    measurement_config_id = Column(Integer, ForeignKey('measurement_configs.id'), index=True)
     is_mirrored_port = Column(Boolean, default=False)
     port_name = Column(String, nullable=False)
     rx_frames = Column(Integer, nullable=False)
     rx_bytes = Column(Integer, nullable=False)
     tx_frames = Column(Integer, nullable=False)
     tx_bytes = Column(Integer, nullable=False)
+    # speed sent - differs from the requested speed if a burst pattern rounds the bursts to whole frames
     tx_speed_mbit = Column(Integer, nullable=False)
+    # speed requested by the speed pattern - None for configs stored before it was recorded (same as tx_speed_mbit)
+    tx_nominal_mbit = Column(Integer)
+    tx_wire_mbit = Column(Float)
+    # burst pattern only - bursts as sent by the port
+    tx_frames_per_burst = Column(Integer)
+    tx_bursts_per_sec = Column(Float)
 
     def __repr__(self):
         return '<InjectorStat(id={}, measurement_id={}, is_mirrored_port={}, rx_frames={}, rx_bytes={}, tx_speed_mbit={}, tx_frames={}, tx_bytes={}>'.format(
@@ -124,32 +185,572 @@ class InjectorStat(Base):
         )
 
 
+class PortSample(Base):
+    __tablename__ = 'port_samples'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    measurement_config_id = Column(Integer, ForeignKey('measurement_configs.id'), index=True)
+    port_name = Column(String, nullable=False)
+    offset_ms = Column(Integer, nullable=False)
+    rx_frames = Column(Integer, nullable=False)
+    rx_bytes = Column(Integer, nullable=False)
+    tx_frames = Column(Integer, nullable=False)
+    tx_bytes = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return '<PortSample(id={}, measurement_id={}, port_name={}, offset_ms={}, rx_frames={}, rx_bytes={}, tx_frames={}, tx_bytes={}>'.format(
+            self.id,
+            self.measurement_config_id,
+            self.port_name,
+            self.offset_ms,
+            self.rx_frames,
+            self.rx_bytes,
+            self.tx_frames,
+            self.tx_bytes
+        )
+
+
+class LossStat(Base):
+    __tablename__ = 'loss_stats'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    measurement_config_id = Column(Integer, ForeignKey('measurement_configs.id'), index=True)
+    port_name = Column(String, nullable=False)
+    rx_frames = Column(Integer, nullable=False)
+    lost_frames = Column(Integer, nullable=False)
+    loss_bursts = Column(Integer, nullable=False)
+    max_burst_len = Column(Integer, nullable=False)
+    reordered_frames = Column(Integer, nullable=False)
+    duplicate_frames = Column(Integer, nullable=False)
+    # json object burst length -> number of bursts
+    burst_histogram = Column(String)
+    # arrival on the mirror port minus arrival on the destination port / its change between consecutive frames
+    delay_p50_us = Column(Float)
+    delay_p99_us = Column(Float)
+    delay_max_us = Column(Float)
+    jitter_p50_us = Column(Float)
+    jitter_p99_us = Column(Float)
+    jitter_max_us = Column(Float)
+
+    def __repr__(self):
+        return '<LossStat(id={}, measurement_id={}, port_name={}, rx_frames={}, lost_frames={}, loss_bursts={}, max_burst_len={}, reordered_frames={}, duplicate_frames={}>'.format(
+            self.id,
+            self.measurement_config_id,
+            self.port_name,
+            self.rx_frames,
+            self.lost_frames,
+            self.loss_bursts,
+            self.max_burst_len,
+            self.reordered_frames,
+            self.duplicate_frames
+        )
+
+
+def _connection_query_only(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA query_only = ON')
+
+
 class MeasurementModel(object):
-    def __init__(self, db_file, drop_database=False, verbose=False):
+    def __init__(self, db_file, drop_database=False, verbose=False, commit_interval=1, read_only=False):
+        """
+        :param db_file: sqlite database file
+        :param drop_database: drop all tables before use
+        :param verbose: echo the generated SQL
+        :param commit_interval: number of measurement configs collected before a commit is issued
+        :param read_only: neither create nor migrate the tables, sqlite refuses all writes
+                          (e.g. several reader processes - the database must be up to date)
+        """
         self._engine = create_engine('sqlite:///{}'.format(db_file), echo=verbose)
-        if drop_database:
-            Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
+
+        if read_only:
+            event.listen(self._engine, 'connect', _connection_query_only)
+            columns_added = False
+        else:
+            if drop_database:
+                Base.metadata.drop_all(self._engine)
+            Base.metadata.create_all(self._engine)
+            columns_added = self._columns_migrate()
+            self._indexes_migrate()
 
         self._session_builder = sessionmaker(bind=self._engine)
         self._session = self._session_builder()
 
+        if columns_added:
+            self.derived_metrics_update()
+
+        if commit_interval < 1:
+            raise ValueError('commit interval must be >= 1')
+        self._commit_interval = commit_interval
+        self._pending_measurement_configs = 0
+
+    def _columns_migrate(self):
+        """
+        create_all() does not alter existing tables - add the missing columns to existing databases
+        :return: True if at least one column was added
+        """
+        inspector = inspect(self._engine)
+        columns_added = False
+
+        for table in Base.metadata.sorted_tables:
+            existing_columns = set(column['name'] for column in inspector.get_columns(table.name))
+
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    self._engine.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                        table.name, column.name, column.type.compile(self._engine.dialect)))
+                    columns_added = True
+
+        return columns_added
+
+    def _indexes_migrate(self):
+        """
+        create_all() only creates indexes for new tables - add the missing ones to existing databases
+        """
+        inspector = inspect(self._engine)
+
+        for table in Base.metadata.sorted_tables:
+            existing_indexes = set(index['name'] for index in inspector.get_indexes(table.name))
+
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(self._engine)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def insert(self, obj):
         self._session.add(obj)
         self._session.commit()
 
+    def add(self, obj):
+        """
+        add object to the session without committing - the object gets its id assigned
+        """
+        self._session.add(obj)
+        self._session.flush()
+
+    def device_get_or_add(self, name):
+
+        try:
+            return self.device_by_name(name)
+        except KeyError as _:
+            device = Device(name=name)
+            self.add(device)
+            return device
+
+    def device_measurement_get_or_add(self, device, name, duration):
+
+        try:
+            return self.device_measurement_by_name(device, name)
+        except KeyError as _:
+            measurement = Measurement(device_id=device.id, name=name, duration=duration)
+            device.measurements.append(measurement)
+            self.add(measurement)
+            return measurement
+
+    def measurement_config_add(self, measurement, frame_len, stats, samples=None, losses=None, rate_mode=None,
+                               link_speed_mbit=None, frame_profile=None, burst_pattern=None):
+        """
+        add a measurement config including all related mirror/injector stats in one go
+        the session is committed every commit_interval configs (see close() for outstanding ones)
+        :param measurement: the config belongs to
+        :param frame_len: used for the config
+        :param stats: list of RXTXStats
+        :param samples: optional list of RXTXSample taken during the measurement
+        :param losses: optional list of capture_analysis.StreamLoss (one per injector port)
+        :param rate_mode: layer the tx speeds refer to (see ostinato_interface.RATE_MODES)
+        :param link_speed_mbit: speed of the mirror port link - required for the wire utilization
+        :param frame_profile: optional frame_profile.FrameProfile used instead of a fixed frame len
+        :param burst_pattern: optional burst_pattern.BurstPattern used instead of constant rates
+        :return: the new measurement config
+        """
+        measurement_config = MeasurementConfig(frame_len=frame_len, rate_mode=rate_mode)
+
+        if frame_profile:
+            measurement_config.frame_profile = frame_profile.name
+            measurement_config.frame_profile_spec = frame_profile.spec_json()
+        if burst_pattern:
+            measurement_config.burst_pattern = burst_pattern.name
+            measurement_config.burst_pattern_spec = burst_pattern.spec_json()
+
+        for stat in stats:
+
+            if stat.is_mirror_port:
+                measurement_config.mirror_stats.append(
+                    MirrorStat(port_name=stat.interface_name,
+                               rx_frames=stat.rx_frames,
+                               rx_bytes=stat.rx_bytes))
+            else:
+                measurement_config.injector_stats.append(
+                    InjectorStat(port_name=stat.interface_name,
+                                 is_mirrored_port=stat.is_mirrored_port,
+                                 rx_frames=stat.rx_frames,
+                                 rx_bytes=stat.rx_bytes,
+                                 tx_frames=stat.tx_frames,
+                                 tx_bytes=stat.tx_bytes,
+                                 tx_speed_mbit=stat.speed_mbit,
+                                 tx_nominal_mbit=stat.nominal_mbit,
+                                 tx_wire_mbit=stat.wire_mbit,
+                                 tx_frames_per_burst=stat.frames_per_burst,
+                                 tx_bursts_per_sec=stat.bursts_per_sec))
+
+        injector_stats = [stat for stat in stats if not stat.is_mirror_port]
+        mirrored_stats = [stat for stat in injector_stats if stat.is_mirrored_port]
+        non_mirrored_stats = [stat for stat in injector_stats if not stat.is_mirrored_port]
+
+        config_stats = self._measurement_config_stats_from_totals(
+            None, frame_len,
+            sum(stat.speed_mbit for stat in mirrored_stats),
+            sum(stat.speed_mbit for stat in non_mirrored_stats),
+            sum(stat.tx_frames for stat in mirrored_stats),
+            sum(stat.rx_frames for stat in mirrored_stats),
+            sum(stat.tx_frames for stat in non_mirrored_stats),
+            sum(stat.rx_frames for stat in non_mirrored_stats),
+            sum(stat.rx_frames for stat in stats if stat.is_mirror_port))
+
+        for field in DERIVED_METRICS:
+            setattr(measurement_config, field, getattr(config_stats, field))
+
+        if link_speed_mbit:
+            measurement_config.wire_utilization_percent = \
+                100. * sum(stat.wire_mbit for stat in injector_stats) / link_speed_mbit
+
+        for loss in losses or []:
+            delay_p50_us, delay_p99_us, delay_max_us = loss.delay_percentiles_us()
+            jitter_p50_us, jitter_p99_us, jitter_max_us = loss.jitter_percentiles_us()
+
+            measurement_config.loss_stats.append(
+                LossStat(port_name=loss.interface_name,
+                         rx_frames=loss.rx_frames,
+                         lost_frames=loss.lost_frames,
+                         loss_bursts=loss.loss_bursts,
+                         max_burst_len=loss.max_burst_len,
+                         reordered_frames=loss.reordered_frames,
+                         duplicate_frames=loss.duplicate_frames,
+                         burst_histogram=loss.burst_histogram_json(),
+                         delay_p50_us=delay_p50_us,
+                         delay_p99_us=delay_p99_us,
+                         delay_max_us=delay_max_us,
+                         jitter_p50_us=jitter_p50_us,
+                         jitter_p99_us=jitter_p99_us,
+                         jitter_max_us=jitter_max_us))
+
+        measurement.measurement_configs.append(measurement_config)
+        self._session.add(measurement_config)
+
+        if samples:
+            self._session.flush()
+            self._session.bulk_insert_mappings(PortSample, [
+                dict(measurement_config_id=measurement_config.id,
+                     port_name=sample.interface_name,
+                     offset_ms=sample.offset_ms,
+                     rx_frames=sample.rx_frames,
+                     rx_bytes=sample.rx_bytes,
+                     tx_frames=sample.tx_frames,
+                     tx_bytes=sample.tx_bytes) for sample in samples])
+
+        self._pending_measurement_configs += 1
+        if self._pending_measurement_configs >= self._commit_interval:
+            self.commit()
+
+        return measurement_config
+
+    def measurement_configs_import(self, configs, duration):
+        """
+        bulk insert measurement configs known by their derived metrics only (no stat rows, e.g. parsed from the
+        printed results) in a single transaction - configs already stored or given twice (same device,
+        measurement, frame len, frame profile, burst pattern and bandwidths) are skipped
+        :param configs: iterable of dicts - device_name, measurement_name and MeasurementConfig columns
+        :param duration: of the measurements to be created
+        :return: number of imported configs, number of skipped duplicates
+        """
+        stored = set(tuple(row) for row in self._session.query(
+            Device.name, Measurement.name, MeasurementConfig.frame_len, MeasurementConfig.frame_profile,
+            MeasurementConfig.burst_pattern, MeasurementConfig.bandwidth_upstream,
+            MeasurementConfig.bandwidth_downstream
+        ).join(Measurement, Measurement.device_id == Device.id
+               ).join(MeasurementConfig, MeasurementConfig.measurement_id == Measurement.id))
+
+        # (device name, measurement name) -> measurement id
+        measurement_ids = {}
+        mappings = []
+        duplicates = 0
+
+        for config in configs:
+            mapping = dict(config)
+            device_name, measurement_name = mapping.pop('device_name'), mapping.pop('measurement_name')
+
+            key = (device_name, measurement_name, mapping['frame_len'], mapping.get('frame_profile'),
+                   mapping.get('burst_pattern'), mapping['bandwidth_upstream'], mapping['bandwidth_downstream'])
+            if key in stored:
+                duplicates += 1
+                continue
+            stored.add(key)
+
+            if (device_name, measurement_name) not in measurement_ids:
+                device = self.device_get_or_add(device_name)
+                measurement_ids[(device_name, measurement_name)] = \
+                    self.device_measurement_get_or_add(device, measurement_name, duration).id
+
+            mapping['measurement_id'] = measurement_ids[(device_name, measurement_name)]
+            mappings.append(mapping)
+
+        self._session.bulk_insert_mappings(MeasurementConfig, mappings)
+        self.commit()
+
+        return len(mappings), duplicates
+
     def measurements(self):
         return self._session.query(Measurement).all()
 
+    def measurement_configs(self, measurement):
+        """
+        all configs of the given measurement incl. the derived metrics - no access to the stat tables
+        """
+        return self._session.query(MeasurementConfig).filter(
+            MeasurementConfig.measurement_id == measurement.id).order_by(MeasurementConfig.id).all()
+
+    def measurement_config_arrays(self, measurement):
+        """
+        the configs of the given measurement as one record array (MEASUREMENT_CONFIG_DTYPE) loaded by a single
+        query - no ORM objects, for vectorised plotting/analysis
+        """
+        rows = self._session.query(
+            MeasurementConfig.id, MeasurementConfig.frame_len,
+            *[func.coalesce(getattr(MeasurementConfig, field), 0) for field in DERIVED_METRICS]
+        ).filter(MeasurementConfig.measurement_id == measurement.id).order_by(MeasurementConfig.id)
+
+        return np.array([tuple(row) for row in rows], dtype=MEASUREMENT_CONFIG_DTYPE)
+
+    def measurement_config_keys(self, device_name, rate_mode=None):
+        """
+        keys of all measurement configs of the given device, loaded with a single query
+        :param device_name: of the device
+        :param rate_mode: if given, only configs measured using this rate mode
+        :return: set of (measurement name, frame_len, frame profile name or None, burst pattern name or None,
+                         sorted tuple of (injector port name, requested tx speed))
+        """
+        rows = self._session.query(MeasurementConfig.id, Measurement.name, MeasurementConfig.frame_len,
+                                   MeasurementConfig.frame_profile, MeasurementConfig.burst_pattern,
+                                   InjectorStat.port_name,
+                                   func.coalesce(InjectorStat.tx_nominal_mbit, InjectorStat.tx_speed_mbit)
+                                   ).join(Measurement, Measurement.id == MeasurementConfig.measurement_id
+                                          ).join(Device, Device.id == Measurement.device_id
+                                                 ).join(InjectorStat,
+                                                        InjectorStat.measurement_config_id == MeasurementConfig.id
+                                                        ).filter(Device.name == device_name)
+        if rate_mode is not None:
+            rows = rows.filter(func.coalesce(MeasurementConfig.rate_mode, LEGACY_RATE_MODE) == rate_mode)
+
+        configs = {}
+        for measurement_config_id, measurement_name, frame_len, frame_profile, burst_pattern, port_name, \
+                tx_speed_mbit in rows:
+            key, speeds = configs.setdefault(measurement_config_id,
+                                             ((measurement_name, frame_len, frame_profile, burst_pattern), []))
+            speeds.append((port_name, tx_speed_mbit))
+
+        return set(key + (tuple(sorted(speeds)),) for key, speeds in configs.values())
+
+    def measurement_config_delays(self, measurement):
+        """
+        worst delay/jitter over all injector ports per measurement config of the given measurement
+        (only configs measured with capture analysis)
+        :return: list of (frame_len, bandwidth_total, delay_p99_us, jitter_p99_us)
+        """
+        return self._session.query(
+            MeasurementConfig.frame_len,
+            MeasurementConfig.bandwidth_upstream + MeasurementConfig.bandwidth_downstream,
+            func.max(LossStat.delay_p99_us),
+            func.max(LossStat.jitter_p99_us)
+        ).join(LossStat, LossStat.measurement_config_id == MeasurementConfig.id).filter(
+            MeasurementConfig.measurement_id == measurement.id,
+            LossStat.delay_p99_us != None
+        ).group_by(MeasurementConfig.id).order_by(MeasurementConfig.id).all()
+
+    def measurement_fingerprints(self):
+        """
+        digest of the plotted content of each measurement - changes if configs are added or removed, their derived
+        metrics are recalculated or loss stats are added (two queries for the whole database)
+        :return: dict (device name, measurement name) -> hex digest
+        """
+        config_rows = self._session.query(
+            Device.name, Measurement.name, Measurement.id,
+            func.count(MeasurementConfig.id), func.max(MeasurementConfig.id), func.total(MeasurementConfig.id),
+            func.max(MeasurementConfig.created),
+            func.total(MeasurementConfig.bandwidth_upstream + MeasurementConfig.bandwidth_downstream),
+            func.total(MeasurementConfig.mirror_dropped_percent)
+        ).join(Measurement, Measurement.device_id == Device.id
+               ).outerjoin(MeasurementConfig, MeasurementConfig.measurement_id == Measurement.id
+                           ).group_by(Measurement.id)
+
+        loss_rows = self._session.query(
+            MeasurementConfig.measurement_id, func.count(LossStat.id), func.max(LossStat.id),
+            func.total(LossStat.delay_p99_us), func.total(LossStat.jitter_p99_us)
+        ).join(LossStat, LossStat.measurement_config_id == MeasurementConfig.id
+               ).group_by(MeasurementConfig.measurement_id)
+        loss_aggregates = {row[0]: tuple(row[1:]) for row in loss_rows}
+
+        fingerprints = {}
+        for row in config_rows:
+            device_name, measurement_name, measurement_id = row[:3]
+            content = tuple(row[3:]) + loss_aggregates.get(measurement_id, ())
+            fingerprints[(device_name, measurement_name)] = hashlib.md5(repr(content)).hexdigest()
+
+        return fingerprints
+
+    def port_samples(self, measurement_config):
+        """
+        counter samples of the given measurement config ordered by time and port
+        """
+        return self._session.query(PortSample).filter(
+            PortSample.measurement_config_id == measurement_config.id).order_by(PortSample.offset_ms,
+                                                                                PortSample.port_name).all()
+
+    def derived_metrics_update(self):
+        """
+        (re)calculate the derived metrics of all measurement configs from the stat tables
+        in a single pass and write them back in one transaction - configs without stats (imported) are kept
+        :return: number of updated measurement configs
+        """
+        self._session.flush()
+
+        mappings = []
+        for config_stats in self._measurement_config_stats(self._session, with_stats_only=True):
+            mapping = {field: getattr(config_stats, field) for field in DERIVED_METRICS}
+            mapping['id'] = config_stats.measurement_config_id
+            mappings.append(mapping)
+
+        self._session.bulk_update_mappings(MeasurementConfig, mappings)
+        self.commit()
+
+        return len(mappings)
+
+    @staticmethod
+    def _measurement_config_stats(session, measurement_config_id=None, measurement_id=None, device_id=None,
+                                  with_stats_only=False):
+        """
+        aggregate bandwidth and frame counters of all selected measurement configs in a single query
+        injector_stats and mirror_stats are summed up per measurement config (GROUP BY) and joined
+        to measurement_configs - no per-config lazy loading of the stat relationships
+        :param session: to run the query in
+        :param measurement_config_id: select a single config
+        :param measurement_id: select all configs of a measurement
+        :param device_id: select all configs of all measurements of a device
+        :param with_stats_only: skip configs without injector stats (e.g. imported from printed results)
+        :return: list of MeasurementConfigStats ordered by measurement config id
+        """
+
+        def _sum_if(condition, column):
+            return func.coalesce(func.sum(case([(condition, column)], else_=0)), 0)
+
+        mirrored = InjectorStat.is_mirrored_port == True
+
+        injector_totals = session.query(
+            InjectorStat.measurement_config_id.label('measurement_config_id'),
+            _sum_if(mirrored, InjectorStat.tx_speed_mbit).label('bandwidth_upstream'),
+            _sum_if(~mirrored, InjectorStat.tx_speed_mbit).label('bandwidth_downstream'),
+            _sum_if(mirrored, InjectorStat.tx_frames).label('mirrored_tx_frames'),
+            _sum_if(mirrored, InjectorStat.rx_frames).label('mirrored_rx_frames'),
+            _sum_if(~mirrored, InjectorStat.tx_frames).label('non_mirrored_tx_frames'),
+            _sum_if(~mirrored, InjectorStat.rx_frames).label('non_mirrored_rx_frames')
+        ).group_by(InjectorStat.measurement_config_id).subquery()
+
+        mirror_totals = session.query(
+            MirrorStat.measurement_config_id.label('measurement_config_id'),
+            func.coalesce(func.sum(MirrorStat.rx_frames), 0).label('mirror_rx_frames')
+        ).group_by(MirrorStat.measurement_config_id).subquery()
+
+        query = session.query(
+            MeasurementConfig.id,
+            MeasurementConfig.frame_len,
+            func.coalesce(injector_totals.c.bandwidth_upstream, 0),
+            func.coalesce(injector_totals.c.bandwidth_downstream, 0),
+            func.coalesce(injector_totals.c.mirrored_tx_frames, 0),
+            func.coalesce(injector_totals.c.mirrored_rx_frames, 0),
+            func.coalesce(injector_totals.c.non_mirrored_tx_frames, 0),
+            func.coalesce(injector_totals.c.non_mirrored_rx_frames, 0),
+            func.coalesce(mirror_totals.c.mirror_rx_frames, 0)
+        )
+
+        if with_stats_only:
+            query = query.join(injector_totals, injector_totals.c.measurement_config_id == MeasurementConfig.id)
+        else:
+            query = query.outerjoin(injector_totals, injector_totals.c.measurement_config_id == MeasurementConfig.id)
+        query = query.outerjoin(mirror_totals, mirror_totals.c.measurement_config_id == MeasurementConfig.id)
+
+        if measurement_config_id is not None:
+            query = query.filter(MeasurementConfig.id == measurement_config_id)
+        if measurement_id is not None:
+            query = query.filter(MeasurementConfig.measurement_id == measurement_id)
+        if device_id is not None:
+            query = query.join(Measurement, Measurement.id == MeasurementConfig.measurement_id).filter(
+                Measurement.device_id == device_id)
+
+        return [MeasurementModel._measurement_config_stats_from_totals(*row)
+                for row in query.order_by(MeasurementConfig.id)]
+
     @staticmethod
-    def _bandwidth_total(measurement_config, from_mirrored_ports=False):
+    def _measurement_config_stats_from_totals(measurement_config_id, frame_len,
+                                              bandwidth_upstream, bandwidth_downstream,
+                                              mirrored_tx_frames_total, mirrored_rx_frames_total,
+                                              non_mirrored_tx_frames_total, non_mirrored_rx_frames_total,
+                                              mirror_rx_frames_total):
+        """
+        calculate the drops from the aggregated frame counters
+        mirror - sum(injector_ports.tx_frames) - sum(mirror_ports.rx_frames)
+        upstream - sum(mirrored_injector_ports.tx_frames) - sum(non_mirrored_injector_ports.rx_frames)
+        downstream - sum(non_mirrored_injector_ports.tx_frames) - sum(mirrored_injector_ports.rx_frames)
+        """
+        injector_tx_frames_total = mirrored_tx_frames_total + non_mirrored_tx_frames_total
 
-        total_bandwidth = 0
-        for injector_stat in measurement_config.injector_stats:
-            if injector_stat.is_mirrored_port == from_mirrored_ports:
-                total_bandwidth += injector_stat.tx_speed_mbit
+        mirror_dropped_total = abs(injector_tx_frames_total - mirror_rx_frames_total)
+        if injector_tx_frames_total:
+            mirror_dropped_percent = (100.0 / injector_tx_frames_total) * mirror_dropped_total
+        else:
+            mirror_dropped_percent = 0.
+
+        if non_mirrored_tx_frames_total:
+            upstream_dropped_total = abs(mirrored_tx_frames_total - non_mirrored_rx_frames_total)
+            # a ramp step may have sent nothing on the mirrored ports
+            upstream_dropped_percent = (100.0 / mirrored_tx_frames_total) * upstream_dropped_total \
+                if mirrored_tx_frames_total else 0.
+            downstream_dropped_total = abs(non_mirrored_tx_frames_total - mirrored_rx_frames_total)
+            downstream_dropped_percent = (100.0 / non_mirrored_tx_frames_total) * downstream_dropped_total
+        else:
+            # no non-mirrored tx interfaces - no drops :
+            upstream_dropped_total = 0
+            upstream_dropped_percent = 0.
+            downstream_dropped_total = 0
+            downstream_dropped_percent = 0.
 
-        return total_bandwidth
+        return MeasurementConfigStats(measurement_config_id, frame_len,
+                                      bandwidth_upstream, bandwidth_downstream,
+                                      mirror_dropped_total, mirror_dropped_percent,
+                                      upstream_dropped_total, upstream_dropped_percent,
+                                      downstream_dropped_total, downstream_dropped_percent)
+
+    @staticmethod
+    def _single_measurement_config_stats(measurement_config):
+
+        return MeasurementModel._measurement_config_stats(object_session(measurement_config),
+                                                          measurement_config_id=measurement_config.id)[0]
+
+    def measurement_config_stats(self, measurement_config=None, measurement=None, device=None):
+        """
+        bandwidth and drop figures of all measurement configs of the given measurement config,
+        measurement or device (or all configs if no filter is given) - fetched in one round trip
+        :return: list of MeasurementConfigStats ordered by measurement config id
+        """
+        self._session.flush()
+
+        return self._measurement_config_stats(
+            self._session,
+            measurement_config_id=measurement_config.id if measurement_config else None,
+            measurement_id=measurement.id if measurement else None,
+            device_id=device.id if device else None)
 
     @staticmethod
     def bandwidth_total_upstream(measurement_config):
@@ -157,7 +758,7 @@ class MeasurementModel(object):
         bandwidth from mirrored port(s) to other ports
         """
 
-        return MeasurementModel._bandwidth_total(measurement_config, from_mirrored_ports=True)
+        return MeasurementModel._single_measurement_config_stats(measurement_config).bandwidth_upstream
 
     @staticmethod
     def bandwidth_total_downstream(measurement_config):
@@ -165,7 +766,7 @@ class MeasurementModel(object):
         bandwidth from other port(s) to mirrored port(s)
         """
 
-        return MeasurementModel._bandwidth_total(measurement_config, from_mirrored_ports=False)
+        return MeasurementModel._single_measurement_config_stats(measurement_config).bandwidth_downstream
 
     @staticmethod
     def mirror_dropped(measurement_config):
@@ -175,17 +776,9 @@ class MeasurementModel(object):
         :param measurement_config: to calculate the drops for
         :return: frames_dropped_total, frames_dropped_percent
         """
-        mirror_rx_frames_total = 0
-        injector_tx_frames_total = 0
-        for mirror_stat in measurement_config.mirror_stats:
-            mirror_rx_frames_total += mirror_stat.rx_frames
-
-        for injector_stat in measurement_config.injector_stats:
-            injector_tx_frames_total += injector_stat.tx_frames
+        stats = MeasurementModel._single_measurement_config_stats(measurement_config)
 
-        dropped_frames_total = abs(injector_tx_frames_total - mirror_rx_frames_total)
-        dropped_frames_percent = (100.0 / injector_tx_frames_total) * dropped_frames_total
-        return dropped_frames_total, dropped_frames_percent
+        return stats.mirror_dropped_total, stats.mirror_dropped_percent
 
     @staticmethod
     def upstream_downstream_dropped(measurement_config):
@@ -196,74 +789,140 @@ class MeasurementModel(object):
         :param measurement_config: to calculate the drops for
         :return: upstream_frames_dropped_total, upstream_frames_dropped_percent, downstream_frames_dropped_total, downstream_frames_dropped_percent
         """
-        mirrored_tx_frames_total = 0
-        mirrored_rx_frames_total = 0
-        non_mirrored_tx_frames_total = 0
-        non_mirrored_rx_frames_total = 0
+        stats = MeasurementModel._single_measurement_config_stats(measurement_config)
 
-        for injector_stat in measurement_config.injector_stats:
+        return stats.upstream_dropped_total, stats.upstream_dropped_percent, \
+               stats.downstream_dropped_total, stats.downstream_dropped_percent
 
-            if injector_stat.is_mirrored_port:
-                mirrored_tx_frames_total += injector_stat.tx_frames
-                mirrored_rx_frames_total += injector_stat.rx_frames
-            else:
-                non_mirrored_tx_frames_total += injector_stat.tx_frames
-                non_mirrored_rx_frames_total += injector_stat.rx_frames
-
-        if non_mirrored_tx_frames_total:
-            upstream_frames_dropped_total = abs(mirrored_tx_frames_total - non_mirrored_rx_frames_total)
-            upstream_frames_dropped_percent = (100.0 / mirrored_tx_frames_total) * upstream_frames_dropped_total
-            downstream_frames_dropped_total = abs(non_mirrored_tx_frames_total - mirrored_rx_frames_total)
-            downstream_frames_dropped_percent = (100.0 / non_mirrored_tx_frames_total) * downstream_frames_dropped_total
-        else:
-            # no non-mirrored tx interfaces - no drops :
-            upstream_frames_dropped_total = 0
-            upstream_frames_dropped_percent = 0.
-            downstream_frames_dropped_total = 0
-            downstream_frames_dropped_percent = 0.
+    def device_by_name(self, name):
 
-        return upstream_frames_dropped_total, upstream_frames_dropped_percent, \
-               downstream_frames_dropped_total, downstream_frames_dropped_percent
+        device = self._session.query(Device).filter(Device.name == name).first()
 
-    def device_by_name(self, name):
+        if device is None:
+            raise KeyError('invalid or unknown device name \'{}\''.format(name))
 
-        try:
-            return self._session.query(Device).filter(Device.name == name)[0]
-        except:
-            raise KeyError('Unknown or invalid device name \'{}\''.format(name))
+        return device
 
     def device_measurement_by_name(self, device, name):
 
-        for measurement in device.measurements:
-            if measurement.name == name:
-                return measurement
+        measurement = self._session.query(Measurement).filter(Measurement.device_id == device.id,
+                                                              Measurement.name == name).first()
 
-        raise KeyError('invalid or unknown measurement \'{}\' in device \'{}\''.format(name, device))
+        if measurement is None:
+            raise KeyError('invalid or unknown measurement \'{}\' in device \'{}\''.format(name, device))
+
+        return measurement
 
     def measurement_config_by_frame_len(self, measurement, frame_len):
 
-        for measurement_config in measurement.measurement_configs:
-            if measurement_config.frame_len == frame_len:
-                return measurement_config
+        measurement_config = self._session.query(MeasurementConfig).filter(
+            MeasurementConfig.measurement_id == measurement.id,
+            MeasurementConfig.frame_len == frame_len).first()
+
+        if measurement_config is None:
+            raise KeyError(
+                'invalid or unknown config-frame_len \'{}\' in measurement \'{}\''.format(frame_len, measurement))
 
-        raise KeyError(
-            'invalid or unknown config-frame_len \'{}\' in measurement \'{}\''.format(frame_len, measurement))
+        return measurement_config
 
     def devices(self, filter_name=None):
 
-        return [device.name for device in self._session.query(Device).all() if
-                device.name == filter_name or (not filter_name) or filter_name == 'all']
+        query = self._session.query(Device.name)
 
-    def device_by_name(self, name):
+        if filter_name and filter_name != 'all':
+            query = query.filter(Device.name == filter_name)
 
-        for device in self._session.query(Device).all():
-            if name == device.name:
-                return device
+        return [name for name, in query]
 
-        raise KeyError('invalid or unknown device name \'{}\''.format(name))
+    def call(self, function, *args, **kwargs):
+        """
+        function(self, *args, **kwargs) - same interface as MeasurementModelWriter.call
+        """
+        return function(self, *args, **kwargs)
 
     def commit(self):
         self._session.commit()
+        self._pending_measurement_configs = 0
+
+    def close(self):
+        """
+        commit outstanding changes and release the session
+        """
+        try:
+            self.commit()
+        finally:
+            self._session.close()
+
+
+class MeasurementModelWriter(object):
+    def __init__(self, db_file, commit_interval=1):
+        """
+        a single thread owns the MeasurementModel - parallel workers queue their database work (see call)
+        instead of contending for the sqlite database
+        :param db_file: sqlite database file
+        :param commit_interval: see MeasurementModel
+        """
+        self._queue = Queue.Queue()
+        self._started = threading.Event()
+        self._start_error = None
+
+        self._thread = threading.Thread(target=self._serve, args=(db_file, commit_interval))
+        self._thread.daemon = True
+        self._thread.start()
+
+        self._started.wait()
+        if self._start_error:
+            raise self._start_error[0], self._start_error[1], self._start_error[2]
+
+    def _serve(self, db_file, commit_interval):
+        try:
+            mm = MeasurementModel(db_file, commit_interval=commit_interval)
+        except Exception:
+            self._start_error = sys.exc_info()
+            self._started.set()
+            return
+        self._started.set()
+
+        with mm:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+
+                function, args, kwargs, result = job
+                try:
+                    result['value'] = function(mm, *args, **kwargs)
+                except Exception:
+                    result['error'] = sys.exc_info()
+                result['done'].set()
+
+    def call(self, function, *args, **kwargs):
+        """
+        run function(measurement_model, *args, **kwargs) in the writer thread and wait for it
+        the result must not reference database objects (they belong to the writer thread)
+        :return: result of function
+        """
+        result = {'done': threading.Event()}
+        self._queue.put((function, args, kwargs, result))
+        result['done'].wait()
+
+        if 'error' in result:
+            raise result['error'][0], result['error'][1], result['error'][2]
+
+        return result['value']
+
+    def close(self):
+        """
+        finish the queued work, commit and stop the writer thread
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 
 if __name__ == '__main__':
@@ -284,18 +943,18 @@ if __name__ == '__main__':
     injector_stat_0 = InjectorStat(measurement_config_id=measurement_config.id, port_name='eth2',
                                    rx_frames=1, rx_bytes=2,
                                    tx_frames=15, tx_bytes=4,
-                                   tx_speed=5,
+                                   tx_speed_mbit=5,
                                    is_mirrored_port=True
                                    )
     injector_stat_1 = InjectorStat(measurement_config_id=measurement_config.id, port_name='eth4',
                                    rx_frames=6, rx_bytes=7,
                                    tx_frames=8, tx_bytes=9,
-                                   tx_speed=10
+                                   tx_speed_mbit=10
                                    )
     injector_stat_2 = InjectorStat(measurement_config_id=measurement_config.id, port_name='eth5',
                                    rx_frames=11, rx_bytes=12,
                                    tx_frames=13, tx_bytes=14,
-                                   tx_speed=15
+                                   tx_speed_mbit=15
                                    )
 
     mm.insert(mirror_stat)
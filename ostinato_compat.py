@@ -0,0 +1,204 @@
+import copy
+
+'''
+stand-ins of the ost_pb messages used by OstinatoInterface - only imported if python-ostinato is not installed, so
+the drones served in process (drone_simulator.py, packet_engine.py) can be used without it
+'''
+
+
+class _Repeated(list):
+    def __init__(self, message_class):
+        list.__init__(self)
+        self._message_class = message_class
+
+    def add(self):
+        message = self._message_class()
+        self.append(message)
+        return message
+
+
+class _Extensions(dict):
+    def __missing__(self, extension):
+        self[extension] = extension.message_class()
+        return self[extension]
+
+
+class _Extension(object):
+    def __init__(self, name, message_class):
+        self.name = name
+        self.message_class = message_class
+
+    def __deepcopy__(self, memo):
+        # the handle identifies the extension - copied messages must use the same one
+        return self
+
+    def __repr__(self):
+        return self.name
+
+
+class _Message(object):
+    # field name -> default value, message class or [message class] (repeated field)
+    FIELDS = {}
+    EXTENDABLE = False
+
+    def __init__(self):
+        for name, default in self.FIELDS.items():
+            if isinstance(default, list):
+                value = _Repeated(default[0])
+            elif isinstance(default, type) and issubclass(default, _Message):
+                value = default()
+            else:
+                value = default
+            object.__setattr__(self, name, value)
+
+        if self.EXTENDABLE:
+            object.__setattr__(self, 'Extensions', _Extensions())
+
+    def __setattr__(self, name, value):
+        if name not in self.FIELDS:
+            raise AttributeError('{} has no field \'{}\''.format(type(self).__name__, name))
+        object.__setattr__(self, name, value)
+
+    def CopyFrom(self, other):
+        self.__dict__.update(copy.deepcopy(other.__dict__))
+
+    def Clear(self):
+        self.__init__()
+
+    def SerializeToString(self):
+        return repr(self)
+
+    def __eq__(self, other):
+        return type(self) == type(other) and repr(self) == repr(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        fields = ['{}={!r}'.format(name, getattr(self, name)) for name in sorted(self.FIELDS)]
+        if self.EXTENDABLE:
+            fields += ['[{!r}]={!r}'.format(extension, message)
+                       for extension, message in sorted(self.Extensions.items(), key=lambda item: item[0].name)]
+        return '{}({})'.format(type(self).__name__, ', '.join(fields))
+
+
+class _PortId(_Message):
+    FIELDS = {'id': 0}
+
+
+class _PortIdList(_Message):
+    FIELDS = {'port_id': [_PortId]}
+
+
+class _StreamId(_Message):
+    FIELDS = {'id': 0}
+
+
+class _StreamIdList(_Message):
+    FIELDS = {'port_id': _PortId, 'stream_id': [_StreamId]}
+
+
+class _StreamCore(_Message):
+    e_fl_fixed, e_fl_inc, e_fl_dec, e_fl_random = range(4)
+
+    FIELDS = {'name': '', 'is_enabled': False, 'ordinal': 0, 'len_mode': e_fl_fixed, 'frame_len': 64,
+              'frame_len_min': 64, 'frame_len_max': 1518}
+
+
+class _StreamControl(_Message):
+    e_su_packets, e_su_bursts = range(2)
+    e_sm_fixed, e_sm_continuous = range(2)
+    e_nw_stop, e_nw_goto_next, e_nw_goto_id = range(3)
+
+    FIELDS = {'unit': e_su_packets, 'mode': e_sm_fixed, 'num_packets': 1, 'num_bursts': 1, 'packets_per_burst': 10,
+              'next': e_nw_goto_next, 'packets_per_sec': 1., 'bursts_per_sec': 1.}
+
+
+class _VariableField(_Message):
+    kCounter8, kCounter16, kCounter32 = range(3)
+    kIncrement, kDecrement, kRandom = range(3)
+
+    FIELDS = {'type': kCounter8, 'offset': 0, 'mask': 0xffffffff, 'value': 0, 'mode': kIncrement, 'count': 16,
+              'step': 1}
+
+
+class _ProtocolId(_Message):
+    FIELDS = {'id': 0}
+
+
+class _Protocol(_Message):
+    kMacFieldNumber = 100
+    kPayloadFieldNumber = 101
+    kEth2FieldNumber = 200
+    kIp4FieldNumber = 301
+    kUdpFieldNumber = 401
+
+    FIELDS = {'protocol_id': _ProtocolId, 'variable_field': [_VariableField]}
+    EXTENDABLE = True
+
+
+class _Stream(_Message):
+    FIELDS = {'stream_id': _StreamId, 'core': _StreamCore, 'control': _StreamControl, 'protocol': [_Protocol]}
+
+
+class _StreamConfigList(_Message):
+    FIELDS = {'port_id': _PortId, 'stream': [_Stream]}
+
+
+class _Port(_Message):
+    FIELDS = {'port_id': _PortId, 'name': '', 'description': '', 'is_enabled': False, 'transmit_mode': 0}
+
+
+class _PortConfigList(_Message):
+    FIELDS = {'port': [_Port]}
+
+
+class _PortState(_Message):
+    FIELDS = {'link_state': 0, 'is_transmit_on': False, 'is_capture_on': False}
+
+
+class _PortStats(_Message):
+    FIELDS = {'port_id': _PortId, 'state': _PortState, 'rx_pkts': 0, 'rx_bytes': 0, 'tx_pkts': 0, 'tx_bytes': 0}
+
+
+class _PortStatsList(_Message):
+    FIELDS = {'port_stats': [_PortStats]}
+
+
+class _Mac(_Message):
+    FIELDS = {'dst_mac_mode': 0, 'dst_mac': 0, 'src_mac_mode': 0, 'src_mac': 0}
+
+
+class _Ip4(_Message):
+    e_im_fixed, e_im_inc_host, e_im_dec_host, e_im_random_host = range(4)
+
+    FIELDS = {'src_ip': 0, 'dst_ip': 0, 'src_ip_mode': e_im_fixed, 'dst_ip_mode': e_im_fixed}
+
+
+class _Payload(_Message):
+    e_dp_fixed_word, e_dp_inc_byte, e_dp_dec_byte, e_dp_random = range(4)
+
+    FIELDS = {'pattern_mode': e_dp_fixed_word, 'pattern': 0}
+
+
+class _OstPb(object):
+    PortIdList = _PortIdList
+    StreamIdList = _StreamIdList
+    StreamConfigList = _StreamConfigList
+    PortConfigList = _PortConfigList
+    PortStatsList = _PortStatsList
+    Protocol = _Protocol
+    VariableField = _VariableField
+
+    kSequentialTransmit = 0
+    kInterleavedTransmit = 1
+
+
+ost_pb = _OstPb
+mac = _Extension('mac', _Mac)
+ip4 = _Extension('ip4', _Ip4)
+Ip4 = _Ip4
+payload = _Extension('payload', _Payload)
+Payload = _Payload
+StreamCore = _StreamCore
+StreamControl = _StreamControl
@@ -1,27 +1,106 @@
+import io
 import sys
 import time
+import threading
 import jsonpickle
 
-from ostinato.core import ost_pb, DroneProxy
-from ostinato.protocols.mac_pb2 import mac
-from ostinato.protocols.ip4_pb2 import ip4, Ip4
-from ostinato.protocols.protocol_pb2 import StreamCore
+try:
+    from ostinato.core import ost_pb, DroneProxy
+    from ostinato.protocols.mac_pb2 import mac
+    from ostinato.protocols.ip4_pb2 import ip4, Ip4
+    from ostinato.protocols.payload_pb2 import payload, Payload
+    from ostinato.protocols.protocol_pb2 import StreamCore, StreamControl
+except ImportError:
+    # offline - only drones served in process can be used (drone_simulator.py, packet_engine.py)
+    DroneProxy = None
+    from ostinato_compat import ost_pb, mac, ip4, Ip4, payload, Payload, StreamCore, StreamControl
+
+from capture_analysis import arrival_times, capture_analyse, stream_tag, StreamLoss
+from frame_profile import FRAME_PROFILE_IMIX, FRAME_PROFILE_RANDOM
+
+# preamble + start frame delimiter (8 bytes) and inter frame gap (12 bytes) - on the wire but not in frame_len
+L1_OVERHEAD_BYTES = 20
+
+# l2 - speed_mbit covers the frames only (frame_len incl. FCS)
+# l1 - speed_mbit covers the line (frame_len + L1_OVERHEAD_BYTES), 100 Mbit/s saturate a fast ethernet link
+RATE_MODE_L2 = 'l2'
+RATE_MODE_L1 = 'l1'
+RATE_MODES = (RATE_MODE_L2, RATE_MODE_L1)
 
 
 class TXPortConfig(object):
-    def __init__(self, interface_name, is_mirrored_port, src_mac, dst_mac, frame_len, speed_mbit):
+    def __init__(self, interface_name, is_mirrored_port, src_mac, dst_mac, frame_len, speed_mbit,
+                 frame_profile=None, burst_pattern=None):
+        """
+        :param frame_len: fixed frame len - ignored if a frame profile is given (use the average len for display)
+        :param frame_profile: optional frame_profile.FrameProfile - mixed frame sizes
+        :param burst_pattern: optional burst_pattern.BurstPattern - send bursts instead of a constant rate
+        """
         self.interface_name = interface_name
         self.is_mirrored_port = is_mirrored_port
         self.src_mac = src_mac
         self.dst_mac = dst_mac
         self.frame_len = frame_len
         self.speed_mbit = speed_mbit
+        self.frame_profile = frame_profile
+        self.burst_pattern = burst_pattern
 
         self._duration = None
         self._frames_total_calculated = None
         self._frames_per_second_calculated = None
         self._stream = None
 
+        # stream tag -> (frames_per_second, frames_total) of each stream of the port
+        self.frames_calculated_by_tag = {}
+        # stream tag -> frames_per_burst (burst pattern only)
+        self.frames_per_burst_by_tag = {}
+        # stream tag -> speed [Mbit/s] sent by the stream (burst pattern only)
+        self.speed_mbit_by_tag = {}
+
+    @property
+    def stream_count(self):
+        """
+        number of streams needed - one per imix frame len, the learning frame (speed 0) needs a single stream
+        """
+        if self.frame_profile and self.speed_mbit:
+            return self.frame_profile.stream_count
+        return 1
+
+    @property
+    def is_interleaved(self):
+        """
+        the streams of the port are interleaved - the drone may repeat them until the transmission is stopped,
+        so the port is sent for the duration of the run rather than a number of frames
+        """
+        return self.stream_count > 1
+
+    @property
+    def average_frame_len(self):
+        if self.frame_profile:
+            return self.frame_profile.average_frame_len
+        return self.frame_len
+
+    @property
+    def speed_mbit_sent(self):
+        """
+        speed actually sent - the bursts of cyclic patterns are rounded to whole frames, so it may differ from
+        speed_mbit if a burst pattern is used
+        """
+        if not self.speed_mbit_by_tag:
+            return self.speed_mbit
+        return int(round(sum(self.speed_mbit_by_tag.values())))
+
+    @property
+    def bursts_calculated(self):
+        """
+        :return: frames_per_burst (all streams of the port), bursts_per_sec - (None, None) for constant rates
+        """
+        if not self.frames_per_burst_by_tag:
+            return None, None
+
+        frames_per_burst = sum(self.frames_per_burst_by_tag.values())
+        return frames_per_burst, self.frames_per_second_calculated / frames_per_burst
+
     @property
     def duration(self):
         if not self._duration:
@@ -71,11 +150,19 @@ class TXPortConfig(object):
 
 class RXTXStats:
     def __init__(self, interface_name, rx_bytes, rx_frames, tx_bytes, tx_frames, is_mirror_port=False,
-                 is_mirrored_port=False, speed_mbit=0):
+                 is_mirrored_port=False, speed_mbit=0, wire_mbit=0., frames_per_burst=None, bursts_per_sec=None,
+                 nominal_mbit=None):
         self.interface_name = interface_name
         self.is_mirror_port = is_mirror_port
         self.is_mirrored_port = is_mirrored_port
+        # tx speed sent and as requested by the speed pattern - differ if a burst pattern rounds the bursts
         self.speed_mbit = speed_mbit
+        self.nominal_mbit = speed_mbit if nominal_mbit is None else nominal_mbit
+        # on the wire (l1) tx rate actually sent
+        self.wire_mbit = wire_mbit
+        # burst pattern only - None for constant rates
+        self.frames_per_burst = frames_per_burst
+        self.bursts_per_sec = bursts_per_sec
         self.rx_bytes = rx_bytes
         self.rx_frames = rx_frames
         self.tx_bytes = tx_bytes
@@ -85,11 +172,34 @@ class RXTXStats:
         return self.__str__()
 
     def __str__(self):
-        return '{:<7}, is_mirror: {:<1}, is_mirrored: {:<1}, speed_mbit: {:<3}, rx_bytes: {:<8}, rx_frames: {:<8}, tx_bytes: {:<8}, tx_frames: {:<8}'.format(
+        return '{:<7}, is_mirror: {:<1}, is_mirrored: {:<1}, speed_mbit: {:<3}, wire_mbit: {:<7.3f}, rx_bytes: {:<8}, rx_frames: {:<8}, tx_bytes: {:<8}, tx_frames: {:<8}'.format(
             self.interface_name,
             self.is_mirror_port,
             self.is_mirrored_port,
             self.speed_mbit,
+            self.wire_mbit,
+            self.rx_bytes,
+            self.rx_frames,
+            self.tx_bytes,
+            self.tx_frames)
+
+
+class RXTXSample:
+    def __init__(self, interface_name, offset_ms, rx_bytes, rx_frames, tx_bytes, tx_frames):
+        self.interface_name = interface_name
+        self.offset_ms = offset_ms
+        self.rx_bytes = rx_bytes
+        self.rx_frames = rx_frames
+        self.tx_bytes = tx_bytes
+        self.tx_frames = tx_frames
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return '{:<7}, offset_ms: {:<5}, rx_bytes: {:<8}, rx_frames: {:<8}, tx_bytes: {:<8}, tx_frames: {:<8}'.format(
+            self.interface_name,
+            self.offset_ms,
             self.rx_bytes,
             self.rx_frames,
             self.tx_bytes,
@@ -97,25 +207,75 @@ class RXTXStats:
 
 
 class OstinatoInterface(object):
-    def __init__(self, host_name='127.0.0.1', rx_interface='eth0', accepted_tx_diff=1):
+    def __init__(self, host_name='127.0.0.1', rx_interface='eth0', accepted_tx_diff=1, poll_interval=None,
+                 quiet_window=0.1, sample_interval=None, capture_analysis=False, rate_mode=RATE_MODE_L2, drone=None):
+        """
+        :param host_name: of the drone
+        :param rx_interface: nic connected to the mirror port
+        :param accepted_tx_diff: number of frames a tx port may miss before the run is considered failed
+        :param poll_interval: if set, poll the port stats every poll_interval seconds to detect the end of
+                              each run phase instead of using fixed sleeps (the sleeps are kept as upper bounds)
+        :param quiet_window: time [s] the rx counters must not change to consider the run completed (polling only)
+        :param sample_interval: if set, sample the counters of all ports every sample_interval seconds while
+                                transmitting (see interface_samples)
+        :param capture_analysis: if set, fetch the capture of the rx ports after each run and analyse the
+                                 sequence tagged frames (see interface_losses) - the tx ports the streams are
+                                 sent to are captured too (reference of the mirror delay)
+        :param rate_mode: RATE_MODE_L2 or RATE_MODE_L1 - layer the speed_mbit of the tx port configs refers to
+        :param drone: optional drone proxy used instead of connecting to host_name
+                      (e.g. drone_simulator.SimulatedDroneProxy)
+        """
+        if rate_mode not in RATE_MODES:
+            raise ValueError('invalid rate mode \'{}\' - use one of {}'.format(rate_mode, ', '.join(RATE_MODES)))
+        if drone is None and DroneProxy is None:
+            raise ImportError('python-ostinato is not installed - only a simulated drone can be used')
 
         self._tx_port_configs = []
         self._interface_statistics = []
+        self._interface_samples = []
+        self._interface_losses = []
+        # wall clock time of the last startTransmit/stopTransmit of a run
+        self._transmit_start = None
+        self._transmit_stop = None
 
         self._tx_port_ids = ost_pb.PortIdList()
         self._rx_port_ids = ost_pb.PortIdList()
         self._stream_id_cntr = 1
 
-        self._drone = DroneProxy(host_name)
+        # port id -> stream id / last stream config sent to the drone
+        self._stream_ids_by_port_id = {}
+        self._stream_configs_by_port_id = {}
+
+        self._drone = drone or DroneProxy(host_name)
         self._drone.connect()
+        # the sampler thread and the run phase polling share the drone connection
+        self._drone_lock = threading.Lock()
 
         self._port_id_list = self._drone.getPortIdList()
         self._port_configs = self._drone.getPortConfig(self._port_id_list)
 
+        self._port_ids_by_interface_name = {}
+        self._interface_names_by_port_id = {}
+        # port id -> sequential/interleaved transmission of the streams
+        self._transmit_modes_by_port_id = {}
+        for port in self._port_configs.port:
+            self._port_ids_by_interface_name[port.name] = port.port_id
+            self._interface_names_by_port_id[port.port_id.id] = port.name
+            self._transmit_modes_by_port_id[port.port_id.id] = port.transmit_mode
+
         if rx_interface:
             self._rx_port_add(rx_interface)
 
         self._accepted_tx_diff = accepted_tx_diff
+        self._poll_interval = poll_interval
+        self._quiet_window = quiet_window
+        self._sample_interval = sample_interval
+        self._capture_analysis = capture_analysis
+        self._rate_mode = rate_mode
+
+    @property
+    def rate_mode(self):
+        return self._rate_mode
 
     def _rx_port_add(self, interface_name):
         """
@@ -142,19 +302,17 @@ class OstinatoInterface(object):
 
     def _interface_name_by_port_id(self, port_id):
 
-        for port in self._port_configs.port:
-            if port_id.id == port.port_id.id:
-                return port.name
-
-        raise ValueError('Unknown or invalid port id: {}'.format(port_id))
+        try:
+            return self._interface_names_by_port_id[port_id.id]
+        except KeyError as _:
+            raise ValueError('Unknown or invalid port id: {}'.format(port_id))
 
     def _port_id_by_interface_name(self, interface_name):
 
-        for port in self._port_configs.port:
-            if interface_name == port.name:
-                return port.port_id
-
-        raise ValueError('Unknown or invalid interface name: {}'.format(interface_name))
+        try:
+            return self._port_ids_by_interface_name[interface_name]
+        except KeyError as _:
+            raise ValueError('Unknown or invalid interface name: {}'.format(interface_name))
 
     def ports_available_list(self):
 
@@ -176,46 +334,179 @@ class OstinatoInterface(object):
 
         self._tx_port_configs.append(tx_port_config)
 
-    def _prepare_stream(self, tx_port_config, duration):
+    def reset(self):
+        """
+        remove all tx port configs and collected statistics
+        the drone connection, the port table, the rx ports and the streams are kept - so the interface
+        can be reused for the next speed pattern (streams get updated in place by the next run)
+        """
+        self._tx_port_configs = []
+        self._tx_port_ids.Clear()
+        self._interface_statistics = []
+
+    def reconfigure(self, tx_port_configs):
+        """
+        replace the current tx port configs by the given ones
+        :param tx_port_configs: list of TXPortConfig
+        """
+        self.reset()
+
+        for tx_port_config in tx_port_configs:
+            self.tx_port_config_add(tx_port_config)
+
+    def disconnect(self):
+
+        self._drone.disconnect()
+
+    def _port_stream_ids(self, port_id, count=1):
+        """
+        get the ids of the streams used on the given port
+        on first use of the port (or if the number of streams changes) all stale streams are removed (one rpc)
+        and the new streams are added
+        :param port_id: of the tx port
+        :param count: number of streams needed
+        :return: list of stream ids
+        """
+        if len(self._stream_ids_by_port_id.get(port_id.id, [])) == count:
+            return self._stream_ids_by_port_id[port_id.id]
+
+        stale_stream_ids = self._drone.getStreamIdList(port_id)
+        if len(stale_stream_ids.stream_id):
+            self._drone.deleteStream(stale_stream_ids)
 
         stream_ids = ost_pb.StreamIdList()
-        stream_ids.port_id.CopyFrom(tx_port_config.port_id)
-        stream_ids.stream_id.add().id = self._stream_id_cntr
-        self._stream_id_cntr += 1
+        stream_ids.port_id.CopyFrom(port_id)
+        for _ in range(count):
+            stream_ids.stream_id.add().id = self._stream_id_cntr
+            self._stream_id_cntr += 1
 
         self._drone.addStream(stream_ids)
 
+        self._stream_ids_by_port_id[port_id.id] = [stream_id.id for stream_id in stream_ids.stream_id]
+        self._stream_configs_by_port_id.pop(port_id.id, None)
+
+        return self._stream_ids_by_port_id[port_id.id]
+
+    def _port_transmit_mode_set(self, port_id, transmit_mode):
+        """
+        switch the port between sequential (one stream after the other) and interleaved transmission
+        """
+        if self._transmit_modes_by_port_id.get(port_id.id) == transmit_mode:
+            return
+
+        port_config_list = ost_pb.PortConfigList()
+        port = port_config_list.port.add()
+        port.port_id.CopyFrom(port_id)
+        port.transmit_mode = transmit_mode
+
+        self._drone.modifyPort(port_config_list)
+        self._transmit_modes_by_port_id[port_id.id] = transmit_mode
+
+    def _prepare_stream(self, tx_port_config, duration):
+        """
+        update the stream(s) of the given port - one stream per imix frame len, interleaved
+        :return: the first stream of the port
+        """
         port_stream_cfg = ost_pb.StreamConfigList()
 
         port_stream_cfg.port_id.CopyFrom(tx_port_config.port_id)
 
-        stream = port_stream_cfg.stream.add()
-        stream.stream_id.id = stream_ids.stream_id[0].id
+        stream_ids = self._port_stream_ids(tx_port_config.port_id, tx_port_config.stream_count)
+        self._port_transmit_mode_set(tx_port_config.port_id, ost_pb.kInterleavedTransmit if len(stream_ids) > 1
+                                     else ost_pb.kSequentialTransmit)
+
+        tx_port_config.frames_calculated_by_tag = {}
+        tx_port_config.frames_per_burst_by_tag = {}
+        tx_port_config.speed_mbit_by_tag = {}
+        for ordinal, stream_id in enumerate(stream_ids):
+            stream = port_stream_cfg.stream.add()
+            stream.stream_id.id = stream_id
+            stream.core.ordinal = ordinal
+
+            self._stream_build(stream, tx_port_config, duration, ordinal, frame_len_idx=ordinal)
+
+        tx_port_config.frames_total_calculated = sum(
+            frames_total for _, frames_total in tx_port_config.frames_calculated_by_tag.values())
+        tx_port_config.frames_per_second_calculated = sum(
+            frames_per_sec for frames_per_sec, _ in tx_port_config.frames_calculated_by_tag.values())
 
+        # the drone replaces the whole stream config on modify - so skip the rpc only if nothing changed
+        stream_config = port_stream_cfg.SerializeToString()
+        if self._stream_configs_by_port_id.get(tx_port_config.port_id.id) != stream_config:
+            self._drone.modifyStream(port_stream_cfg)
+            self._stream_configs_by_port_id[tx_port_config.port_id.id] = stream_config
+
+        return port_stream_cfg.stream[0]
+
+    def _stream_build(self, stream, tx_port_config, duration, ordinal=0, frame_len_idx=0):
+        """
+        fill core, control and protocols of the given stream according to the tx port config
+        the udp payload carries the stream tag, preceded by a sequence number if the capture is analysed
+        (see capture_analysis)
+        :param ordinal: of the stream - part of the stream tag
+        :param frame_len_idx: imix only - frame len of the profile sent by this stream
+        """
         stream.core.is_enabled = True
 
-        stream.core.len_mode = StreamCore.e_fl_fixed
-        stream.core.frame_len = tx_port_config.frame_len
+        frame_profile = tx_port_config.frame_profile
+        frame_share = 1.
+        frame_len = tx_port_config.average_frame_len
+
+        if not frame_profile:
+            stream.core.len_mode = StreamCore.e_fl_fixed
+            stream.core.frame_len = tx_port_config.frame_len
+        elif frame_profile.mode == FRAME_PROFILE_IMIX:
+            frame_len, frame_share = frame_profile.frame_len_shares()[frame_len_idx]
+            stream.core.len_mode = StreamCore.e_fl_fixed
+            stream.core.frame_len = frame_len
+        else:
+            stream.core.len_mode = StreamCore.e_fl_random if frame_profile.mode == FRAME_PROFILE_RANDOM \
+                else StreamCore.e_fl_inc
+            stream.core.frame_len_min = frame_profile.min_len
+            stream.core.frame_len_max = frame_profile.max_len
 
         tx_port_config.duration = duration
 
         if tx_port_config.speed_mbit:
 
-            frames_per_sec, frames_total = self._mbit_len_to_frames_per_sec(tx_port_config.speed_mbit,
-                                                                            tx_port_config.frame_len,
-                                                                            duration)
-
-            tx_port_config.frames_total_calculated = frames_total
-            tx_port_config.frames_per_second_calculated = frames_per_sec
-            stream.control.num_packets = frames_total
-            stream.control.packets_per_sec = frames_per_sec
+            # rate of the whole port - split according to the share of the frames sent by this stream
+            frames_per_sec, _ = self._mbit_len_to_frames_per_sec(tx_port_config.speed_mbit,
+                                                                 tx_port_config.average_frame_len,
+                                                                 duration,
+                                                                 self._rate_mode)
+            frames_per_sec *= frame_share
+
+            if tx_port_config.burst_pattern:
+                frames_per_burst, bursts_per_sec = tx_port_config.burst_pattern.bursts(frames_per_sec)
+                num_bursts = max(1, int(round(bursts_per_sec * duration)))
+                frames_per_sec = frames_per_burst * bursts_per_sec
+                frames_total = num_bursts * frames_per_burst
+
+                stream.control.unit = StreamControl.e_su_bursts
+                stream.control.num_bursts = num_bursts
+                stream.control.packets_per_burst = frames_per_burst
+                stream.control.bursts_per_sec = bursts_per_sec
+
+                tx_port_config.frames_per_burst_by_tag[stream_tag(tx_port_config.port_id.id, ordinal)] = \
+                    frames_per_burst
+                tx_port_config.speed_mbit_by_tag[stream_tag(tx_port_config.port_id.id, ordinal)] = \
+                    self._frames_per_sec_to_mbit(frames_per_sec, frame_len, self._rate_mode)
+            else:
+                frames_total = int(round(frames_per_sec * duration))
+
+                stream.control.num_packets = frames_total
+                stream.control.packets_per_sec = frames_per_sec
 
         else:
-            tx_port_config.frames_total_calculated = 1
-            tx_port_config.frames_per_second_calculated = 1
+            # a single (learning) frame - spread over the duration, an idle ramp step lasts as long as the others
+            frames_per_sec, frames_total = 1. / duration, 1
             stream.control.num_packets = 1
-            stream.control.packets_per_sec = 1
-            # stream.control.bursts_per_sec = 10
+            stream.control.packets_per_sec = frames_per_sec
+
+        tx_port_config.frames_calculated_by_tag[stream_tag(tx_port_config.port_id.id, ordinal)] = \
+            frames_per_sec, frames_total
+        tx_port_config.frames_total_calculated = frames_total
+        tx_port_config.frames_per_second_calculated = frames_per_sec
 
         p = stream.protocol.add()
         p.protocol_id.id = ost_pb.Protocol.kMacFieldNumber
@@ -237,24 +528,26 @@ class OstinatoInterface(object):
 
         stream.protocol.add().protocol_id.id = ost_pb.Protocol.kUdpFieldNumber
 
-        stream.protocol.add().protocol_id.id = ost_pb.Protocol.kPayloadFieldNumber
-
-        self._drone.modifyStream(port_stream_cfg)
-
-        return stream
+        p = stream.protocol.add()
+        p.protocol_id.id = ost_pb.Protocol.kPayloadFieldNumber
+
+        data = p.Extensions[payload]
+        data.pattern_mode = Payload.e_dp_fixed_word
+        data.pattern = stream_tag(tx_port_config.port_id.id, ordinal)
+
+        if self._capture_analysis:
+            # variable fields need a drone >= 0.9 - only added if the capture is analysed
+            sequence_number = p.variable_field.add()
+            sequence_number.type = ost_pb.VariableField.kCounter32
+            sequence_number.offset = 0
+            sequence_number.value = 0
+            sequence_number.mode = ost_pb.VariableField.kIncrement
+            # interleaved streams may be repeated until stopped - count on instead of wrapping
+            sequence_number.count = 0xffffffff if tx_port_config.is_interleaved else frames_total
+            sequence_number.step = 1
 
     def _prepare_streams(self, duration):
 
-        # delete old streams
-        for tx_port_config in self._tx_port_configs:
-            stream_ids = self._drone.getStreamIdList(tx_port_config.port_id)
-            for stream_id in stream_ids.stream_id:
-                stream_ids = ost_pb.StreamIdList()
-                stream_ids.port_id.CopyFrom(tx_port_config.port_id)
-                stream_ids.stream_id.add().id = stream_id.id
-
-                self._drone.deleteStream(stream_ids)
-
         for tx_port_config in self._tx_port_configs:
             tx_port_config.stream = self._prepare_stream(tx_port_config, duration)
 
@@ -271,6 +564,115 @@ class OstinatoInterface(object):
 
         return self._interface_statistics
 
+    def interface_losses(self):
+        """
+        loss/reordering/delay of the sequence tagged frames seen on the rx ports during the last run
+        (empty if the capture analysis is disabled)
+        :return: list of capture_analysis.StreamLoss - one per tx port stream
+        """
+        return self._interface_losses
+
+    def _direct_ports(self):
+        """
+        the tx port each stream is sent to (the one owning its dst mac) - the arrivals there are the reference of
+        the mirror delay
+        :return: list of (port_id, set of the stream tags sent to the port)
+        """
+        tx_port_configs_by_mac = dict((tx_port_config.src_mac, tx_port_config)
+                                      for tx_port_config in self._tx_port_configs)
+        direct_ports = {}
+
+        for tx_port_config in self._tx_port_configs:
+            dst_port_config = tx_port_configs_by_mac.get(tx_port_config.dst_mac)
+            if dst_port_config is None:
+                continue
+
+            _, tags = direct_ports.setdefault(dst_port_config.port_id.id, (dst_port_config.port_id, set()))
+            tags.update(tx_port_config.frames_calculated_by_tag)
+
+        return direct_ports.values()
+
+    def _capture_port_ids(self, warmup=False):
+        """
+        :return: PortIdList of the rx ports - and of the direct ports if the capture is analysed
+        """
+        port_ids = ost_pb.PortIdList()
+        port_ids.CopyFrom(self._rx_port_ids)
+
+        if self._capture_analysis and not warmup:
+            for port_id, _ in self._direct_ports():
+                port_ids.port_id.add().id = port_id.id
+
+        return port_ids
+
+    def _capture_analyse(self):
+        """
+        the drone returns the capture of a port as a whole (no chunked rpc) - it is held in memory while it is
+        analysed, i.e. all captured frames of the run: mind long runs at high frame rates. the arrival times
+        of the direct ports are kept while the rx ports are analysed (8 bytes per frame)
+        """
+
+        tx_frames = dict((stat.interface_name, stat.tx_frames) for stat in self._interface_statistics
+                         if not stat.is_mirror_port)
+        direct_arrivals_by_tag = {}
+        for port_id, tags in self._direct_ports():
+            capture = io.BytesIO(self._drone.getCaptureBuffer(port_id))
+            # the capture may hold the frames sent by the port too - keep the streams sent to it
+            direct_arrivals_by_tag.update(arrival_times(capture, tags))
+        streams = {}
+
+        for port_id in self._rx_port_ids.port_id:
+            capture = io.BytesIO(self._drone.getCaptureBuffer(port_id))
+
+            for tag, stream_loss in capture_analyse(capture, direct_arrivals_by_tag).items():
+                if tag in streams:
+                    raise ValueError('stream tag 0x{:08x} captured on multiple rx ports'.format(tag))
+                streams[tag] = stream_loss
+
+        self._interface_losses = []
+
+        for tx_port_config in self._tx_port_configs:
+            for tag in sorted(tx_port_config.frames_calculated_by_tag):
+                if tag not in streams:
+                    streams[tag] = StreamLoss(tag)
+
+                stream_loss = streams[tag]
+                stream_loss.interface_name = tx_port_config.interface_name
+
+                # the port counters can't tell the streams of a port apart - split them by the calculated frames
+                stream_loss.finish(int(round(tx_frames[tx_port_config.interface_name] *
+                                             tx_port_config.frames_calculated_by_tag[tag][1] /
+                                             float(tx_port_config.frames_total_calculated))))
+
+                self._interface_losses.append(stream_loss)
+
+    def interface_samples(self):
+        """
+        counter samples of all ports taken during the last run (empty if sampling is disabled)
+        :return: list of RXTXSample
+        """
+        return self._interface_samples
+
+    def _port_stats_get(self, port_ids):
+
+        with self._drone_lock:
+            return list(self._drone.getStats(port_ids).port_stats)
+
+    def _interface_samples_add(self, start_time):
+
+        offset_ms = int((time.time() - start_time) * 1000)
+
+        for stat in self._port_stats():
+            self._interface_samples.append(RXTXSample(self._interface_name_by_port_id(stat.port_id), offset_ms,
+                                                      stat.rx_bytes, stat.rx_pkts,
+                                                      stat.tx_bytes, stat.tx_pkts))
+
+    def _sample(self, stop_event, start_time):
+
+        while not stop_event.is_set():
+            self._interface_samples_add(start_time)
+            stop_event.wait(self._sample_interval)
+
     def _interface_stats_create(self):
         """
         there is an ugly impedance mismatch between the stats we can collect
@@ -278,10 +680,13 @@ class OstinatoInterface(object):
         """
         self._interface_statistics = []
 
-        for stat in self._drone.getStats(self._tx_port_ids).port_stats:
+        for stat in self._port_stats_get(self._tx_port_ids):
             tx_port_config = self._tx_config_by_port_id(stat.port_id.id)
 
-            if abs(tx_port_config.frames_total_calculated - stat.tx_pkts) > self._accepted_tx_diff:
+            if tx_port_config.is_interleaved:
+                # sent until stopped - no frame count to compare with
+                duration = self._transmit_stop - self._transmit_start
+            elif abs(tx_port_config.frames_total_calculated - stat.tx_pkts) > self._accepted_tx_diff:
                 sys.stderr.write('{} failed to send all frames. calculated: {:<10}  send: {:<10} diff: {}\n'.format(
                     tx_port_config.interface_name,
                     tx_port_config.frames_total_calculated,
@@ -289,17 +694,24 @@ class OstinatoInterface(object):
                     tx_port_config.frames_total_calculated - stat.tx_pkts
                 ))
                 sys.exit(1)
+            else:
+                duration = tx_port_config.duration
 
+            frames_per_burst, bursts_per_sec = tx_port_config.bursts_calculated
             injector_stat = RXTXStats(tx_port_config.interface_name,
                                       stat.rx_bytes, stat.rx_pkts,
                                       stat.tx_bytes, stat.tx_pkts,
                                       is_mirror_port=False,
                                       is_mirrored_port=tx_port_config.is_mirrored_port,
-                                      speed_mbit=tx_port_config.speed_mbit)
+                                      speed_mbit=tx_port_config.speed_mbit_sent,
+                                      wire_mbit=self._wire_mbit(stat.tx_bytes, stat.tx_pkts, duration),
+                                      frames_per_burst=frames_per_burst,
+                                      bursts_per_sec=bursts_per_sec,
+                                      nominal_mbit=tx_port_config.speed_mbit)
 
             self._interface_statistics.append(injector_stat)
 
-        for stat in self._drone.getStats(self._rx_port_ids).port_stats:
+        for stat in self._port_stats_get(self._rx_port_ids):
             interface_name = self._interface_name_by_port_id(stat.port_id)
 
             mirror_stat = RXTXStats(interface_name,
@@ -311,41 +723,314 @@ class OstinatoInterface(object):
 
             self._interface_statistics.append(mirror_stat)
 
-    def run(self, duration=10):
+    def _wait_for(self, condition, timeout):
+        """
+        wait until condition is met - sleeps for timeout if polling is disabled
+        :param condition: callable returning True if the wait is over
+        :param timeout: upper bound in seconds
+        :return: True if the condition was met before the timeout expired
+        """
+        if not self._poll_interval:
+            time.sleep(timeout)
+            return False
+
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() >= deadline:
+                return False
+            time.sleep(self._poll_interval)
+
+        return True
+
+    def _port_stats(self):
+
+        return self._port_stats_get(self._tx_port_ids) + self._port_stats_get(self._rx_port_ids)
+
+    def _stats_cleared(self):
+
+        return all(not stat.rx_pkts and not stat.tx_pkts for stat in self._port_stats())
+
+    def _capture_started(self, port_ids):
+
+        return all(stat.state.is_capture_on for stat in self._port_stats_get(port_ids))
+
+    def _transmit_done(self):
+
+        for stat in self._port_stats_get(self._tx_port_ids):
+            tx_port_config = self._tx_config_by_port_id(stat.port_id.id)
+
+            if tx_port_config.is_interleaved:
+                if time.time() - self._transmit_start < tx_port_config.duration:
+                    return False
+            elif stat.state.is_transmit_on or \
+                    stat.tx_pkts + self._accepted_tx_diff < tx_port_config.frames_total_calculated:
+                return False
+
+        return True
+
+    def _rx_settled(self):
+        """
+        condition factory - the returned callable is True once the rx counters of all ports
+        did not change for quiet_window seconds
+        """
+        state = {'rx_pkts': None, 'changed': time.time()}
+
+        def _settled():
+            rx_pkts = [stat.rx_pkts for stat in self._port_stats()]
+            now = time.time()
+
+            if rx_pkts != state['rx_pkts']:
+                state['rx_pkts'] = rx_pkts
+                state['changed'] = now
+                return False
+
+            return now - state['changed'] >= self._quiet_window
+
+        return _settled
+
+    def run(self, duration=10, warmup=False):
+        """
+        :param warmup: the results of the run are discarded - skips the capture analysis
+        """
 
         self._prepare_streams(duration)
 
         self._drone.clearStats(self._tx_port_ids)
         self._drone.clearStats(self._rx_port_ids)
 
-        time.sleep(1)
+        self._wait_for(self._stats_cleared, 1)
+
+        capture_port_ids = self._capture_port_ids(warmup)
+        self._drone.startCapture(capture_port_ids)
+        self._wait_for(lambda: self._capture_started(capture_port_ids), 0.5)
+
+        self._interface_samples = []
+        sampler = None
+        self._drone.startTransmit(self._tx_port_ids)
+        # the timeline of the run starts once the drone started - not when it was asked to
+        transmit_start = time.time()
+        self._transmit_start = transmit_start
+
+        if self._sample_interval:
+            sampler_stop = threading.Event()
+            sampler = threading.Thread(target=self._sample, args=(sampler_stop, transmit_start))
+            sampler.daemon = True
+            sampler.start()
+
+        transmit_done = self._wait_for(self._transmit_done, duration + 1)
+
+        # interleaved streams may be repeated until stopped - stop before waiting for the rx ports
+        self._transmit_stop = time.time()
+        self._drone.stopTransmit(self._tx_port_ids)
+
+        if transmit_done:
+            # all frames sent - wait for the frames still queued in the switch
+            self._wait_for(self._rx_settled(), 0.5 + self._quiet_window)
+
+        if sampler:
+            sampler_stop.set()
+            sampler.join()
+            self._interface_samples_add(transmit_start)
+
+        if not self._poll_interval:
+            time.sleep(0.5)
+        self._drone.stopCapture(capture_port_ids)
+
+        self._interface_stats_create()
+
+        self._interface_losses = []
+        if self._capture_analysis and not warmup:
+            self._capture_analyse()
+
+    def settle(self, timeout=1):
+        """
+        wait between two runs - returns as soon as the rx counters settled if polling is enabled
+        """
+        self._wait_for(self._rx_settled(), timeout)
+
+    def _prepare_ramp_streams(self, steps, step_duration):
+        """
+        replace the streams of all tx ports by one stream per step - chained via 'goto next stream'
+        :param steps: list of steps, each a list of TXPortConfig using the same interfaces in the same order
+        :param step_duration: seconds per step
+        """
+        if any(step_port_config.stream_count > 1 for step in steps for step_port_config in step):
+            raise ValueError('ramp needs a single stream per port and step - imix frame profiles are not supported')
+
+        for port_idx, tx_port_config in enumerate(self._tx_port_configs):
+            port_id = tx_port_config.port_id
+            # the steps are chained - one stream after the other
+            self._port_transmit_mode_set(port_id, ost_pb.kSequentialTransmit)
+
+            stale_stream_ids = self._drone.getStreamIdList(port_id)
+            if len(stale_stream_ids.stream_id):
+                self._drone.deleteStream(stale_stream_ids)
+            # run() has to add its stream again
+            self._stream_ids_by_port_id.pop(port_id.id, None)
+            self._stream_configs_by_port_id.pop(port_id.id, None)
+
+            stream_ids = ost_pb.StreamIdList()
+            stream_ids.port_id.CopyFrom(port_id)
+            for _ in steps:
+                stream_ids.stream_id.add().id = self._stream_id_cntr
+                self._stream_id_cntr += 1
+
+            self._drone.addStream(stream_ids)
+
+            port_stream_cfg = ost_pb.StreamConfigList()
+            port_stream_cfg.port_id.CopyFrom(port_id)
+
+            for ordinal, step in enumerate(steps):
+                step_port_config = step[port_idx]
+                step_port_config.port_id = port_id
+
+                stream = port_stream_cfg.stream.add()
+                stream.stream_id.id = stream_ids.stream_id[ordinal].id
+                self._stream_build(stream, step_port_config, step_duration, ordinal)
+
+                stream.core.ordinal = ordinal
+                if ordinal < len(steps) - 1:
+                    stream.control.next = StreamControl.e_nw_goto_next
+                else:
+                    stream.control.next = StreamControl.e_nw_stop
+
+                step_port_config.stream = stream
+
+            self._drone.modifyStream(port_stream_cfg)
+
+    def _step_stats_create(self, step, counters, prev_counters):
+        """
+        build the stats of a single ramp step from the counter snapshots taken at its boundaries
+        :param step: list of TXPortConfig of the step
+        :param counters: port id -> port stats at the end of the step
+        :param prev_counters: port id -> port stats at the start of the step (None for the first step)
+        :return: list of RXTXStats
+        """
+
+        def _delta(port_id, field):
+            value = getattr(counters[port_id], field)
+            if prev_counters:
+                value -= getattr(prev_counters[port_id], field)
+            return value
+
+        step_statistics = []
+
+        for tx_port_config in step:
+            port_id = tx_port_config.port_id.id
+            frames_per_burst, bursts_per_sec = tx_port_config.bursts_calculated
+            step_statistics.append(RXTXStats(tx_port_config.interface_name,
+                                             _delta(port_id, 'rx_bytes'), _delta(port_id, 'rx_pkts'),
+                                             _delta(port_id, 'tx_bytes'), _delta(port_id, 'tx_pkts'),
+                                             is_mirror_port=False,
+                                             is_mirrored_port=tx_port_config.is_mirrored_port,
+                                             speed_mbit=tx_port_config.speed_mbit_sent,
+                                             wire_mbit=self._wire_mbit(_delta(port_id, 'tx_bytes'),
+                                                                       _delta(port_id, 'tx_pkts'),
+                                                                       tx_port_config.duration),
+                                             frames_per_burst=frames_per_burst,
+                                             bursts_per_sec=bursts_per_sec,
+                                             nominal_mbit=tx_port_config.speed_mbit))
+
+        for port_id in self._rx_port_ids.port_id:
+            step_statistics.append(RXTXStats(self._interface_name_by_port_id(port_id),
+                                             _delta(port_id.id, 'rx_bytes'), _delta(port_id.id, 'rx_pkts'),
+                                             _delta(port_id.id, 'tx_bytes'), _delta(port_id.id, 'tx_pkts'),
+                                             is_mirror_port=True,
+                                             is_mirrored_port=False,
+                                             speed_mbit=0))
+
+        return step_statistics
+
+    def ramp_run(self, steps, step_duration=1):
+        """
+        transmit a whole staircase of tx port configs in one go - every tx port gets one stream per step,
+        the counters are sampled at the (time based) step boundaries
+        frames still queued in the switch at a boundary are accounted to the following step - so keep the
+        steps long compared to the switch buffers
+        :param steps: list of steps, each a list of TXPortConfig using the same interfaces in the same order
+        :param step_duration: seconds per step
+        :return: list of RXTXStats lists - one per step
+        """
+        self.reconfigure(steps[0])
+        self._prepare_ramp_streams(steps, step_duration)
+
+        self._drone.clearStats(self._tx_port_ids)
+        self._drone.clearStats(self._rx_port_ids)
+
+        self._wait_for(self._stats_cleared, 1)
 
         self._drone.startCapture(self._rx_port_ids)
-        time.sleep(0.5)
+        self._wait_for(lambda: self._capture_started(self._rx_port_ids), 0.5)
+
         self._drone.startTransmit(self._tx_port_ids)
+        # the step boundaries follow the start of the drone (see run)
+        transmit_start = time.time()
+
+        step_counters = []
+        for step_idx in range(len(steps)):
+            time.sleep(max(0., transmit_start + (step_idx + 1) * step_duration - time.time()))
+
+            if step_idx == len(steps) - 1:
+                # last step - wait for the end of the transmission and the frames still queued in the switch
+                if self._wait_for(self._ramp_transmit_done, 1):
+                    self._wait_for(self._rx_settled(), 0.5 + self._quiet_window)
 
-        time.sleep(duration + 1)
+            step_counters.append(dict((stat.port_id.id, stat) for stat in self._port_stats()))
 
         self._drone.stopTransmit(self._tx_port_ids)
-        time.sleep(0.5)
+        if not self._poll_interval:
+            time.sleep(0.5)
         self._drone.stopCapture(self._rx_port_ids)
 
-        self._interface_stats_create()
+        ramp_statistics = []
+        prev_counters = None
+        for step, counters in zip(steps, step_counters):
+            ramp_statistics.append(self._step_stats_create(step, counters, prev_counters))
+            prev_counters = counters
+
+        self._interface_statistics = ramp_statistics[-1]
+
+        return ramp_statistics
+
+    def _ramp_transmit_done(self):
+
+        return all(not stat.state.is_transmit_on for stat in self._port_stats_get(self._tx_port_ids))
 
     @staticmethod
-    def _mbit_len_to_frames_per_sec(mbit, frame_len, duration_sec):
+    def _mbit_len_to_frames_per_sec(mbit, frame_len, duration_sec, rate_mode=RATE_MODE_L2):
         """
-
-        :param mbit:
-        :param frame_len:
+        the drone takes fractional packets per second - so the rate is not truncated to whole frames
+        :param mbit: requested rate - frames only (RATE_MODE_L2) or on the wire (RATE_MODE_L1)
+        :param frame_len: incl. FCS
         :param duration_sec:
+        :param rate_mode: RATE_MODE_L2 or RATE_MODE_L1
         :return: frames_per_second, total_frames
         """
-        bytes_per_sec = (mbit * 1000 * 1000) / 8
+        bytes_per_sec = mbit * 1000 * 1000 / 8.
+
+        if rate_mode == RATE_MODE_L1:
+            frame_len += L1_OVERHEAD_BYTES
 
         frames_per_sec = bytes_per_sec / frame_len
 
-        return frames_per_sec, frames_per_sec * duration_sec
+        return frames_per_sec, int(round(frames_per_sec * duration_sec))
+
+    @staticmethod
+    def _frames_per_sec_to_mbit(frames_per_sec, frame_len, rate_mode=RATE_MODE_L2):
+        """
+        inverse of _mbit_len_to_frames_per_sec
+        """
+        if rate_mode == RATE_MODE_L1:
+            frame_len += L1_OVERHEAD_BYTES
+
+        return frames_per_sec * frame_len * 8. / 1000 / 1000
+
+    @staticmethod
+    def _wire_mbit(tx_bytes, tx_frames, duration_sec):
+        """
+        on the wire (l1) rate of the given tx counters
+        """
+        return (tx_bytes + tx_frames * L1_OVERHEAD_BYTES) * 8. / duration_sec / 1000 / 1000
 
 
 if __name__ == '__main__':
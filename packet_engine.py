@@ -0,0 +1,396 @@
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from drone_simulator import LocalDroneProxy, FRAME_HEADER, frame_headers, pcap_build, ost_pb
+
+'''
+software traffic engine - AF_PACKET sockets instead of an ostinato drone
+
+PacketDroneProxy serves the drone rpcs used by OstinatoInterface in process: the frames of each tx port are sent
+by a thread in batches (one sendmmsg per batch, preallocated frame buffers reused for every batch), each port
+counts its received frames in batches too (recvmmsg). works with plain nics or veth pairs in network namespaces
+(see README), needs CAP_NET_RAW
+
+bench mode (python packet_engine.py -i <tx interface> ...) reports the achieved frame rate and syscalls per batch
+'''
+
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_IGNORE_OUTGOING = 23
+PACKET_OUTGOING = 4
+MSG_WAITFORONE = 0x10000
+
+# frames per sendmmsg/recvmmsg
+BATCH_SIZE = 64
+
+# preallocated buffer per frame - fits the largest frame (1518 bytes incl. FCS)
+_SLOT_LEN = 2048
+_SOCKADDR_LL_LEN = 20
+_SOCKADDR_LL_PKTTYPE_OFFSET = 10
+_HEADER_LEN = FRAME_HEADER.itemsize
+# rx threads check for shutdown at least every _RX_TIMEOUT_SEC
+_RX_TIMEOUT_SEC = 0.05
+# all tx ports start together - time to get the threads running
+_TX_START_DELAY_SEC = 0.01
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(_IoVec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t), ('msg_flags', ctypes.c_int)]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+_libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+def _os_error():
+    error = ctypes.get_errno()
+    return OSError(error, os.strerror(error))
+
+
+class _MessageBatch(object):
+    def __init__(self, size, with_addresses=False):
+        """
+        preallocated buffers and message headers for sendmmsg/recvmmsg - every message uses a fixed slot
+        :param size: max. number of frames per syscall
+        :param with_addresses: keep the sender address (packet type) of received frames
+        """
+        self.size = size
+        self._buffer = (ctypes.c_uint8 * (size * _SLOT_LEN))()
+        self._iovecs = (_IoVec * size)()
+        self._messages = (_MMsgHdr * size)()
+        self._addresses = (ctypes.c_uint8 * (size * _SOCKADDR_LL_LEN))() if with_addresses else None
+
+        for idx in range(size):
+            self._iovecs[idx].iov_base = ctypes.addressof(self._buffer) + idx * _SLOT_LEN
+            self._iovecs[idx].iov_len = _SLOT_LEN
+            self._messages[idx].msg_hdr.msg_iov = ctypes.pointer(self._iovecs[idx])
+            self._messages[idx].msg_hdr.msg_iovlen = 1
+            if with_addresses:
+                self._messages[idx].msg_hdr.msg_name = ctypes.addressof(self._addresses) + idx * _SOCKADDR_LL_LEN
+                self._messages[idx].msg_hdr.msg_namelen = _SOCKADDR_LL_LEN
+
+        # numpy views - a whole batch is filled/evaluated without touching single frames in python
+        self.slots = np.ctypeslib.as_array(self._buffer).reshape(size, _SLOT_LEN)
+        self.iov_lens = np.ctypeslib.as_array(ctypes.cast(self._iovecs, ctypes.POINTER(ctypes.c_size_t)),
+                                              shape=(size, ctypes.sizeof(_IoVec) // ctypes.sizeof(ctypes.c_size_t))
+                                              )[:, _IoVec.iov_len.offset // ctypes.sizeof(ctypes.c_size_t)]
+        self.msg_lens = np.ctypeslib.as_array(ctypes.cast(self._messages, ctypes.POINTER(ctypes.c_uint32)),
+                                              shape=(size, ctypes.sizeof(_MMsgHdr) // 4)
+                                              )[:, _MMsgHdr.msg_len.offset // 4]
+        self.pkttypes = None
+        if with_addresses:
+            self.pkttypes = np.ctypeslib.as_array(self._addresses).reshape(
+                size, _SOCKADDR_LL_LEN)[:, _SOCKADDR_LL_PKTTYPE_OFFSET]
+
+    def send(self, fd, count):
+        """
+        send the first count slots (iov_lens) - retried until the kernel took all frames
+        :return: number of sendmmsg calls
+        """
+        offset = 0
+        calls = 0
+        while offset < count:
+            sent = _libc.sendmmsg(fd, ctypes.byref(self._messages, offset * ctypes.sizeof(_MMsgHdr)),
+                                  count - offset, 0)
+            calls += 1
+            if sent < 0:
+                if ctypes.get_errno() not in (errno.ENOBUFS, errno.EAGAIN, errno.EINTR):
+                    raise _os_error()
+                # tx queue of the nic full
+                time.sleep(0)
+                continue
+            offset += sent
+
+        return calls
+
+    def receive(self, fd):
+        """
+        wait for frames (up to the receive timeout of the socket)
+        :return: number of frames received, 0 on timeout
+        """
+        received = _libc.recvmmsg(fd, self._messages, self.size, MSG_WAITFORONE, None)
+        if received < 0:
+            if ctypes.get_errno() in (errno.EAGAIN, errno.EINTR):
+                return 0
+            raise _os_error()
+
+        return received
+
+
+class TXReport(object):
+    def __init__(self, interface_name, frames, tx_bytes, batches, syscalls, elapsed_sec):
+        """
+        what a tx thread achieved during the last transmission
+        """
+        self.interface_name = interface_name
+        self.frames = frames
+        self.tx_bytes = tx_bytes
+        self.batches = batches
+        self.syscalls = syscalls
+        self.elapsed_sec = elapsed_sec
+
+    @property
+    def frames_per_sec(self):
+        return self.frames / self.elapsed_sec if self.elapsed_sec else 0.
+
+    def __str__(self):
+        return '{:<7}: frames: {:<9}, pps: {:<10.1f}, batches: {:<7}, frames/batch: {:<5.1f}, ' \
+               'syscalls/batch: {:.2f}'.format(self.interface_name, self.frames, self.frames_per_sec, self.batches,
+                                               self.frames / float(self.batches) if self.batches else 0.,
+                                               self.syscalls / float(self.batches) if self.batches else 0.)
+
+
+class PacketDroneProxy(LocalDroneProxy):
+    def __init__(self, interface_names, batch_size=BATCH_SIZE, seed=0):
+        """
+        stand-in of ostinato.core.DroneProxy sending/receiving on the given interfaces via AF_PACKET
+        :param interface_names: interfaces served as drone ports (port id = index)
+        :param batch_size: max. frames per syscall
+        :param seed: of the random frame lens
+        """
+        LocalDroneProxy.__init__(self, interface_names, seed)
+
+        self._batch_size = batch_size
+        self._tx_sockets = {}
+        self._rx_sockets = {}
+
+        # port -> rx_pkts, rx_bytes, tx_pkts, tx_bytes - each counter is written by a single thread
+        self._counters = dict((port, [0, 0, 0, 0]) for port in range(self._port_count))
+        self._captures = dict((port, []) for port in range(self._port_count))
+        self._tx_reports = {}
+
+        self._rx_stop = threading.Event()
+        self._rx_threads = []
+        self._tx_stop = threading.Event()
+        self._tx_threads = {}
+
+    def connect(self):
+        for port, interface_name in enumerate(self.port_names):
+            # protocol 0 - the tx socket does not receive anything
+            tx_socket = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+            tx_socket.bind((interface_name, 0))
+            self._tx_sockets[port] = tx_socket
+
+            rx_socket = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+            rx_socket.bind((interface_name, ETH_P_ALL))
+            rx_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            rx_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO,
+                                 struct.pack('ll', 0, int(_RX_TIMEOUT_SEC * 1000 * 1000)))
+            try:
+                rx_socket.setsockopt(SOL_PACKET, PACKET_IGNORE_OUTGOING, 1)
+            except socket.error:
+                # kernel < 4.20 - outgoing frames are filtered by packet type
+                pass
+            self._rx_sockets[port] = rx_socket
+
+        self._rx_stop.clear()
+        for port in range(self._port_count):
+            rx_thread = threading.Thread(target=self._receive, args=(port,))
+            rx_thread.daemon = True
+            rx_thread.start()
+            self._rx_threads.append(rx_thread)
+
+    def disconnect(self):
+        self.stopTransmit(None)
+
+        self._rx_stop.set()
+        for rx_thread in self._rx_threads:
+            rx_thread.join()
+        self._rx_threads = []
+
+        for port_socket in self._tx_sockets.values() + self._rx_sockets.values():
+            port_socket.close()
+        self._tx_sockets = {}
+        self._rx_sockets = {}
+
+    def clearStats(self, port_id_list):
+        for port_id in port_id_list.port_id:
+            self._counters[port_id.id][:] = [0, 0, 0, 0]
+
+    def getStats(self, port_id_list):
+        port_stats_list = ost_pb.PortStatsList()
+
+        for port_id in port_id_list.port_id:
+            stats = port_stats_list.port_stats.add()
+            stats.port_id.id = port_id.id
+            stats.rx_pkts, stats.rx_bytes, stats.tx_pkts, stats.tx_bytes = self._counters[port_id.id]
+            tx_thread = self._tx_threads.get(port_id.id)
+            stats.state.is_transmit_on = tx_thread is not None and tx_thread.is_alive()
+            stats.state.is_capture_on = port_id.id in self._capture_on
+
+        return port_stats_list
+
+    def startCapture(self, port_id_list):
+        for port_id in port_id_list.port_id:
+            self._captures[port_id.id] = []
+        LocalDroneProxy.startCapture(self, port_id_list)
+
+    def getCaptureBuffer(self, port_id):
+        """
+        :return: pcap (ns timestamps of the receiving batch) of the frames received while the capture was running -
+                 headers only
+        """
+        return pcap_build(self._captures[port_id.id])
+
+    def startTransmit(self, port_id_list):
+        self.stopTransmit(None)
+        self._tx_stop.clear()
+
+        # the whole schedule is prepared before any port starts
+        schedules = {}
+        for port_id in port_id_list.port_id:
+            frames = self._port_frames(port_id.id)
+            if frames is not None:
+                headers = frame_headers(frames).view(np.uint8).reshape(len(frames), _HEADER_LEN)
+                schedules[port_id.id] = (frames['nominal'], frames['frame_len'], headers)
+
+        start_time = time.time() + _TX_START_DELAY_SEC
+        for port, schedule in schedules.items():
+            tx_thread = threading.Thread(target=self._transmit, args=(port, start_time) + schedule)
+            tx_thread.daemon = True
+            tx_thread.start()
+            self._tx_threads[port] = tx_thread
+
+    def stopTransmit(self, port_id_list):
+        self._tx_stop.set()
+        for tx_thread in self._tx_threads.values():
+            tx_thread.join()
+
+    def tx_reports(self):
+        """
+        :return: list of TXReport - one per port of the last transmission
+        """
+        return [self._tx_reports[port] for port in sorted(self._tx_reports)]
+
+    def _transmit(self, port, start_time, nominal, frame_lens, headers):
+        """
+        tx thread - send all frames that are due in one batch, sleep until the next frame is due
+        """
+        batch = _MessageBatch(self._batch_size)
+        fd = self._tx_sockets[port].fileno()
+        counters = self._counters[port]
+        tx_times = nominal + start_time
+        # the nic adds the FCS
+        wire_lens = frame_lens - 4
+
+        frame_count = len(tx_times)
+        sent = 0
+        batches = 0
+        syscalls = 0
+
+        while sent < frame_count and not self._tx_stop.is_set():
+            now = time.time()
+            due = int(np.searchsorted(tx_times, now, side='right'))
+            if due <= sent:
+                time.sleep(tx_times[sent] - now)
+                continue
+
+            count = min(due - sent, batch.size)
+            batch.slots[:count, :_HEADER_LEN] = headers[sent:sent + count]
+            batch.iov_lens[:count] = wire_lens[sent:sent + count]
+
+            syscalls += batch.send(fd, count)
+            batches += 1
+
+            counters[3] += int(frame_lens[sent:sent + count].sum())
+            counters[2] += count
+            sent += count
+
+        self._tx_reports[port] = TXReport(self.port_names[port], sent, counters[3], batches, syscalls,
+                                          time.time() - start_time)
+
+    def _receive(self, port):
+        """
+        rx thread - count (and capture) the frames received by the port
+        """
+        batch = _MessageBatch(self._batch_size, with_addresses=True)
+        fd = self._rx_sockets[port].fileno()
+        counters = self._counters[port]
+
+        while not self._rx_stop.is_set():
+            received = batch.receive(fd)
+            if not received:
+                continue
+
+            timestamp_ns = int(time.time() * 1e9)
+            incoming = batch.pkttypes[:received] != PACKET_OUTGOING
+            # FCS stripped by the nic
+            frame_lens = batch.msg_lens[:received][incoming].astype(np.int64) + 4
+
+            counters[1] += int(frame_lens.sum())
+            counters[0] += len(frame_lens)
+
+            if port in self._capture_on:
+                headers = batch.slots[:received, :_HEADER_LEN][incoming].copy().view(FRAME_HEADER).reshape(-1)
+                self._captures[port].append((np.full(len(frame_lens), timestamp_ns, dtype=np.uint64),
+                                             frame_lens, headers))
+
+
+def bench(tx_interfaces, rx_interface, frame_len, speed_mbit, duration, batch_size, rate_mode):
+    """
+    send frame_len sized frames at speed_mbit from every tx interface and report what the engine achieved
+    """
+    from ostinato_interface import OstinatoInterface, TXPortConfig
+
+    interface_names = sorted(set(tx_interfaces + ([rx_interface] if rx_interface else [])))
+    drone = PacketDroneProxy(interface_names, batch_size=batch_size)
+    oi = OstinatoInterface(rx_interface=rx_interface, poll_interval=0.01, quiet_window=0.1, drone=drone,
+                           rate_mode=rate_mode)
+
+    try:
+        for idx, interface_name in enumerate(tx_interfaces):
+            # locally administered src mac per port, broadcast dst (no switch learning needed)
+            oi.tx_port_config_add(TXPortConfig(interface_name, False, 0x020000000001 + idx, 0xffffffffffff,
+                                               frame_len, speed_mbit))
+        oi.run(duration=duration)
+
+        for report in drone.tx_reports():
+            print report
+        for stat in oi.interface_statistics():
+            print stat
+    finally:
+        oi.disconnect()
+
+
+if __name__ == '__main__':
+    from ostinato_interface import RATE_MODES, RATE_MODE_L2
+
+    parser = argparse.ArgumentParser(description='mirror/bandwidth test tool - AF_PACKET traffic engine bench')
+    parser.add_argument('-i', '--tx-interface', action='append', required=True,
+                        help='interface to send from (can be given multiple times)')
+    parser.add_argument('-r', '--rx-interface', default=None, help='interface to count the received frames on')
+    parser.add_argument('-l', '--frame-len', type=int, default=64, help='frame len incl. FCS (default: 64)')
+    parser.add_argument('-s', '--speed', type=float, default=100, help='Mbit/s per tx interface (default: 100)')
+    parser.add_argument('-d', '--duration', type=int, default=5, help='seconds (default: 5)')
+    parser.add_argument('-b', '--batch-size', type=int, default=BATCH_SIZE,
+                        help='max. frames per syscall (default: {})'.format(BATCH_SIZE))
+    parser.add_argument('-m', '--rate-mode', default=RATE_MODE_L2, choices=RATE_MODES,
+                        help='layer the speed refers to (default: l2)')
+
+    args = parser.parse_args()
+
+    try:
+        bench(args.tx_interface, args.rx_interface, args.frame_len, args.speed, args.duration, args.batch_size,
+              args.rate_mode)
+    except (socket.error, OSError) as e:
+        sys.stderr.write('{} (AF_PACKET needs CAP_NET_RAW). Abort.\n'.format(e))
+        sys.exit(1)
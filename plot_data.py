@@ -1,59 +1,69 @@
 import argparse
-
-import argparse as argparse
+import json
+import multiprocessing
 import os
-
-import matplotlib
 import sys
 
 from measurement_model import MeasurementModel
-from mpl_toolkits.mplot3d import Axes3D
-import matplotlib.pyplot as plt
-
-from mpl_toolkits.mplot3d import Axes3D
-from matplotlib import cm
-from matplotlib.colors import LightSource, LinearSegmentedColormap, Normalize
-import matplotlib.pyplot as plt
 import numpy as np
 
 
 from traffic_config import SPEED_PATTERN_SETS
 
+# fingerprints of the measurements rendered to an output dir (see manifest_load)
+MANIFEST_FILE_NAME = '.plot_manifest.json'
+
+# resolution of the interpolated drop grid (see drop_grid)
+GRID_STEPS = 200
+# drop percent drawn as the boundary of the drop free region - slightly above 0 to stay clear of rounding noise
+DROP_FREE_PERCENT = 0.01
 
-def _measurement_min_max(measurement_model, measurement):
-    min_frame_len = sys.maxint
-    max_frame_len = 0
-    min_bandwidth = 0
-    max_bandwidth = 0
+# database of the plot worker process (see plot_batch)
+_worker_mm = None
 
-    dropped_frames_total_max = 0
-    dropped_frames_percent_max = 0.
 
-    for measurement_config in measurement.measurement_configs:
+def _headless():
+    """
+    render without display - must be called before pyplot is imported
+    """
+    import matplotlib
+    matplotlib.use('Agg')
 
-        if measurement_config.frame_len < min_frame_len:
-            min_frame_len = measurement_config.frame_len
-        if measurement_config.frame_len > max_frame_len:
-            max_frame_len = measurement_config.frame_len
 
-        bandwidth_upstream = measurement_config.bandwidth_upstream
-        bandwidth_downstream = measurement_config.bandwidth_downstream
+def _pyplot():
+    """
+    pyplot incl. the 3d projection - imported on first use, listing and the batch setup need no graphics stack
+    """
+    from mpl_toolkits.mplot3d import Axes3D
+    import matplotlib.pyplot as plt
 
-        bandwidth_total = bandwidth_upstream + bandwidth_downstream
+    return plt
 
-        if bandwidth_total > max_bandwidth:
-            max_bandwidth = bandwidth_total
 
-        dropped_frames_total, dropped_frames_percent = measurement_model.mirror_dropped(measurement_config)
+def _measurement_min_max(configs):
+    """
+    :param configs: record array as returned by MeasurementModel.measurement_config_arrays
+    """
+    if not len(configs):
+        return 0, 0, sys.maxint, 0, 0, 0.
 
-        if dropped_frames_total > dropped_frames_total_max:
-            dropped_frames_total_max = dropped_frames_total
-            dropped_frames_percent_max = dropped_frames_percent
+    bandwidths_total = configs['bandwidth_upstream'] + configs['bandwidth_downstream']
 
-    return min_bandwidth, max_bandwidth, min_frame_len, max_frame_len, dropped_frames_total_max, dropped_frames_percent_max
+    # drop percent of the config with the most dropped frames (the first one if several)
+    idx_dropped_max = np.argmax(configs['mirror_dropped_total'])
+    dropped_frames_total_max = configs['mirror_dropped_total'][idx_dropped_max]
+    dropped_frames_percent_max = configs['mirror_dropped_percent'][idx_dropped_max]
+
+    if dropped_frames_total_max <= 0:
+        dropped_frames_total_max, dropped_frames_percent_max = 0, 0.
+
+    return 0, max(bandwidths_total.max(), 0), configs['frame_len'].min(), configs['frame_len'].max(), \
+           dropped_frames_total_max, dropped_frames_percent_max
 
 
 def _build_cm(v_min, v_max):
+    from matplotlib.colors import LinearSegmentedColormap, Normalize
+
     cdict1 = {'red': ((0.0, 0.0, 0.0),
                       (0.1, 0.8, 0.8),
                       (1.0, 1.0, 1.0)),
@@ -73,29 +83,26 @@ def _build_cm(v_min, v_max):
 
 
 def plot_measurement(measurement_model, device_name, measurement, show_graph, output_dir):
+    plt = _pyplot()
     fig = plt.figure(figsize=(15, 8))
     ax = fig.add_subplot(111, projection='3d')
 
+    configs = measurement_model.measurement_config_arrays(measurement)
+
     min_bandwidth, max_bandwidth, min_frame_len, max_frame_len, \
-    dropped_frames_total_max, dropped_frames_percent_max = _measurement_min_max(measurement_model, measurement)
+    dropped_frames_total_max, dropped_frames_percent_max = _measurement_min_max(configs)
 
     green_red, norm = _build_cm(0, dropped_frames_percent_max)
 
-    for measurement_config in measurement.measurement_configs:
-        bandwidth_upstream = measurement_model.bandwidth_total_upstream(measurement_config)
-        bandwidth_downstream = measurement_model.bandwidth_total_downstream(measurement_config)
-        bandwidth_total = bandwidth_upstream + bandwidth_downstream
-        _, drop_mirror_percent = measurement_model.mirror_dropped(measurement_config)
+    bandwidths_total = configs['bandwidth_upstream'] + configs['bandwidth_downstream']
+    drops_mirror_percent = configs['mirror_dropped_percent']
 
-        a = bandwidth_total / float(max_bandwidth)
+    # colour by drop, fade out with decreasing bandwidth - a single collection for all configs
+    colors = green_red(norm(drops_mirror_percent))
+    colors[:, 3] = bandwidths_total / float(max_bandwidth) if max_bandwidth else 1.
 
-        ax.scatter(measurement_config.frame_len,
-                   bandwidth_total,
-                   drop_mirror_percent,
-                   c=drop_mirror_percent,
-                   alpha=a,
-                   cmap=green_red,
-                   norm=norm)
+    # no depth shading - it would override the bandwidth alpha
+    ax.scatter(configs['frame_len'], bandwidths_total, drops_mirror_percent, c=colors, depthshade=False)
 
     ax.set_zlim(0, dropped_frames_percent_max)
     ax.set_xlabel('frame len / bytes')
@@ -109,6 +116,235 @@ def plot_measurement(measurement_model, device_name, measurement, show_graph, ou
     if show_graph:
         plt.show()
 
+    plt.close(fig)
+
+
+def plot_measurement_delay(measurement_model, device_name, measurement, show_graph, output_dir):
+    delays = measurement_model.measurement_config_delays(measurement)
+
+    if not delays:
+        sys.stderr.write('no delay data for {} @ {} (measured without capture analysis?) - skipped\n'.format(
+            device_name, measurement.name))
+        return
+
+    frame_lens, bandwidths_total, delays_p99_us, jitters_p99_us = [np.array(column) for column in zip(*delays)]
+
+    plt = _pyplot()
+    fig = plt.figure(figsize=(15, 8))
+
+    for idx, (values, label) in enumerate([(delays_p99_us, 'mirror delay p99 / us'),
+                                            (jitters_p99_us, 'mirror jitter p99 / us')]):
+        ax = fig.add_subplot(1, 2, idx + 1, projection='3d')
+        green_red, norm = _build_cm(min(0, values.min()), values.max())
+
+        ax.scatter(frame_lens, bandwidths_total, values, c=values, cmap=green_red, norm=norm)
+
+        ax.set_xlabel('frame len / bytes')
+        ax.set_ylabel('total bandwidth / Mbit/s')
+        ax.set_zlabel(label)
+        ax.view_init(azim=-20., elev=20.)
+
+    plt.suptitle('{} @ {} - mirror port delay'.format(device_name, measurement.name))
+
+    if output_dir:
+        fig.savefig(os.path.join(output_dir, '{}---{}---delay.png'.format(device_name, measurement.name)), dpi=80)
+    if show_graph:
+        plt.show()
+
+    plt.close(fig)
+
+
+def drop_grid(configs, steps=GRID_STEPS):
+    """
+    linear interpolation of the mirror drops on a regular (frame len, total bandwidth) grid - along the bandwidth
+    per measured frame len first (drops of configs with the same total bandwidth averaged), then along the frame len.
+    no extrapolation - cells outside the measured bandwidth range of a frame len are nan
+    :param configs: record array as returned by MeasurementModel.measurement_config_arrays (not empty)
+    :return: frame lens [x], total bandwidths [y], drop percent [y, x]
+    """
+    bandwidths_total = configs['bandwidth_upstream'] + configs['bandwidth_downstream']
+    drops_percent = configs['mirror_dropped_percent']
+
+    measured_frame_lens = np.unique(configs['frame_len'])
+    bandwidths = np.linspace(bandwidths_total.min(), bandwidths_total.max(), steps)
+
+    columns = np.empty((steps, len(measured_frame_lens)))
+    for idx, frame_len in enumerate(measured_frame_lens):
+        mask = configs['frame_len'] == frame_len
+        measured_bandwidths, inverse = np.unique(bandwidths_total[mask], return_inverse=True)
+        mean_drops = np.bincount(inverse, drops_percent[mask]) / np.bincount(inverse)
+
+        columns[:, idx] = np.interp(bandwidths, measured_bandwidths, mean_drops, left=np.nan, right=np.nan)
+
+    if len(measured_frame_lens) == 1:
+        return measured_frame_lens, bandwidths, columns
+
+    frame_lens = np.linspace(measured_frame_lens[0], measured_frame_lens[-1], steps)
+
+    # measured frame lens enclosing each grid frame len and the weight of the upper one
+    idx_upper = np.clip(np.searchsorted(measured_frame_lens, frame_lens), 1, len(measured_frame_lens) - 1)
+    lower, upper = measured_frame_lens[idx_upper - 1], measured_frame_lens[idx_upper]
+    weights = (frame_lens - lower) / (upper - lower).astype(float)
+
+    return frame_lens, bandwidths, columns[:, idx_upper - 1] * (1 - weights) + columns[:, idx_upper] * weights
+
+
+def _drop_free_contour(ax, frame_lens, bandwidths, drops, **kwargs):
+    """
+    draw the boundary of the drop free region (if there are any drops)
+    """
+    if len(frame_lens) > 1 and np.nanmax(drops) > DROP_FREE_PERCENT:
+        ax.contour(frame_lens, bandwidths, np.ma.masked_invalid(drops), levels=[DROP_FREE_PERCENT], **kwargs)
+
+
+def plot_measurement_surface(measurement_model, device_name, measurement, show_graph, output_dir):
+    configs = measurement_model.measurement_config_arrays(measurement)
+
+    if not len(configs):
+        sys.stderr.write('no data for {} @ {} - skipped\n'.format(device_name, measurement.name))
+        return
+
+    frame_lens, bandwidths, drops = drop_grid(configs)
+    green_red, norm = _build_cm(0, max(np.nanmax(drops), DROP_FREE_PERCENT))
+
+    plt = _pyplot()
+    fig = plt.figure(figsize=(15, 8))
+    ax = fig.add_subplot(111)
+
+    mesh = ax.pcolormesh(frame_lens, bandwidths, np.ma.masked_invalid(drops), cmap=green_red, norm=norm)
+    fig.colorbar(mesh, ax=ax, label='frames dropped / percent')
+    _drop_free_contour(ax, frame_lens, bandwidths, drops, colors='black', linewidths=2)
+
+    # measured configs
+    ax.scatter(configs['frame_len'], configs['bandwidth_upstream'] + configs['bandwidth_downstream'], s=4, c='black',
+               alpha=0.3)
+
+    ax.set_xlabel('frame len / bytes')
+    ax.set_ylabel('total bandwidth / Mbit/s')
+    plt.title('{} @ {} - drop free below the black line'.format(device_name, measurement.name))
+
+    if output_dir:
+        fig.savefig(os.path.join(output_dir, '{}---{}---surface.png'.format(device_name, measurement.name)), dpi=80)
+    if show_graph:
+        plt.show()
+
+    plt.close(fig)
+
+
+def plot_drop_free_overlay(measurement_model, device_names, measurement_name, show_graph, output_dir):
+    """
+    boundaries of the drop free regions of several devices in one chart
+    """
+    plt = _pyplot()
+    from matplotlib.lines import Line2D
+
+    fig = plt.figure(figsize=(15, 8))
+    ax = fig.add_subplot(111)
+
+    legend_lines, legend_labels = [], []
+    for idx, device_name in enumerate(device_names):
+        device = measurement_model.device_by_name(device_name)
+        try:
+            configs = measurement_model.measurement_config_arrays(
+                measurement_model.device_measurement_by_name(device, measurement_name))
+        except KeyError as _:
+            continue
+        if not len(configs):
+            continue
+
+        color = 'C{}'.format(idx % 10)
+        frame_lens, bandwidths, drops = drop_grid(configs)
+        _drop_free_contour(ax, frame_lens, bandwidths, drops, colors=color, linewidths=2)
+
+        # contour sets have no legend entry
+        legend_lines.append(Line2D([], [], color=color, linewidth=2))
+        legend_labels.append(device_name if np.nanmax(drops) > DROP_FREE_PERCENT else '{} (no drops)'.format(device_name))
+
+    ax.legend(legend_lines, legend_labels, loc='upper right')
+    ax.set_xlabel('frame len / bytes')
+    ax.set_ylabel('total bandwidth / Mbit/s')
+    plt.title('{} - drop free below the lines'.format(measurement_name))
+
+    if output_dir:
+        fig.savefig(os.path.join(output_dir, 'overlay---{}---surface.png'.format(measurement_name)), dpi=80)
+    if show_graph:
+        plt.show()
+
+    plt.close(fig)
+
+
+PLOT_TYPES = {
+    'drop': [plot_measurement],
+    'delay': [plot_measurement_delay],
+    'surface': [plot_measurement_surface],
+    'all': [plot_measurement, plot_measurement_delay, plot_measurement_surface]
+}
+
+
+def _plot_worker_init(db_file):
+    global _worker_mm
+
+    _headless()
+    _worker_mm = MeasurementModel(db_file, read_only=True)
+
+
+def _plot_worker(task):
+    device_name, measurement_name, plot_functions, output_dir = task
+
+    device = _worker_mm.device_by_name(device_name)
+    measurement = _worker_mm.device_measurement_by_name(device, measurement_name)
+
+    for plot_function in plot_functions:
+        plot_function(_worker_mm, device_name, measurement, False, output_dir)
+
+    return device_name, measurement_name, plot_functions
+
+
+def plot_batch(db_file, tasks, output_dir, jobs=None):
+    """
+    render the plots of the given measurements to output_dir by a pool of processes (headless, each worker
+    with its own read-only database connection)
+    :param tasks: list of (device name, measurement name, list of plot functions)
+    :param jobs: number of worker processes (default: number of cpus)
+    :return: iterator of the finished tasks
+    """
+    pool = multiprocessing.Pool(processes=jobs, initializer=_plot_worker_init, initargs=(db_file,))
+
+    try:
+        for task in pool.imap_unordered(_plot_worker, [task + (output_dir,) for task in tasks]):
+            yield task
+        pool.close()
+    except (Exception, KeyboardInterrupt, GeneratorExit):
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _manifest_key(device_name, measurement_name):
+    return '{}---{}'.format(device_name, measurement_name)
+
+
+def manifest_load(output_dir):
+    """
+    :return: dict '<device>---<measurement>' -> dict plot function name -> fingerprint of the rendered content
+             (empty if there is no readable manifest in output_dir)
+    """
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except (IOError, ValueError):
+        return {}
+
+
+def manifest_save(output_dir, manifest):
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE_NAME)
+
+    # replace at once - an interrupted write must not leave a truncated manifest
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.rename(manifest_path + '.tmp', manifest_path)
+
 
 if __name__ == '__main__':
 
@@ -121,12 +357,24 @@ if __name__ == '__main__':
                                         help='list available device under test names')
     mutual_exclusive_group.add_argument('-l', '--list-speed-pattern-sets', default=False, action='store_true',
                                         help='list available speed pattern sets')
-    mutual_exclusive_group.add_argument('-s', '--speed-pattern-set', default=None,
-                                        help='select speed pattern set to be plotted')
-    mutual_exclusive_group.add_argument('-o', '--write-graphs-to-dir',
-                                        help='if given, write generated graphs to given directory')
-    mutual_exclusive_group.add_argument('-g', '--show-graph', default=False, action='store_true',
-                                        help='show interactive window')
+    parser.add_argument('-s', '--speed-pattern-set', default=None,
+                        help='select speed pattern set to be plotted')
+    parser.add_argument('-o', '--write-graphs-to-dir',
+                        help='if given, write generated graphs to given directory')
+    parser.add_argument('-g', '--show-graph', default=False, action='store_true',
+                        help='show interactive window')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of processes rendering the graphs written by -o (default: number of cpus, '
+                             'graphs shown by -g are rendered one after another)')
+    parser.add_argument('-F', '--force', default=False, action='store_true',
+                        help='render all graphs written by -o (default: only those of measurements changed since '
+                             'the last run)')
+    parser.add_argument('-t', '--plot-type', default='drop', choices=sorted(PLOT_TYPES),
+                        help='mirror drops, mirror delay/jitter, interpolated drop heatmap with the drop free '
+                             'boundary or all of them (default: drop)')
+    parser.add_argument('-O', '--overlay', default=False, action='store_true',
+                        help='draw the drop free boundaries of all selected devices into one chart per speed '
+                             'pattern set instead of the per device graphs')
     parser.add_argument('-v', '--verbose', default=False, action='store_true', help='show extended information')
 
     args = parser.parse_args()
@@ -136,6 +384,11 @@ if __name__ == '__main__':
     selected_speed_pattern_set = args.speed_pattern_set
     output_dir = args.write_graphs_to_dir
     show_graph = args.show_graph
+    plot_functions = PLOT_TYPES[args.plot_type]
+
+    if args.jobs is not None and args.jobs < 1:
+        sys.stderr.write('number of jobs must be >= 1. Abort.\n')
+        sys.exit(1)
 
     if args.list_dut_names:
         mm = MeasurementModel(db_file)
@@ -155,13 +408,71 @@ if __name__ == '__main__':
         sys.stderr.write('invalid or unknown DUT name filte: \'{}\'. Abort.\n'.format(dut_name))
         sys.exit(1)
 
+    if args.overlay:
+        if not show_graph:
+            _headless()
+
+        if selected_speed_pattern_set:
+            measurement_names = [selected_speed_pattern_set]
+        else:
+            measurement_names = sorted(set(measurement.name for device_name in device_names
+                                           for measurement in mm.device_by_name(device_name).measurements))
+
+        for measurement_name in measurement_names:
+            plot_drop_free_overlay(mm, device_names, measurement_name, show_graph, output_dir)
+        sys.exit(0)
+
+    # graphs written to a dir are only rendered if the measurement changed since the last run
+    incremental = output_dir and not show_graph
+    fingerprints = mm.measurement_fingerprints()
+    manifest = manifest_load(output_dir) if incremental else {}
+
+    tasks = []
     for device_name in device_names:
 
         device = mm.device_by_name(device_name)
 
         if selected_speed_pattern_set:
-            measurement = mm.device_measurement_by_name(device, selected_speed_pattern_set)
-            plot_measurement(mm, device_name, measurement, show_graph, output_dir)
+            measurements = [mm.device_measurement_by_name(device, selected_speed_pattern_set)]
         else:
-            for measurement in device.measurements:
-                plot_measurement(mm, device_name, measurement, show_graph, output_dir)
+            measurements = device.measurements
+
+        for measurement in measurements:
+            fingerprint = fingerprints[(device_name, measurement.name)]
+            rendered = manifest.get(_manifest_key(device_name, measurement.name), {})
+
+            pending_functions = [plot_function for plot_function in plot_functions
+                                 if args.force or rendered.get(plot_function.__name__) != fingerprint]
+
+            if pending_functions:
+                tasks.append((device_name, measurement.name, pending_functions))
+            elif verbose:
+                print '{} @ {} - up to date'.format(device_name, measurement.name)
+
+    if not show_graph:
+        _headless()
+
+    if incremental:
+        # the workers open the database on their own
+        mm.close()
+
+        try:
+            for device_name, measurement_name, rendered_functions in plot_batch(db_file, tasks, output_dir,
+                                                                                args.jobs):
+                rendered = manifest.setdefault(_manifest_key(device_name, measurement_name), {})
+                for plot_function in rendered_functions:
+                    rendered[plot_function.__name__] = fingerprints[(device_name, measurement_name)]
+
+                if verbose:
+                    print '{} @ {}'.format(device_name, measurement_name)
+        finally:
+            # keep the progress of an interrupted run
+            manifest_save(output_dir, manifest)
+
+        sys.exit(0)
+
+    for device_name, measurement_name, pending_functions in tasks:
+        measurement = mm.device_measurement_by_name(mm.device_by_name(device_name), measurement_name)
+
+        for plot_function in pending_functions:
+            plot_function(mm, device_name, measurement, show_graph, output_dir)
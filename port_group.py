@@ -0,0 +1,76 @@
+'''
+port groups - independent sets of drone interfaces, each connected to its own device under test
+
+a group has one rx interface (connected to the mirror port) and the tx interfaces used by the speed patterns
+(first = sending to the second, all others sending to the first). groups tested in parallel must not share
+interfaces
+'''
+
+
+class PortGroup(object):
+    def __init__(self, dut_name, rx_interface, tx_interfaces, mirrored_interfaces):
+        """
+        :param dut_name: device under test connected to the group
+        :param rx_interface: nic connected to the mirror port
+        :param tx_interfaces: injector nics in speed pattern order
+        :param mirrored_interfaces: tx interfaces connected to the mirrored ports
+        """
+        if len(tx_interfaces) < 2:
+            raise ValueError('{}: at least two tx interfaces are needed'.format(dut_name))
+        if rx_interface in tx_interfaces:
+            raise ValueError('{}: rx interface {} used as tx interface'.format(dut_name, rx_interface))
+        if not set(mirrored_interfaces) <= set(tx_interfaces):
+            raise ValueError('{}: mirrored interfaces must be tx interfaces'.format(dut_name))
+
+        self.dut_name = dut_name
+        self.rx_interface = rx_interface
+        self.tx_interfaces = list(tx_interfaces)
+        self.mirrored_interfaces = list(mirrored_interfaces)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        :param config: group as given in interface_config.PORT_GROUPS
+        """
+        return cls(config['dut_name'], config['rx_interface'], config['tx_interfaces'],
+                   config['mirrored_interfaces'])
+
+    @property
+    def interface_names(self):
+        return [self.rx_interface] + self.tx_interfaces
+
+    def is_mirrored(self, interface_name):
+        return interface_name in self.mirrored_interfaces
+
+    def supports(self, speed_pattern):
+        """
+        :return: True if the group has enough tx interfaces for the given speed pattern
+        """
+        return len(speed_pattern) <= len(self.tx_interfaces)
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __str__(self):
+        return '{} (rx: {}, tx: {}, mirrored: {})'.format(self.dut_name, self.rx_interface,
+                                                         ', '.join(self.tx_interfaces),
+                                                         ', '.join(self.mirrored_interfaces))
+
+
+def port_groups_validate(port_groups):
+    """
+    groups run in parallel must use distinct interfaces and device names
+    :param port_groups: list of PortGroup
+    """
+    used_interfaces = {}
+
+    for port_group in port_groups:
+        for interface_name in port_group.interface_names:
+            if interface_name in used_interfaces:
+                raise ValueError('{} used by {} and {}'.format(interface_name, used_interfaces[interface_name],
+                                                               port_group.dut_name))
+            used_interfaces[interface_name] = port_group.dut_name
+
+    dut_names = [port_group.dut_name for port_group in port_groups]
+    if len(set(dut_names)) != len(dut_names):
+        raise ValueError('device under test names of the port groups must be unique')
@@ -0,0 +1,291 @@
+'''
+distributed execution - a work list of single speed pattern runs is dispatched to several drone hosts
+
+every device under test cabled to a host (one port group each) gets a worker which takes the next pending item of
+that device. failed items are retried (preferably on another host serving the device), a worker failing repeatedly
+is retired. the results are persisted by the run_item callable (e.g. through a MeasurementModelWriter into one
+database)
+'''
+
+import sys
+import threading
+
+from port_group import PortGroup, port_groups_validate
+
+# attempts per work item before it is given up
+MAX_ATTEMPTS = 3
+# consecutive failures before a host is retired - above MAX_ATTEMPTS, a single failing item doesn't retire a host
+MAX_HOST_FAILURES = 5
+
+
+class DroneHost(object):
+    def __init__(self, host_name, port_group):
+        """
+        a device under test cabled to a drone - a drone with several port groups is one DroneHost per group
+        :param host_name: of the drone
+        :param port_group: port_group.PortGroup the device under test is connected to
+        """
+        self.host_name = host_name
+        self.port_group = port_group
+
+    @property
+    def name(self):
+        return '{}/{}'.format(self.host_name, self.port_group.dut_name)
+
+    def serves(self, item):
+        """
+        :return: True if the item is run on the device of the host and the port group has enough tx interfaces
+        """
+        return item.dut_name == self.port_group.dut_name and self.port_group.supports(item.speed_pattern)
+
+    def __str__(self):
+        return '{} ({})'.format(self.host_name, self.port_group)
+
+
+def drone_hosts_from_config(configs):
+    """
+    :param configs: hosts as given in interface_config.DRONE_HOSTS
+    :return: list of DroneHost - one per port group of each host
+    :raise ValueError: if the port groups of a host share interfaces or devices under test
+    """
+    drone_hosts = []
+
+    for config in configs:
+        try:
+            port_groups = [PortGroup.from_config(group_config) for group_config in config['port_groups']]
+            port_groups_validate(port_groups)
+        except ValueError as e:
+            raise ValueError('{}: {}'.format(config['host_name'], e))
+
+        drone_hosts.extend(DroneHost(config['host_name'], port_group) for port_group in port_groups)
+
+    return drone_hosts
+
+
+class WorkItem(object):
+    def __init__(self, dut_name, speed_pattern_set_name, frame_len, speed_pattern, frame_profile=None):
+        """
+        a single speed pattern run
+        """
+        self.dut_name = dut_name
+        self.speed_pattern_set_name = speed_pattern_set_name
+        self.frame_len = frame_len
+        self.speed_pattern = speed_pattern
+        self.frame_profile = frame_profile
+        self.attempts = 0
+        # hosts the item failed on - avoided by the retries if possible
+        self.failed_hosts = set()
+
+    def __str__(self):
+        return '{}/{}/{}/{}'.format(self.dut_name, self.speed_pattern_set_name,
+                                    self.frame_profile.name if self.frame_profile else self.frame_len,
+                                    self.speed_pattern)
+
+
+class Scheduler(object):
+    def __init__(self, hosts, items, connect, run_item, max_attempts=MAX_ATTEMPTS,
+                 max_host_failures=MAX_HOST_FAILURES):
+        """
+        :param hosts: list of DroneHost - one worker each
+        :param items: list of WorkItem - dispatched in the given order
+        :param connect: callable(host) -> OstinatoInterface connected to the drone and port group of the host
+        :param run_item: callable(host, oi, item) - runs and persists the item, raises (or exits) on failure
+        """
+        self._hosts = hosts
+        self._connect = connect
+        self._run_item = run_item
+        self._max_attempts = max_attempts
+        self._max_host_failures = max_host_failures
+
+        self._condition = threading.Condition()
+        self._pending = list(items)
+        # host name -> item
+        self._in_flight = {}
+        self._active_hosts = set(host.name for host in hosts)
+        self._done = []
+        self._failed = []
+
+    def run(self):
+        """
+        dispatch all items and wait until they are done
+        :return: list of the items given up
+        """
+        workers = [threading.Thread(target=self._worker, args=(host,)) for host in self._hosts]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        for worker in workers:
+            # join with timeout - keeps the main thread responsive to ctrl-c
+            while worker.is_alive():
+                worker.join(1)
+
+        # items of devices no active host serves anymore
+        self._failed.extend(self._pending)
+        self._pending = []
+
+        return self._failed
+
+    def status(self):
+        with self._condition:
+            return 'done: {}, in flight: {}, pending: {}, failed: {}'.format(
+                len(self._done), len(self._in_flight), len(self._pending), len(self._failed))
+
+    def _servable(self, item, excluded_hosts=()):
+        return any(host.name in self._active_hosts and host.name not in excluded_hosts and host.serves(item)
+                   for host in self._hosts)
+
+    def _next_item(self, host):
+        """
+        wait for the next pending item the host serves
+        :return: the item, None if the host has nothing left to do
+        """
+        with self._condition:
+            while True:
+                for idx, item in enumerate(self._pending):
+                    if not host.serves(item):
+                        continue
+                    # leave a retry to the other hosts
+                    if host.name in item.failed_hosts and self._servable(item, item.failed_hosts):
+                        continue
+
+                    self._in_flight[host.name] = item
+                    return self._pending.pop(idx)
+
+                # items in flight on other hosts may still come back for a retry
+                if not any(host.serves(item) for item in self._in_flight.values()):
+                    return None
+
+                self._condition.wait(1)
+
+    def _item_finished(self, host, item, error=None):
+        with self._condition:
+            del self._in_flight[host.name]
+
+            if error is None:
+                self._done.append(item)
+            else:
+                item.failed_hosts.add(host.name)
+
+                if item.attempts < self._max_attempts and self._servable(item):
+                    sys.stderr.write('{}: {} failed ({!r}) - retry\n'.format(host.name, item, error))
+                    self._pending.insert(0, item)
+                else:
+                    sys.stderr.write('{}: {} failed ({!r}) - given up\n'.format(host.name, item, error))
+                    self._failed.append(item)
+
+            self._condition.notify_all()
+
+    def _host_retire(self, host):
+        with self._condition:
+            self._active_hosts.discard(host.name)
+
+            orphaned = [item for item in self._pending if not self._servable(item)]
+            for item in orphaned:
+                sys.stderr.write('{}: no host left for {} - given up\n'.format(host.name, item))
+                self._pending.remove(item)
+            self._failed.extend(orphaned)
+
+            self._condition.notify_all()
+
+    def _worker(self, host):
+        oi = None
+        failures = 0
+
+        while failures < self._max_host_failures:
+            item = self._next_item(host)
+            if item is None:
+                break
+
+            item.attempts += 1
+            try:
+                if oi is None:
+                    oi = self._connect(host)
+                self._run_item(host, oi, item)
+            except (Exception, SystemExit) as e:
+                # a failed run exits - start over with a fresh connection
+                failures += 1
+                if oi is not None:
+                    try:
+                        oi.disconnect()
+                    except Exception:
+                        pass
+                    oi = None
+                self._item_finished(host, item, e)
+                continue
+
+            failures = 0
+            self._item_finished(host, item)
+
+        if failures >= self._max_host_failures:
+            sys.stderr.write('{}: failed {} times in a row - retired\n'.format(host.name, failures))
+            self._host_retire(host)
+
+        if oi is not None:
+            oi.disconnect()
+
+
+class _FakeInterface(object):
+    def disconnect(self):
+        pass
+
+
+def dispatch_check(items_per_device=8):
+    """
+    deterministic check of the dispatching with fake hosts: host 'bad' fails every item, 'good' serves dut-a
+    together with it and dut-b alone, dut-c is served by 'bad' only
+    :return: True if every item was done or given up exactly once and the retries left the failing host
+    """
+    good_a = DroneHost('good', PortGroup('dut-a', 'rx0', ['tx0', 'tx1'], []))
+    good_b = DroneHost('good', PortGroup('dut-b', 'rx1', ['tx2', 'tx3'], []))
+    bad_a = DroneHost('bad', PortGroup('dut-a', 'rx0', ['tx0', 'tx1'], []))
+    bad_c = DroneHost('bad', PortGroup('dut-c', 'rx1', ['tx2', 'tx3'], []))
+
+    items = [WorkItem(dut_name, 'check', 64, [10, idx])
+             for dut_name in ('dut-a', 'dut-b', 'dut-c') for idx in range(items_per_device)]
+    # (host name, item) of every attempt in the order they were run
+    runs = []
+    bad_a_failed = threading.Event()
+    # good_a is held until bad_a failed a dut-a item - set if bad_a never got one
+    good_a_starved = []
+
+    def _run_item(host, oi, item):
+        runs.append((host.name, item))
+
+        if host.host_name == 'bad':
+            if host is bad_a:
+                bad_a_failed.set()
+            # a failed run exits (see OstinatoInterface._interface_stats_create)
+            sys.exit(1)
+
+        # good_a holds its first item until bad_a failed one - bad_a always finds a pending dut-a item meanwhile
+        if host is good_a and not bad_a_failed.wait(60):
+            good_a_starved.append(item)
+
+    scheduler = Scheduler([good_a, good_b, bad_a, bad_c], items, lambda host: _FakeInterface(), _run_item)
+    failed = scheduler.run()
+    done = scheduler._done
+
+    dut_a_failures = [item for host_name, item in runs if host_name == bad_a.name]
+    checks = [
+        ('nothing pending or in flight', not scheduler._pending and not scheduler._in_flight),
+        ('every item done or given up once', sorted(map(id, done + failed)) == sorted(map(id, items))),
+        ('dut-a and dut-b done', sorted(item.dut_name for item in done) ==
+         ['dut-a'] * items_per_device + ['dut-b'] * items_per_device),
+        ('dut-c given up', [item.dut_name for item in failed] == ['dut-c'] * items_per_device),
+        ('the failing host took dut-a items', bool(dut_a_failures) and not good_a_starved),
+        ('their retries moved to the good host', all(
+            [host_name for host_name, run_item in runs if run_item is item] == [bad_a.name, good_a.name]
+            for item in dut_a_failures)),
+    ]
+
+    for description, passed in checks:
+        print '{:<40} {}'.format(description, 'ok' if passed else 'FAILED')
+
+    return all(passed for _, passed in checks)
+
+
+if __name__ == '__main__':
+    if not dispatch_check():
+        sys.stderr.write('scheduler dispatch check failed. Abort.\n')
+        sys.exit(1)
@@ -3,104 +3,424 @@ from ostinato_interface import *
 import argparse
 from interface_config import *
 from traffic_config import *
+from frame_profile import FrameProfile, FRAME_PROFILE_IMIX
+from burst_pattern import BurstPattern
+from port_group import PortGroup, port_groups_validate
+from scheduler import WorkItem, Scheduler, drone_hosts_from_config
+import threading
 
+# the single port group described by RX_INTERFACE, TX_INTERFACES and MIRORRED_INTERFACES
+DEFAULT_PORT_GROUP = PortGroup(None, RX_INTERFACE, TX_INTERFACES, MIRORRED_INTERFACES)
 
-def persist_stats(db_file, device_name, speed_pattern_set_name, duration, frame_len, stats):
-    mm = MeasurementModel(db_file, drop_database=False)
 
-    try:
-        device = mm.device_by_name(device_name)
-    except KeyError as _:
-        device = Device(name=device_name)
-        mm.insert(device)
-
-    try:
-        measurement = mm.device_measurement_by_name(device, speed_pattern_set_name)
-    except KeyError as _:
-        measurement = Measurement(device_id=device.id,
-                                  name=speed_pattern_set_name,
-                                  duration=duration)
-        mm.insert(measurement)
-
-    measurement_config = MeasurementConfig(measurement_id=measurement.id, frame_len=frame_len)
-    mm.insert(measurement_config)
+def persist_stats(mm, device_name, speed_pattern_set_name, duration, frame_len, stats, samples=None, losses=None,
+                  rate_mode=None, frame_profile=None, burst_pattern=None):
+    device = mm.device_get_or_add(device_name)
+    measurement = mm.device_measurement_get_or_add(device, speed_pattern_set_name, duration)
+    measurement_config = mm.measurement_config_add(measurement, frame_len, stats, samples, losses, rate_mode,
+                                                   LINK_SPEED_MBIT, frame_profile, burst_pattern)
 
-    for stat in stats:
+    bandwidth_upstream = measurement_config.bandwidth_upstream
+    bandwidth_downstream = measurement_config.bandwidth_downstream
 
-        if stat.is_mirror_port:
-
-            stat_entry = MirrorStat(measurement_config_id=measurement_config.id,
-                                    port_name=stat.interface_name,
-                                    rx_frames=stat.rx_frames,
-                                    rx_bytes=stat.rx_bytes)
-        else:
-
-            stat_entry = InjectorStat(measurement_config_id=measurement_config.id,
-                                      port_name=stat.interface_name,
-                                      is_mirrored_port=stat.is_mirrored_port,
-                                      rx_frames=stat.rx_frames,
-                                      rx_bytes=stat.rx_bytes,
-                                      tx_frames=stat.tx_frames,
-                                      tx_bytes=stat.tx_bytes,
-                                      tx_speed_mbit=stat.speed_mbit,
-                                      )
-        mm.insert(stat_entry)
-    bandwidth_upstream = mm.bandwidth_total_upstream(measurement_config)
-    bandwidth_downstream = mm.bandwidth_total_downstream(measurement_config)
-
-    measurement_config.bandwidth_upstream = bandwidth_upstream
-    measurement_config.bandwidth_downstream = bandwidth_downstream
-    mm.commit()
-
-    mirror_drop_frames, mirror_drop_percent = mm.mirror_dropped(measurement_config)
-
-    upstream_frames_dropped_total, upstream_frames_dropped_percent, \
-    downstream_frames_dropped_total, downstream_frames_dropped_percent = mm. upstream_downstream_dropped(
-        measurement_config)
-
-    print 'device: {:<10}, set_name: {:<10}, frame_len: {:<4}, ' \
-          'speed_up: {:<3}, speed_down: {:<3}, speed_tot: {:<3}, ' \
+    print 'device: {:<10}, set_name: {:<10}, frame_len: {:<4}, frame_profile: {}, burst_pattern: {}, ' \
+          'speed_up: {:<3}, speed_down: {:<3}, speed_tot: {:<3}, wire_util_percent: {:<5.1f}, ' \
           'mirror_drop: {:<8}, mirror_drop_percent: {:<3.3}, ' \
           'upstream_drop: {:<8}, upstream_drop_percent: {:<3.3}, ' \
           'downstream_drop: {:<8} downstream_drop_percent: {:<3.3}'.format(
         device_name,
         speed_pattern_set_name,
         frame_len,
+        measurement_config.frame_profile,
+        measurement_config.burst_pattern,
         bandwidth_upstream,
         bandwidth_downstream,
         bandwidth_upstream + bandwidth_downstream,
-        mirror_drop_frames,
-        mirror_drop_percent,
-        upstream_frames_dropped_total,
-        upstream_frames_dropped_percent,
-        downstream_frames_dropped_total,
-        downstream_frames_dropped_percent
+        measurement_config.wire_utilization_percent,
+        measurement_config.mirror_dropped_total,
+        measurement_config.mirror_dropped_percent,
+        measurement_config.upstream_dropped_total,
+        measurement_config.upstream_dropped_percent,
+        measurement_config.downstream_dropped_total,
+        measurement_config.downstream_dropped_percent
     )
 
+    return mm.measurement_config_stats(measurement_config)[0]
+
+
+def build_port_configs(speed_pattern, frame_len, frame_profile=None, burst_pattern=None, port_group=None):
+    port_group = port_group or DEFAULT_PORT_GROUP
+    tx_interfaces = port_group.tx_interfaces
+    port_configs = []
 
-def build_setup(oi, speed_pattern, frame_len):
     for idx, speed_mbit in enumerate(speed_pattern):
 
         if idx == 0:
-            interface_name = TX_INTERFACES[0]
+            interface_name = tx_interfaces[0]
             port_config = TXPortConfig(interface_name,
-                                       is_mirrored(interface_name),
+                                       port_group.is_mirrored(interface_name),
                                        INTERFACE_MACS[interface_name],
-                                       INTERFACE_MACS[TX_INTERFACES[1]],
-                                       frame_len, speed_mbit)
+                                       INTERFACE_MACS[tx_interfaces[1]],
+                                       frame_len, speed_mbit, frame_profile, burst_pattern)
         else:
-            interface_name = TX_INTERFACES[idx]
+            interface_name = tx_interfaces[idx]
             port_config = TXPortConfig(interface_name,
-                                       is_mirrored(interface_name),
+                                       port_group.is_mirrored(interface_name),
                                        INTERFACE_MACS[interface_name],
-                                       INTERFACE_MACS[TX_INTERFACES[0]],
-                                       frame_len, speed_mbit)
+                                       INTERFACE_MACS[tx_interfaces[0]],
+                                       frame_len, speed_mbit, frame_profile, burst_pattern)
+
+        port_configs.append(port_config)
+
+    return port_configs
+
+
+def build_setup(oi, speed_pattern, frame_len, frame_profile=None, burst_pattern=None, port_group=None):
+    oi.reconfigure(build_port_configs(speed_pattern, frame_len, frame_profile, burst_pattern, port_group))
+
+
+def frame_setups(frame_profiles=None):
+    """
+    frame len and frame profile of each run - the fixed FRAME_SIZES if no frame profiles are given,
+    the (rounded) average frame len of each profile otherwise
+    :param frame_profiles: optional list of FrameProfile
+    :return: list of (frame_len, FrameProfile or None)
+    """
+    if not frame_profiles:
+        return [(frame_len, None) for frame_len in FRAME_SIZES]
+
+    return [(int(round(frame_profile.average_frame_len)), frame_profile) for frame_profile in frame_profiles]
+
+
+def measurement_config_key(speed_pattern_set_name, frame_len, speed_pattern, frame_profile=None, burst_pattern=None,
+                           port_group=None):
+    """
+    key of a speed pattern run as returned by MeasurementModel.measurement_config_keys
+    """
+    tx_interfaces = (port_group or DEFAULT_PORT_GROUP).tx_interfaces
+
+    return speed_pattern_set_name, frame_len, frame_profile.name if frame_profile else None, \
+           burst_pattern.name if burst_pattern else None, tuple(sorted(zip(tx_interfaces, speed_pattern)))
+
+
+def measure(mm, oi, dut_name, speed_pattern_set_name, frame_len, speed_pattern, verbose=False, frame_profile=None,
+            burst_pattern=None, port_group=None):
+    """
+    run warmup and measurement for a single speed pattern and persist the result
+    :param mm: MeasurementModel or MeasurementModelWriter
+    :return: MeasurementConfigStats of the persisted measurement config
+    """
+    build_setup(oi, speed_pattern, frame_len, frame_profile, burst_pattern, port_group)
+
+    oi.run(duration=TIME_WARUMP, warmup=True)
+    oi.settle(1)
+    oi.run(duration=TIME_MEASURE)
+
+    if verbose:
+        for rx_tx_stat in oi.interface_statistics():
+            print '\t\t\t{}'.format(rx_tx_stat)
+        for stream_loss in oi.interface_losses():
+            print '\t\t\t{:<7}, {}'.format(stream_loss.interface_name, stream_loss)
+
+    return mm.call(persist_stats, dut_name, speed_pattern_set_name, TIME_MEASURE, frame_len,
+                   oi.interface_statistics(), oi.interface_samples(), oi.interface_losses(), oi.rate_mode,
+                   frame_profile, burst_pattern)
+
+
+def speed_pattern_scaled(speed_patterns, scale):
+    """
+    interpolate between the first (scale 0.0) and the last (scale 1.0) pattern of a speed pattern set
+    """
+    first, last = speed_patterns[0], speed_patterns[-1]
+
+    return [int(round(low + scale * (high - low))) for low, high in zip(first, last)]
+
+
+def search_drop_threshold(mm, oi, dut_name, speed_pattern_set_name, frame_len, tolerance, verbose=False,
+                          frame_profile=None, burst_pattern=None, port_group=None):
+    """
+    bisect the scale between first and last pattern of the set to find the highest total bandwidth
+    without mirror drops - every probe is persisted like a regular measurement
+    (drops are expected to be monotonic in the total bandwidth)
+    :param tolerance: stop if the total bandwidth of the lower and upper bound differs less than tolerance
+    :return: highest speed pattern without mirror drops or None if the first pattern already drops
+    """
+    speed_patterns = SPEED_PATTERN_SETS[speed_pattern_set_name]
+
+    def _drop_free(speed_pattern):
+        if verbose:
+            print '\t\t{}'.format(speed_pattern)
+
+        measurement_config_stats = measure(mm, oi, dut_name, speed_pattern_set_name, frame_len, speed_pattern,
+                                           verbose, frame_profile, burst_pattern, port_group)
+        return measurement_config_stats.mirror_dropped_total == 0
+
+    low, high = 0., 1.
+    low_pattern, high_pattern = speed_pattern_scaled(speed_patterns, low), speed_pattern_scaled(speed_patterns, high)
+
+    if _drop_free(high_pattern):
+        return high_pattern
+    if not _drop_free(low_pattern):
+        return None
+
+    while sum(high_pattern) - sum(low_pattern) > tolerance:
+        scale = (low + high) / 2
+        speed_pattern = speed_pattern_scaled(speed_patterns, scale)
+
+        if speed_pattern in (low_pattern, high_pattern):
+            break
+
+        if _drop_free(speed_pattern):
+            low, low_pattern = scale, speed_pattern
+        else:
+            high, high_pattern = scale, speed_pattern
+
+    return low_pattern
+
+
+def search_speed_pattern_sets(mm, oi, dut_name, active_speed_pattern_sets, tolerance, verbose=False,
+                              frame_profiles=None, burst_pattern=None, port_group=None):
+
+    for speed_pattern_set_name in active_speed_pattern_sets:
+
+        if verbose:
+            print '{}'.format(speed_pattern_set_name)
+
+        for frame_len, frame_profile in frame_setups(frame_profiles):
+            if verbose:
+                print '\t{}'.format(frame_profile or frame_len)
+
+            speed_pattern = search_drop_threshold(mm, oi, dut_name, speed_pattern_set_name, frame_len, tolerance,
+                                                  verbose, frame_profile, burst_pattern, port_group)
+
+            print 'device: {:<10}, set_name: {:<10}, frame_len: {:<4}, drop_free_pattern: {}, speed_tot: {}'.format(
+                dut_name,
+                speed_pattern_set_name,
+                frame_len,
+                speed_pattern,
+                sum(speed_pattern) if speed_pattern else None
+            )
+
+
+def ramp_speed_pattern_sets(mm, oi, dut_name, active_speed_pattern_sets, verbose=False, frame_profiles=None,
+                            burst_pattern=None, port_group=None):
+    """
+    run all patterns of a set as one continuous staircase transmission per frame size
+    """
+
+    for speed_pattern_set_name in active_speed_pattern_sets:
+
+        if verbose:
+            print '{}'.format(speed_pattern_set_name)
+
+        speed_patterns = SPEED_PATTERN_SETS[speed_pattern_set_name]
 
-        oi.tx_port_config_add(port_config)
+        for frame_len, frame_profile in frame_setups(frame_profiles):
+            if verbose:
+                print '\t{}'.format(frame_profile or frame_len)
+
+            # warmup - let the switch learn the ports
+            build_setup(oi, speed_patterns[0], frame_len, frame_profile, burst_pattern, port_group)
+            oi.run(duration=TIME_WARUMP, warmup=True)
+            oi.settle(1)
+
+            steps = [build_port_configs(speed_pattern, frame_len, frame_profile, burst_pattern, port_group)
+                     for speed_pattern in speed_patterns]
+
+            for speed_pattern, step_statistics in zip(speed_patterns, oi.ramp_run(steps, TIME_MEASURE)):
+                if verbose:
+                    print '\t\t{}'.format(speed_pattern)
+                    for rx_tx_stat in step_statistics:
+                        print '\t\t\t{}'.format(rx_tx_stat)
+
+                mm.call(persist_stats, dut_name, speed_pattern_set_name, TIME_MEASURE, frame_len, step_statistics,
+                        rate_mode=oi.rate_mode, frame_profile=frame_profile, burst_pattern=burst_pattern)
+
+
+def run_speed_pattern_sets(mm, oi, dut_name, active_speed_pattern_sets, verbose=False, resume=False,
+                           frame_profiles=None, burst_pattern=None, port_group=None):
+
+    measured = mm.call(MeasurementModel.measurement_config_keys, dut_name, oi.rate_mode) if resume else set()
+
+    for speed_pattern_set_name in active_speed_pattern_sets:
+
+        if verbose:
+            print '{}'.format(speed_pattern_set_name)
+
+        for frame_len, frame_profile in frame_setups(frame_profiles):
+            if verbose:
+                print '\t{}'.format(frame_profile or frame_len)
+
+            for speed_pattern in SPEED_PATTERN_SETS[speed_pattern_set_name]:
+                if verbose:
+                    print '\t\t{}'.format(speed_pattern)
+
+                if measurement_config_key(speed_pattern_set_name, frame_len, speed_pattern, frame_profile,
+                                          burst_pattern, port_group) in measured:
+                    if verbose:
+                        print '\t\t\talready measured - skipped'
+                    continue
+
+                measure(mm, oi, dut_name, speed_pattern_set_name, frame_len, speed_pattern, verbose, frame_profile,
+                        burst_pattern, port_group)
+
+
+def drone_build(args, port_group):
+    """
+    drone stand-in selected on the command line for the given port group (None - connect to the drone)
+    :return: drone, poll interval
+    """
+    # the stand-ins are imported on demand - numpy/ctypes aren't needed to talk to a drone
+    if args.simulate:
+        from drone_simulator import SwitchModel, SimulatedDroneProxy
+
+        switch_model = SwitchModel(sorted(port_group.interface_names), port_group.rx_interface,
+                                   port_group.mirrored_interfaces, link_speed_mbit=LINK_SPEED_MBIT,
+                                   **SIMULATED_SWITCH)
+        # ramp and sampling need the counters to follow the wall clock
+        drone = SimulatedDroneProxy(switch_model, realtime=args.ramp or bool(args.sample_interval))
+        return drone, args.poll_interval or 0.001
+
+    if args.af_packet:
+        from packet_engine import PacketDroneProxy
+
+        return PacketDroneProxy(sorted(port_group.interface_names)), args.poll_interval
 
+    return None, args.poll_interval
 
-def is_mirrored(interface_name):
-    return interface_name in MIRORRED_INTERFACES
+
+def interface_build(args, port_group, host_name='127.0.0.1'):
+    """
+    :param host_name: of the drone - ignored if a drone stand-in is selected
+    :return: OstinatoInterface connected to the drone (or stand-in) of the given port group
+    """
+    drone, poll_interval = drone_build(args, port_group)
+
+    return OstinatoInterface(host_name=host_name, rx_interface=port_group.rx_interface,
+                             poll_interval=poll_interval, quiet_window=args.quiet_window,
+                             sample_interval=args.sample_interval, capture_analysis=args.capture_analysis,
+                             rate_mode=args.rate_mode, drone=drone)
+
+
+def sweep(mm, dut_name, port_group, active_speed_pattern_sets, args, frame_profiles, burst_pattern):
+    """
+    run the selected mode (threshold search, ramp or all patterns) on the given port group
+    :param mm: MeasurementModel or MeasurementModelWriter
+    """
+    oi = interface_build(args, port_group)
+
+    try:
+        if args.search_threshold:
+            search_speed_pattern_sets(mm, oi, dut_name, active_speed_pattern_sets, args.search_tolerance,
+                                      args.verbose, frame_profiles, burst_pattern, port_group)
+        elif args.ramp:
+            ramp_speed_pattern_sets(mm, oi, dut_name, active_speed_pattern_sets, args.verbose, frame_profiles,
+                                    burst_pattern, port_group)
+        else:
+            run_speed_pattern_sets(mm, oi, dut_name, active_speed_pattern_sets, args.verbose, args.resume,
+                                   frame_profiles, burst_pattern, port_group)
+    finally:
+        oi.disconnect()
+
+
+def sweep_port_groups(db_file, port_groups, active_speed_pattern_sets, args, frame_profiles, burst_pattern):
+    """
+    sweep all port groups in parallel - one worker thread per group, the results of all workers are written
+    by a single database writer
+    :return: list of the port groups that failed
+    """
+    failed = []
+
+    def _worker(port_group):
+        supported_speed_pattern_sets = {}
+        for speed_pattern_set_name, speed_patterns in active_speed_pattern_sets.items():
+            if all(port_group.supports(speed_pattern) for speed_pattern in speed_patterns):
+                supported_speed_pattern_sets[speed_pattern_set_name] = speed_patterns
+            else:
+                sys.stderr.write('{}: not enough tx interfaces for \'{}\' - skipped\n'.format(
+                    port_group.dut_name, speed_pattern_set_name))
+
+        try:
+            sweep(writer, port_group.dut_name, port_group, supported_speed_pattern_sets, args, frame_profiles,
+                  burst_pattern)
+        except (Exception, SystemExit) as e:
+            # a failed run exits - only the group is lost
+            sys.stderr.write('{}: failed ({!r})\n'.format(port_group.dut_name, e))
+            failed.append(port_group)
+
+    with MeasurementModelWriter(db_file, commit_interval=args.commit_interval) as writer:
+        workers = [threading.Thread(target=_worker, args=(port_group,)) for port_group in port_groups]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    return failed
+
+
+def work_items(dut_name, port_groups, active_speed_pattern_sets, frame_profiles=None, burst_pattern=None,
+               measured=None):
+    """
+    all speed pattern runs of a device as single work items
+    :param port_groups: port groups of the device on the drone hosts - sets none of them supports are skipped
+    :param measured: keys of the runs to be skipped (see measurement_config_key)
+    :return: list of WorkItem
+    """
+    measured = measured or set()
+    items = []
+
+    for speed_pattern_set_name in active_speed_pattern_sets:
+        speed_patterns = SPEED_PATTERN_SETS[speed_pattern_set_name]
+        supporting_port_groups = [port_group for port_group in port_groups
+                                  if all(port_group.supports(speed_pattern) for speed_pattern in speed_patterns)]
+        if not supporting_port_groups:
+            sys.stderr.write('{}: not enough tx interfaces for \'{}\' - skipped\n'.format(
+                dut_name, speed_pattern_set_name))
+            continue
+
+        for frame_len, frame_profile in frame_setups(frame_profiles):
+            for speed_pattern in speed_patterns:
+                if not any(measurement_config_key(speed_pattern_set_name, frame_len, speed_pattern, frame_profile,
+                                                  burst_pattern, port_group) in measured
+                           for port_group in supporting_port_groups):
+                    items.append(WorkItem(dut_name, speed_pattern_set_name, frame_len, speed_pattern,
+                                          frame_profile))
+
+    return items
+
+
+def distribute(db_file, drone_hosts, active_speed_pattern_sets, args, frame_profiles, burst_pattern):
+    """
+    run all patterns of the devices connected to the drone hosts - the hosts share one work list,
+    the results are written by a single database writer
+    :param drone_hosts: list of DroneHost - one per port group of each host
+    :return: list of the work items given up
+    """
+    dut_names = sorted(set(drone_host.port_group.dut_name for drone_host in drone_hosts))
+
+    def _connect(drone_host):
+        return interface_build(args, drone_host.port_group, drone_host.host_name)
+
+    def _run_item(drone_host, oi, item):
+        measure(writer, oi, item.dut_name, item.speed_pattern_set_name, item.frame_len, item.speed_pattern,
+                args.verbose, item.frame_profile, burst_pattern, drone_host.port_group)
+
+    with MeasurementModelWriter(db_file, commit_interval=args.commit_interval) as writer:
+        items = []
+        for dut_name in dut_names:
+            port_groups = [drone_host.port_group for drone_host in drone_hosts
+                           if drone_host.port_group.dut_name == dut_name]
+            measured = writer.call(MeasurementModel.measurement_config_keys, dut_name, args.rate_mode) \
+                if args.resume else None
+            items.extend(work_items(dut_name, port_groups, active_speed_pattern_sets, frame_profiles, burst_pattern,
+                                    measured))
+
+        scheduler = Scheduler(drone_hosts, items, _connect, _run_item)
+        failed = scheduler.run()
+
+        print scheduler.status()
+
+    return failed
 
 
 if __name__ == '__main__':
@@ -113,6 +433,51 @@ if __name__ == '__main__':
                                         help='list available speed pattern sets')
     parser.add_argument('-s', '--speed-pattern-set', default=None,
                         help='select speed pattern set to be run (default: run all)')
+    parser.add_argument('-c', '--commit-interval', type=int, default=1,
+                        help='number of measurements collected before writing to the database (default: 1)')
+    parser.add_argument('-p', '--poll-interval', type=float, default=None,
+                        help='poll port stats every POLL_INTERVAL seconds to detect the end of a run '
+                             'instead of fixed sleeps (e.g. 0.05)')
+    parser.add_argument('-q', '--quiet-window', type=float, default=0.1,
+                        help='time in seconds the rx counters must not change to finish a run (default: 0.1)')
+    parser.add_argument('-i', '--sample-interval', type=float, default=None,
+                        help='sample the port counters every SAMPLE_INTERVAL seconds during a run and store '
+                             'the time series (e.g. 0.1)')
+    parser.add_argument('-C', '--capture-analysis', default=False, action='store_true',
+                        help='analyse the capture of the mirror port - store loss bursts, reordering and the '
+                             'mirror delay/jitter (against the capture of the destination ports) per injector '
+                             'port (the sequence numbers need Ostinato >= 0.9 on the drone)')
+    parser.add_argument('-m', '--rate-mode', default=RATE_MODE_L2, choices=RATE_MODES,
+                        help='l2: speeds cover the frames only, l1: speeds include preamble and inter frame gap '
+                             '(on the wire rate) (default: l2)')
+    parser.add_argument('-P', '--frame-profile', action='append', default=[], choices=sorted(FRAME_PROFILES),
+                        help='run the given mixed frame size profile instead of the fixed frame sizes '
+                             '(can be given multiple times)')
+    parser.add_argument('-B', '--burst-pattern', default=None, choices=sorted(BURST_PATTERNS),
+                        help='send the frames in bursts (phase aligned cycles or fixed burst sizes) instead of '
+                             'constant rates')
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument('-a', '--search-threshold', default=False, action='store_true',
+                            help='search the highest drop free bandwidth per speed pattern set and frame size '
+                                 'instead of running all patterns')
+    mode_group.add_argument('-R', '--ramp', default=False, action='store_true',
+                            help='run all patterns of a set as one continuous staircase per frame size')
+    engine_group = parser.add_mutually_exclusive_group()
+    engine_group.add_argument('-S', '--simulate', default=False, action='store_true',
+                              help='run against a simulated drone and switch (see SIMULATED_SWITCH in '
+                                   'interface_config) instead of a real drone')
+    engine_group.add_argument('-A', '--af-packet', default=False, action='store_true',
+                              help='send/count the frames in process via AF_PACKET sockets instead of a drone '
+                                   '(plain nics or veth pairs, needs CAP_NET_RAW)')
+    parser.add_argument('-t', '--search-tolerance', type=int, default=2,
+                        help='stop the search if the total bandwidth is known within TOLERANCE Mbit/s (default: 2)')
+    parser.add_argument('-r', '--resume', default=False, action='store_true',
+                        help='skip speed patterns already stored for the device under test')
+    parser.add_argument('-G', '--port-groups', default=False, action='store_true',
+                        help='test the devices of all PORT_GROUPS in interface_config in parallel (-d is ignored)')
+    parser.add_argument('-D', '--distribute', default=False, action='store_true',
+                        help='run all patterns of the devices of DRONE_HOSTS in interface_config, dispatched to '
+                             'all drone hosts with retries of failed runs (-d is ignored)')
     parser.add_argument('-v', '--verbose', default=False, action='store_true', help='show extended information')
 
     args = parser.parse_args()
@@ -137,30 +502,43 @@ if __name__ == '__main__':
     else:
         active_speed_pattern_sets = SPEED_PATTERN_SETS
 
-    for speed_pattern_set_name in active_speed_pattern_sets:
+    frame_profiles = [FrameProfile.from_config(name, FRAME_PROFILES[name]) for name in args.frame_profile]
+    burst_pattern = BurstPattern.from_config(args.burst_pattern, BURST_PATTERNS[args.burst_pattern]) \
+        if args.burst_pattern else None
 
-        if verbose:
-            print '{}'.format(speed_pattern_set_name)
+    if args.ramp and any(frame_profile.mode == FRAME_PROFILE_IMIX for frame_profile in frame_profiles):
+        sys.stderr.write('imix frame profiles can\'t be run as ramp. Abort.\n')
+        sys.exit(1)
 
-        for frame_len in FRAME_SIZES:
-            if verbose:
-                print '\t{}'.format(frame_len)
+    if args.ramp and (args.resume or args.sample_interval):
+        sys.stderr.write('a ramp is stored as one staircase per set and samples its steps itself - can\'t be '
+                         'combined with -r or -i. Abort.\n')
+        sys.exit(1)
 
-            for speed_pattern in SPEED_PATTERN_SETS[speed_pattern_set_name]:
-                if verbose:
-                    print '\t\t{}'.format(speed_pattern)
-
-                oi = OstinatoInterface(rx_interface=RX_INTERFACE)
+    if args.distribute and (args.search_threshold or args.ramp or args.port_groups):
+        sys.stderr.write('distributed execution runs single patterns only - can\'t be combined with -a, -R or -G. '
+                         'Abort.\n')
+        sys.exit(1)
 
-                build_setup(oi, speed_pattern, frame_len)
-
-                oi.run(duration=TIME_WARUMP)
-                time.sleep(1)
-                oi.run(duration=TIME_MEASURE)
+    if args.distribute:
+        try:
+            drone_hosts = drone_hosts_from_config(DRONE_HOSTS)
+        except ValueError as e:
+            sys.stderr.write('invalid drone hosts: {}. Abort.\n'.format(e))
+            sys.exit(1)
 
-                if verbose:
-                    for rx_tx_stat in oi.interface_statistics():
-                        print '\t\t\t{}'.format(rx_tx_stat)
+        if distribute(db_file, drone_hosts, active_speed_pattern_sets, args, frame_profiles, burst_pattern):
+            sys.exit(1)
+    elif args.port_groups:
+        try:
+            port_groups = [PortGroup.from_config(config) for config in PORT_GROUPS]
+            port_groups_validate(port_groups)
+        except ValueError as e:
+            sys.stderr.write('invalid port groups: {}. Abort.\n'.format(e))
+            sys.exit(1)
 
-                persist_stats(db_file, dut_name, speed_pattern_set_name, TIME_MEASURE, frame_len,
-                              oi.interface_statistics())
+        if sweep_port_groups(db_file, port_groups, active_speed_pattern_sets, args, frame_profiles, burst_pattern):
+            sys.exit(1)
+    else:
+        with MeasurementModel(db_file, drop_database=False, commit_interval=args.commit_interval) as mm:
+            sweep(mm, dut_name, DEFAULT_PORT_GROUP, active_speed_pattern_sets, args, frame_profiles, burst_pattern)
@@ -133,5 +133,36 @@ SPEED_PATTERN_SETS = {
 
 FRAME_SIZES = [64, 128, 130, 256, 512, 1024, 1500]
 
+'''
+frame profiles - selected instead of FRAME_SIZES (see frame_profile.py)
+imix      - 'frame_lens': frame len -> weight (relative number of frames)
+random    - 'min'/'max': uniformly distributed frame len
+increment - 'min'/'max': frame len incremented by one (wraps around)
+'''
+
+FRAME_PROFILES = {
+    # cyclic ~130 byte (profinet like) frames plus occasional MTU sized frames
+    'shopfloor-imix': {'mode': 'imix', 'frame_lens': {130: 19, 1500: 1}},
+    'simple-imix': {'mode': 'imix', 'frame_lens': {64: 7, 594: 4, 1518: 1}},
+    'random-64-1500': {'mode': 'random', 'min': 64, 'max': 1500},
+    'increment-64-1500': {'mode': 'increment', 'min': 64, 'max': 1500}
+}
+
+'''
+burst patterns - frames sent in bursts instead of a constant rate (see burst_pattern.py)
+the speed patterns still define the average rate of each port - cyclic patterns round the bursts to whole frames,
+the rate actually sent is stored as tx speed (see burst_pattern.py)
+'bursts_per_sec'   - cyclic: fixed cycle, all ports start together so their bursts are phase aligned
+'frames_per_burst' - burst: fixed burst size, the burst rate follows from the port speed
+'''
+
+BURST_PATTERNS = {
+    'cyclic-1ms': {'bursts_per_sec': 1000},
+    'cyclic-4ms': {'bursts_per_sec': 250},
+    'cyclic-32ms': {'bursts_per_sec': 31.25},
+    'burst-8': {'frames_per_burst': 8},
+    'burst-64': {'frames_per_burst': 64}
+}
+
 TIME_WARUMP = 1
 TIME_MEASURE = 1
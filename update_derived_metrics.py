@@ -0,0 +1,18 @@
+import argparse
+import sys
+
+from measurement_model import MeasurementModel
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='mirror/bandwidth test tool - (re)calculate derived drop metrics of existing databases')
+    parser.add_argument('-f', '--db-file', type=str, required=True, help='sqlite database to be used')
+    parser.add_argument('-v', '--verbose', default=False, action='store_true', help='show extended information')
+
+    args = parser.parse_args()
+
+    with MeasurementModel(args.db_file, verbose=args.verbose) as mm:
+        updated = mm.derived_metrics_update()
+
+    print 'updated {} measurement configs'.format(updated)
+    sys.exit(0)